@@ -2,6 +2,9 @@
 ASGI config for finalProject project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with any ASGI server, e.g. ``uvicorn finalProject.asgi:application``;
+the read-heavy views in main.views are async and run without a thread each,
+and the conversation event streams are only served through this entry point.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
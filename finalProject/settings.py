@@ -40,14 +40,35 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'main.middleware.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'main.middleware.RequestProfilingMiddleware',
 ]
 
+# Per-request query/timing instrumentation, reported through the
+# Server-Timing header and the staff-only profiling report.
+REQUEST_PROFILING = DEBUG
+
+# Maximum number of SQL queries per URL name; 'log' warns, 'raise' fails the request.
+QUERY_BUDGETS = {
+    'home': 10,
+    'conversation_list': 10,
+    'conversation_detail': 10,
+    'teacher_list': 10,
+    'student_dashboard': 10,
+    'courses_list': 10,
+}
+QUERY_BUDGET_ACTION = 'log'
+
+# With profiling on, append every distinct statement each request runs to
+# this JSON-lines file for manage.py index_advisor.
+QUERY_LOG = os.environ.get('QUERY_LOG')
+
 ROOT_URLCONF = 'finalProject.urls'
 
 TEMPLATES = [
@@ -76,9 +97,66 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # A file-backed test database gives concurrent tests real SQLite
+        # locking instead of the shared-cache in-memory table locks.
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    },
+    # Read-only connection to the same file, used for reads by
+    # main.routers.PrimaryReplicaRouter. In WAL mode it reads alongside the
+    # writer and sees every commit at once; it can instead point at a copy
+    # kept fresh with SQLite's backup API, which REPLICA_PIN_SECONDS covers.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f"{(BASE_DIR / 'db.sqlite3').as_uri()}?mode=ro",
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
+}
+
+DATABASE_ROUTERS = ['main.routers.PrimaryReplicaRouter']
+
+# Seconds a client keeps reading from the primary after a request that wrote.
+REPLICA_PIN_SECONDS = 5
+
+# SQLITE_PROFILE=production tunes every SQLite connection for concurrent
+# use: WAL lets readers run alongside a writer, NORMAL sync is durable in WAL
+# mode except on power loss, and the busy timeout makes writers queue instead
+# of failing. Transactions that still hit a lock are run again by
+# main.sqlite.write_transaction up to SQLITE_LOCK_RETRIES times. Set the
+# profile in the deployment environment; the default keeps SQLite's own
+# settings so development and test runs leave db.sqlite3 alone.
+SQLITE_PRODUCTION_PRAGMAS = {
+    'busy_timeout': 5000,
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -20000,
+}
+SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'default')
+if SQLITE_PROFILE == 'production':
+    SQLITE_PRAGMAS = SQLITE_PRODUCTION_PRAGMAS
+    SQLITE_LOCK_RETRIES = 5
+    SQLITE_LOCK_BACKOFF = 0.05
+else:
+    SQLITE_PRAGMAS = {}
+    SQLITE_LOCK_RETRIES = 0
+
+# Local-memory cache for the availability and home page caches. Run several
+# worker processes against FileBasedCache instead so invalidations are shared.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+# Pub/sub behind the conversation event streams. The in-process hub only
+# reaches clients connected to the same process; point this at a class with
+# the same interface backed by a local broker when running several workers.
+LIVE_HUB = 'main.live.LocalHub'
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
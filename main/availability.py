@@ -0,0 +1,75 @@
+import datetime
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import PlacementTestReservation
+
+SLOT_START = datetime.time(19, 0)
+SLOT_END = datetime.time(21, 0)
+SLOT_MINUTES = 15
+WEEKEND_DAYS = (5, 6)
+MAX_RANGE_DAYS = 62
+CACHE_TIMEOUT = 300
+
+
+def _build_slots():
+    slots = []
+    current = datetime.datetime.combine(datetime.date.min, SLOT_START)
+    while current.time() <= SLOT_END:
+        slots.append(current.time())
+        current += datetime.timedelta(minutes=SLOT_MINUTES)
+    return tuple(slots)
+
+
+SLOTS = _build_slots()
+SLOT_INDEX = {slot: i for i, slot in enumerate(SLOTS)}
+SLOT_LABELS = [slot.strftime('%H:%M') for slot in SLOTS]
+
+
+def _cache_key(day):
+    return f'availability:{day.isoformat()}'
+
+
+def bookable_days(start, end):
+    day = start
+    while day <= end:
+        if day.weekday() not in WEEKEND_DAYS:
+            yield day
+        day += datetime.timedelta(days=1)
+
+
+def booked_bitmaps(start, end):
+    days = list(bookable_days(start, end))
+    keys = {_cache_key(day): day for day in days}
+    cached = cache.get_many(keys)
+    bitmaps = {keys[key]: bitmap for key, bitmap in cached.items()}
+
+    missing = [day for day in days if day not in bitmaps]
+    if missing:
+        fresh = dict.fromkeys(missing, 0)
+        reserved = PlacementTestReservation.objects.filter(
+            date__range=(missing[0], missing[-1])
+        ).values_list('date', 'time')
+        for day, time in reserved:
+            if day in fresh and time in SLOT_INDEX:
+                fresh[day] |= 1 << SLOT_INDEX[time]
+        cache.set_many({_cache_key(day): bitmap for day, bitmap in fresh.items()}, CACHE_TIMEOUT)
+        bitmaps.update(fresh)
+
+    return {day: bitmaps[day] for day in days}
+
+
+abooked_bitmaps = sync_to_async(booked_bitmaps)
+
+
+def booked_slots(bitmap):
+    return [label for i, label in enumerate(SLOT_LABELS) if bitmap & (1 << i)]
+
+
+def invalidate_day(day):
+    # Deferred to commit so a concurrent request cannot re-cache the day's
+    # old bookings for CACHE_TIMEOUT before the write is visible.
+    key = _cache_key(day)
+    transaction.on_commit(lambda: cache.delete(key))
@@ -0,0 +1,228 @@
+import csv
+import re
+import zipfile
+from collections import defaultdict
+from decimal import Decimal
+from itertools import groupby
+from operator import itemgetter
+from xml.sax.saxutils import escape
+
+from .models import Assignment, AssignmentSubmission, Enrollment, Exam, ExamSubmission
+
+ITERATOR_CHUNK_SIZE = 2000
+SHEET_NAME_INVALID = re.compile(r'[\[\]:*?/\\]')
+XML_INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class _GradeStream:
+    # Walks one (course_id, student_id, item_id, grade) stream sorted by
+    # course and student in step with the enrollments.
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.current = next(self.rows, None)
+
+    def take(self, key):
+        grades = {}
+        while self.current is not None and self.current[:2] <= key:
+            if self.current[:2] == key:
+                grades[self.current[2]] = self.current[3]
+            self.current = next(self.rows, None)
+        return grades
+
+
+def iter_gradebook(courses):
+    # Yields (course, header, rows) per course, one row per enrolled student
+    # with the course grade and every assignment and exam grade. Six queries
+    # however many courses and students; enrollments and submissions are
+    # streamed in (course, student) order and merged, so only one student's
+    # grades are held at a time. Each section's rows must be consumed before
+    # moving to the next.
+    courses = list(courses.order_by('id'))
+    course_ids = [course.id for course in courses]
+    assignments, exams = defaultdict(list), defaultdict(list)
+    for course_id, pk, title in Assignment.objects.filter(
+            course_id__in=course_ids).order_by('id').values_list('course_id', 'id', 'title'):
+        assignments[course_id].append((pk, title))
+    for course_id, pk, title in Exam.objects.filter(
+            course_id__in=course_ids).order_by('id').values_list('course_id', 'id', 'title'):
+        exams[course_id].append((pk, title))
+
+    enrollments = Enrollment.objects.filter(course_id__in=course_ids).order_by('course_id', 'student_id').values_list(
+        'course_id', 'student_id', 'student__username', 'student__first_name', 'student__last_name', 'grade',
+    ).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    assignment_grades = _GradeStream(AssignmentSubmission.objects.filter(
+        assignment__course_id__in=course_ids, graded=True,
+    ).order_by('assignment__course_id', 'student_id').values_list(
+        'assignment__course_id', 'student_id', 'assignment_id', 'grade',
+    ).iterator(chunk_size=ITERATOR_CHUNK_SIZE))
+    exam_grades = _GradeStream(ExamSubmission.objects.filter(
+        exam__course_id__in=course_ids, graded=True,
+    ).order_by('exam__course_id', 'student_id').values_list(
+        'exam__course_id', 'student_id', 'exam_id', 'grade',
+    ).iterator(chunk_size=ITERATOR_CHUNK_SIZE))
+
+    sections = groupby(enrollments, key=itemgetter(0))
+    section = next(sections, None)
+    for course in courses:
+        header = ['Username', 'First name', 'Last name', 'Course grade']
+        header += [title for _, title in assignments[course.id]]
+        header += [f'Exam: {title}' for _, title in exams[course.id]]
+        students = iter(())
+        if section is not None and section[0] == course.id:
+            students = section[1]
+            section = None
+
+        def rows(course_id=course.id, students=students):
+            for _, student_id, username, first_name, last_name, grade in students:
+                done = assignment_grades.take((course_id, student_id))
+                taken = exam_grades.take((course_id, student_id))
+                yield (
+                    [username, first_name, last_name, grade]
+                    + [done.get(pk) for pk, _ in assignments[course_id]]
+                    + [taken.get(pk) for pk, _ in exams[course_id]]
+                )
+
+        yield course, header, rows()
+        if section is None:
+            section = next(sections, None)
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def csv_stream(sections):
+    # One block per course, separated by a blank line, each with its title
+    # and header row.
+    writer = csv.writer(_Echo())
+    for i, (course, header, rows) in enumerate(sections):
+        if i:
+            yield writer.writerow([])
+        yield writer.writerow([course.title])
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(['' if value is None else value for value in row])
+
+
+class _Sink:
+    # Write-only file for zipfile: collects what was written since the last
+    # drain so it can be streamed out. zipfile uses data descriptors when the
+    # file is not seekable, so nothing is ever rewritten.
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _cell(value):
+    if value is None or value == '':
+        return '<c/>'
+    if isinstance(value, (int, float, Decimal)):
+        return f'<c><v>{value}</v></c>'
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(XML_INVALID.sub("", str(value)))}</t></is></c>'
+
+
+def _row(values):
+    return ('<row>' + ''.join(_cell(value) for value in values) + '</row>').encode()
+
+
+def _sheet_names(titles):
+    names = []
+    for title in titles:
+        base = SHEET_NAME_INVALID.sub(' ', title).strip()[:28] or 'Sheet'
+        name, n = base, 2
+        while name.lower() in (existing.lower() for existing in names):
+            name, n = f'{base} {n}', n + 1
+        names.append(name)
+    return names
+
+
+def xlsx_stream(sections, rows_per_chunk=500):
+    # A minimal SpreadsheetML workbook with one sheet per course, written
+    # straight into a streamed ZIP: inline strings, no shared-strings table,
+    # so rows never have to be held back.
+    sink = _Sink()
+    archive = zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED)
+    titles = []
+    for course, header, rows in sections:
+        titles.append(course.title)
+        with archive.open(f'xl/worksheets/sheet{len(titles)}.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_row([course.title]))
+            sheet.write(_row(header))
+            for i, row in enumerate(rows, start=1):
+                sheet.write(_row(row))
+                if i % rows_per_chunk == 0:
+                    yield sink.drain()
+            sheet.write(b'</sheetData></worksheet>')
+        yield sink.drain()
+
+    if not titles:
+        titles.append('Gradebook')
+        archive.writestr('xl/worksheets/sheet1.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData/></worksheet>'
+        ))
+    sheets = range(1, len(titles) + 1)
+    archive.writestr('[Content_Types].xml', (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        + ''.join(
+            f'<Override PartName="/xl/worksheets/sheet{n}.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for n in sheets
+        )
+        + '</Types>'
+    ))
+    archive.writestr('_rels/.rels', (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ))
+    archive.writestr('xl/workbook.xml', (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+        + ''.join(
+            f'<sheet name="{escape(name, {chr(34): "&quot;"})}" sheetId="{n}" r:id="rId{n}"/>'
+            for n, name in zip(sheets, _sheet_names(titles))
+        )
+        + '</sheets></workbook>'
+    ))
+    archive.writestr('xl/_rels/workbook.xml.rels', (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        + ''.join(
+            f'<Relationship Id="rId{n}" Target="worksheets/sheet{n}.xml" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+            for n in sheets
+        )
+        + '</Relationships>'
+    ))
+    archive.close()
+    yield sink.drain()
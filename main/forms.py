@@ -1,5 +1,11 @@
+import csv
+import io
+
 from django import forms
-from .models import PlacementTestReservation, EnrollmentRequest, Assignment, Conversation, Comment, EducationalPost
+from django.core.exceptions import NON_FIELD_ERRORS
+from .models import PlacementTestReservation, EnrollmentRequest, Assignment, Conversation, Comment, EducationalPost, \
+    SLOT_TAKEN_MESSAGE
+from .availability import SLOT_LABELS
 import datetime
 from .models import Course
 from django.contrib.auth import get_user_model
@@ -27,14 +33,7 @@ CONVERSATION_TOPICS = [
     ('Music', 'Music'),
 ]
 
-TIME_CHOICES = []
-start = datetime.time(19, 0)
-end = datetime.time(21, 0)
-current = datetime.datetime.combine(datetime.date.today(), start)
-
-while current.time() <= end:
-    TIME_CHOICES.append((current.time().strftime('%H:%M'), current.time().strftime('%H:%M')))
-    current += datetime.timedelta(minutes=15)
+TIME_CHOICES = [(label, label) for label in SLOT_LABELS]
 
 
 class PlacementTestReservationForm(forms.ModelForm):
@@ -52,6 +51,9 @@ class PlacementTestReservationForm(forms.ModelForm):
             'full_name': forms.TextInput(attrs={'class': 'form-control'}),
             'phone': forms.TextInput(attrs={'class': 'form-control'}),
         }
+        error_messages = {
+            NON_FIELD_ERRORS: {'unique_together': SLOT_TAKEN_MESSAGE},
+        }
 
     def clean_date(self):
         date = self.cleaned_data['date']
@@ -65,15 +67,6 @@ class PlacementTestReservationForm(forms.ModelForm):
 
         return date
 
-    def clean(self):
-        cleaned_data = super().clean()
-        date = cleaned_data.get('date')
-        time_str = cleaned_data.get('time')
-        if date and time_str:
-            time = datetime.datetime.strptime(time_str, '%H:%M').time()
-            if PlacementTestReservation.objects.filter(date=date, time=time).exists():
-                raise forms.ValidationError('This time slot is already booked.')
-
 
 class CourseForm(forms.ModelForm):
     class Meta:
@@ -150,3 +143,73 @@ class EducationalPostForm(forms.ModelForm):
     class Meta:
         model = EducationalPost
         fields = ['title', 'image', 'description']
+
+
+class ExamGradingForm(forms.Form):
+    grades_csv = forms.FileField(
+        required=False, label='Or upload a CSV of username,grade',
+        widget=forms.ClearableFileInput(attrs={'accept': '.csv,text/csv'}),
+    )
+
+    def __init__(self, *args, submissions=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.submissions = list(submissions)
+        for submission in self.submissions:
+            self.fields[f'grade_{submission.id}'] = self.grade_field(initial=submission.grade)
+
+    @staticmethod
+    def grade_field(required=False, **kwargs):
+        return forms.DecimalField(
+            required=required, min_value=0, max_value=100, max_digits=5, decimal_places=2,
+            widget=forms.NumberInput(attrs={'step': '0.01', 'min': 0, 'max': 100}), **kwargs,
+        )
+
+    def grade_rows(self):
+        for submission in self.submissions:
+            yield submission, self[f'grade_{submission.id}']
+
+    def clean(self):
+        cleaned_data = super().clean()
+        grades = {
+            submission.id: cleaned_data[f'grade_{submission.id}']
+            for submission in self.submissions
+            if cleaned_data.get(f'grade_{submission.id}') is not None
+        }
+        if cleaned_data.get('grades_csv'):
+            grades.update(self.parse_csv(cleaned_data['grades_csv']))
+        if not grades and not self.errors:
+            raise forms.ValidationError('Enter at least one grade.')
+        cleaned_data['grades'] = grades
+        return cleaned_data
+
+    def parse_csv(self, upload):
+        try:
+            rows = list(csv.reader(io.StringIO(upload.read().decode('utf-8-sig'))))
+        except (UnicodeDecodeError, csv.Error):
+            raise forms.ValidationError('The CSV file could not be read.')
+        if rows and rows[0] and rows[0][0].strip().lower() == 'username':
+            rows = rows[1:]
+
+        by_username = {submission.student.username: submission.id for submission in self.submissions}
+        field = self.grade_field(required=True)
+        grades, errors = {}, []
+        for line, row in enumerate(rows, start=1):
+            if not any(cell.strip() for cell in row):
+                continue
+            if len(row) != 2:
+                errors.append(f'Line {line}: expected username,grade.')
+                continue
+            username, grade = row[0].strip(), row[1].strip()
+            if username not in by_username:
+                errors.append(f'Line {line}: {username} has no submission for this exam.')
+                continue
+            if by_username[username] in grades:
+                errors.append(f'Line {line}: {username} is listed twice.')
+                continue
+            try:
+                grades[by_username[username]] = field.clean(grade)
+            except forms.ValidationError as exc:
+                errors.append(f'Line {line}: {" ".join(exc.messages)}')
+        if errors:
+            raise forms.ValidationError(errors)
+        return grades
@@ -0,0 +1,77 @@
+import threading
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from django.template.loader import render_to_string
+
+from .models import Conversation, EducationalPost
+
+User = get_user_model()
+
+CACHE_TIMEOUT = 600
+CONVERSATIONS, POSTS, TEACHERS = 'conversations', 'posts', 'teachers'
+BLOCKS = (CONVERSATIONS, POSTS, TEACHERS)
+
+_stats_lock = threading.Lock()
+_hits = Counter()
+_misses = Counter()
+
+
+def _cache_key(block):
+    return f'home:{block}'
+
+
+def _render_block(block):
+    if block == CONVERSATIONS:
+        conversations = Conversation.objects.select_related('user').annotate(
+            comment_count=Count('comments')
+        ).order_by('-comment_count')[:4]
+        return render_to_string('home_conversations.html', {'top_conversations': conversations})
+    if block == POSTS:
+        posts = EducationalPost.objects.select_related('teacher')[:4]
+        return render_to_string('home_posts.html', {'latest_posts': posts})
+    teachers = User.objects.filter(user_type='teacher').order_by('-rating', '-rating_count', 'username')[:4]
+    return render_to_string('home_teachers.html', {'top_teachers': teachers})
+
+
+def home_blocks():
+    # The blocks are the same for every visitor, so they are cached as
+    # rendered HTML and only re-rendered after a signal drops them.
+    keys = {_cache_key(block): block for block in BLOCKS}
+    cached = cache.get_many(keys)
+    blocks = {keys[key]: html for key, html in cached.items()}
+
+    fresh = {block: _render_block(block) for block in BLOCKS if block not in blocks}
+    if fresh:
+        cache.set_many({_cache_key(block): html for block, html in fresh.items()}, CACHE_TIMEOUT)
+        blocks.update(fresh)
+
+    with _stats_lock:
+        _hits.update(block for block in BLOCKS if block not in fresh)
+        _misses.update(fresh.keys())
+    return blocks
+
+
+ahome_blocks = sync_to_async(home_blocks)
+
+
+def invalidate_home_blocks(*blocks):
+    # Deferred to commit so a concurrent request cannot re-cache rows the
+    # writing transaction has not made visible yet.
+    keys = [_cache_key(block) for block in blocks or BLOCKS]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def home_cache_stats():
+    with _stats_lock:
+        return {block: {'hits': _hits[block], 'misses': _misses[block]} for block in BLOCKS}
+
+
+def reset_home_cache_stats():
+    with _stats_lock:
+        _hits.clear()
+        _misses.clear()
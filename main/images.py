@@ -0,0 +1,137 @@
+import io
+import os
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+DEFAULT_PROFILE_IMAGE = 'profile_pics/default.png'
+# Generated files live under their own prefixes, in a directory named after
+# the original's storage name. Storage names are unique, so no upload can
+# collide with them and deleting them never touches a file someone uploaded.
+AVATAR_VARIANT_PREFIX = 'avatar_variants/'
+POST_DERIVATIVE_PREFIX = 'post_derivatives/'
+MAX_AVATAR_SIZE = 640
+# Square edge in pixels; twice the largest CSS size each one is shown at.
+AVATAR_SIZES = {'small': 64, 'medium': 160, 'large': 320}
+# Widths in pixels of the EducationalPost image derivatives.
+POST_IMAGE_WIDTHS = (160, 320, 640, 1024, 1600)
+JPEG_EXTENSIONS = ('.jpg', '.jpeg')
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+
+
+def open_image(file):
+    try:
+        image = Image.open(file)
+        image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise ValidationError('Upload a valid image.')
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    return image.convert('RGBA' if has_alpha else 'RGB')
+
+
+def encode(image, extension):
+    buffer = io.BytesIO()
+    if extension in JPEG_EXTENSIONS:
+        image.convert('RGB').save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    elif extension == '.webp':
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=6)
+    else:
+        image.save(buffer, 'PNG', optimize=True)
+    return ContentFile(buffer.getvalue())
+
+
+def avatar_variant_name(name, size):
+    return f'{AVATAR_VARIANT_PREFIX}{name}/{size}{fallback_extension(name)}'
+
+
+def save_profile_image(user, upload):
+    # Downscales and re-encodes the upload (PNG only when it is transparent)
+    # and writes its variants. Returns the replaced picture for
+    # delete_profile_image once the user has been saved.
+    image = open_image(upload)
+    image.thumbnail((MAX_AVATAR_SIZE, MAX_AVATAR_SIZE), Image.LANCZOS)
+    extension = '.png' if image.mode == 'RGBA' else '.jpg'
+    previous = user.profile_image.name
+    stem = os.path.splitext(os.path.basename(upload.name))[0]
+    user.profile_image.save(stem + extension, encode(image, extension), save=False)
+    generate_avatar_variants(user.profile_image.name, image)
+    user.avatar_source = user.profile_image.name
+    return previous
+
+
+def generate_avatar_variants(name, image=None, force=False):
+    variants = {size: avatar_variant_name(name, size) for size in AVATAR_SIZES}
+    if not force and all(default_storage.exists(variant) for variant in variants.values()):
+        return 0
+    if image is None:
+        with default_storage.open(name) as file:
+            image = open_image(file)
+    for size, pixels in AVATAR_SIZES.items():
+        variant = variants[size]
+        if default_storage.exists(variant):
+            default_storage.delete(variant)
+        thumbnail = ImageOps.fit(image, (pixels, pixels), Image.LANCZOS)
+        default_storage.save(variant, encode(thumbnail, os.path.splitext(variant)[1]))
+    return len(variants)
+
+
+def delete_profile_image(name):
+    if not name or name == DEFAULT_PROFILE_IMAGE:
+        return
+    for path in [name] + [avatar_variant_name(name, size) for size in AVATAR_SIZES]:
+        default_storage.delete(path)
+
+
+def fallback_extension(name):
+    return '.jpg' if os.path.splitext(name)[1].lower() in JPEG_EXTENSIONS else '.png'
+
+
+def post_derivative_name(name, width, extension):
+    return f'{POST_DERIVATIVE_PREFIX}{name}/w{width}{extension}'
+
+
+def post_derivative_names(name, widths):
+    return [
+        post_derivative_name(name, width, extension)
+        for width in widths
+        for extension in ('.webp', fallback_extension(name))
+    ]
+
+
+def generate_post_derivatives(name):
+    # Writes a WebP and a JPEG/PNG fallback at every configured width below
+    # the original's, plus one at the original width when it is smaller than
+    # the largest. Returns the widths written.
+    with default_storage.open(name) as file:
+        image = open_image(file)
+    widths = [width for width in POST_IMAGE_WIDTHS if width < image.width]
+    if image.width <= POST_IMAGE_WIDTHS[-1]:
+        widths.append(image.width)
+    for width in widths:
+        resized = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        for extension in ('.webp', fallback_extension(name)):
+            derivative = post_derivative_name(name, width, extension)
+            if default_storage.exists(derivative):
+                default_storage.delete(derivative)
+            default_storage.save(derivative, encode(resized, extension))
+    return widths
+
+
+def delete_post_derivatives(name, widths):
+    if name:
+        for derivative in post_derivative_names(name, widths):
+            default_storage.delete(derivative)
+
+
+def refresh_post_image(post, previous_name='', previous_widths=()):
+    # Called after a post is saved from a form: rebuilds the derivatives when
+    # the image changed and removes the ones of the image it replaced.
+    if post.image.name == previous_name:
+        return
+    delete_post_derivatives(previous_name, previous_widths)
+    post.image_widths = generate_post_derivatives(post.image.name) if post.image else []
+    post.save(update_fields=['image_widths'])
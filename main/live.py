@@ -0,0 +1,206 @@
+import asyncio
+import json
+import threading
+import uuid
+from collections import defaultdict, deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.module_loading import import_string
+
+from .models import Comment
+
+DEFAULT_HUB = 'main.live.LocalHub'
+# Events kept per conversation for clients that reconnect; older gaps are
+# filled from the database instead.
+HISTORY_SIZE = 200
+# Events queued for one slow client before it is dropped and left to
+# reconnect with its last event id.
+QUEUE_SIZE = 100
+KEEPALIVE_SECONDS = 15
+RETRY_MS = 3000
+
+
+def channel_name(conversation_id):
+    return f'conversation:{conversation_id}'
+
+
+class Subscription:
+    def __init__(self, hub, channel):
+        self.hub = hub
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    def push(self, message):
+        # Called from whichever thread published.
+        self.loop.call_soon_threadsafe(self._put, message)
+
+    def _put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.queue = None
+
+    async def get(self):
+        # Returns None once the client has fallen too far behind.
+        if self.queue is None:
+            return None
+        return await self.queue.get()
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class LocalHub:
+    # In-process pub/sub. Every message gets a hub-wide sequence number and
+    # is kept in a short per-channel history so reconnecting clients receive
+    # only what they missed. The epoch changes on every start, which tells
+    # a client's old event ids apart from this process's. Only subscribers in
+    # the same process see the messages; a hub backed by a local broker can
+    # replace it through the LIVE_HUB setting by offering the same methods.
+
+    def __init__(self, history_size=HISTORY_SIZE):
+        self.epoch = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._history = defaultdict(lambda: deque(maxlen=history_size))
+        self._evicted = {}
+        self._subscribers = defaultdict(set)
+
+    def cursor(self):
+        with self._lock:
+            return self.epoch, self._seq
+
+    def publish(self, channel, event, data):
+        with self._lock:
+            self._seq += 1
+            message = (self._seq, event, data)
+            history = self._history[channel]
+            if len(history) == history.maxlen:
+                self._evicted[channel] = history[0][0]
+            history.append(message)
+            subscribers = list(self._subscribers[channel])
+        for subscription in subscribers:
+            try:
+                subscription.push(message)
+            except RuntimeError:
+                # Its event loop has closed.
+                self.unsubscribe(subscription)
+        return message
+
+    def since(self, channel, epoch, seq):
+        # Messages after seq, or None when they cannot all be replayed.
+        with self._lock:
+            if epoch != self.epoch or seq > self._seq or seq < self._evicted.get(channel, 0):
+                return None
+            return [message for message in self._history[channel] if message[0] > seq]
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers[subscription.channel].discard(subscription)
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_hub():
+    global _hub
+    with _hub_lock:
+        if _hub is None:
+            _hub = import_string(getattr(settings, 'LIVE_HUB', DEFAULT_HUB))()
+        return _hub
+
+
+def event_id(epoch, seq, comment_id):
+    # The newest comment the client has is carried along so a gap the hub
+    # cannot replay is filled from the database.
+    return f'{epoch}-{seq}-{comment_id}'
+
+
+def parse_event_id(value):
+    try:
+        epoch, seq, comment_id = value.split('-')
+        return epoch, int(seq), int(comment_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def format_event(event_id_, event, data):
+    return f'id: {event_id_}\nevent: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+
+def comment_payload(comment):
+    return {'id': comment.id, 'html': render_to_string('conversation_comment.html', {'comment': comment})}
+
+
+def publish_comment(comment):
+    transaction.on_commit(lambda: get_hub().publish(
+        channel_name(comment.conversation_id), 'comment', comment_payload(comment),
+    ))
+
+
+def publish_like_counts(conversation_id, counts):
+    counts = {str(pk): count for pk, count in counts.items()}
+    transaction.on_commit(lambda: get_hub().publish(channel_name(conversation_id), 'likes', {'counts': counts}))
+
+
+def _resync(conversation_id, after_comment_id):
+    comments = Comment.objects.filter(
+        conversation_id=conversation_id, id__gt=after_comment_id,
+    ).select_related('user').order_by('id')
+    counts = Comment.objects.filter(conversation_id=conversation_id).values_list('id', 'like_count')
+    return [comment_payload(comment) for comment in comments], {str(pk): count for pk, count in counts}
+
+
+async def conversation_stream(conversation_id, last_event):
+    # Server-Sent Events for one conversation. A client that sends its last
+    # event id gets what it missed first: from the hub's history when it can
+    # still replay it, otherwise the newer comments and every like count from
+    # the database. Then live events follow, with comments tracked in the ids.
+    hub = get_hub()
+    channel = channel_name(conversation_id)
+    subscription = hub.subscribe(channel)
+    epoch, seq = hub.cursor()
+    comment_id = last_event[2] if last_event else 0
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        backlog = hub.since(channel, *last_event[:2]) if last_event else []
+        if backlog is None:
+            comments, counts = await sync_to_async(_resync)(conversation_id, comment_id)
+            for payload in comments:
+                comment_id = payload['id']
+                yield format_event(event_id(epoch, seq, comment_id), 'comment', payload)
+            yield format_event(event_id(epoch, seq, comment_id), 'likes', {'counts': counts})
+            backlog = []
+        elif last_event:
+            seq = last_event[1]
+
+        pending = iter(backlog)
+        while True:
+            message = next(pending, None)
+            if message is None:
+                try:
+                    message = await asyncio.wait_for(subscription.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                if message is None:
+                    return
+            if message[0] <= seq:
+                continue
+            seq, event, data = message
+            if event == 'comment':
+                comment_id = max(comment_id, data['id'])
+            yield format_event(event_id(epoch, seq, comment_id), event, data)
+    finally:
+        subscription.close()
@@ -0,0 +1,314 @@
+import asyncio
+import datetime
+import http.cookiejar
+import logging
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+from wsgiref.util import setup_testing_defaults
+
+LOCKED_MARKER = 'database is locked'
+REQUEST_TIMEOUT = 30
+PLACEHOLDER_PDF = b'%PDF-1.4\n1 0 obj<</Type/Catalog>>endobj\ntrailer<</Root 1 0 R>>\n%%EOF\n'
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Redirects are timed as their own request by the journey that follows
+    # them, so the 302 itself is what gets measured.
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class Session:
+    def __init__(self, base_url, samples):
+        self.base_url = base_url.rstrip('/')
+        self.samples = samples
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect)
+
+    @property
+    def csrf_token(self):
+        return next((cookie.value for cookie in self.cookies if cookie.name == 'csrftoken'), '')
+
+    def get(self, step, path):
+        return self.request(step, path)
+
+    def post(self, step, path, fields, files=None):
+        fields = dict(fields, csrfmiddlewaretoken=self.csrf_token)
+        if files:
+            body, content_type = _multipart(fields, files)
+        else:
+            body, content_type = urllib.parse.urlencode(fields).encode(), 'application/x-www-form-urlencoded'
+        return self.request(step, path, body, {'Content-Type': content_type})
+
+    def request(self, step, path, body=None, headers=None):
+        request = urllib.request.Request(self.base_url + path, data=body, headers=headers or {})
+        error, text = '', ''
+        start = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=REQUEST_TIMEOUT) as response:
+                status, text = response.status, response.read().decode(errors='replace')
+        except urllib.error.HTTPError as exc:
+            status, text = exc.code, exc.read().decode(errors='replace')
+        except OSError as exc:
+            status, error = 0, type(exc).__name__
+        elapsed = (time.perf_counter() - start) * 1000
+        if status >= 500 and LOCKED_MARKER in text:
+            error = 'locked'
+        elif status == 0 or status >= 400:
+            error = error or f'http_{status}'
+        self.samples.append((step, status, round(elapsed, 3), error))
+        return status
+
+
+def _multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    for name, (filename, content) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: application/pdf\r\n\r\n'.encode() + content + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def login(session, actor):
+    session.get('login_page', actor['urls']['login'])
+    session.post('login', actor['urls']['login'], {'username': actor['username'], 'password': actor['password']})
+
+
+def student_journey(session, actor, plan, rng):
+    urls = actor['urls']
+    session.get('student_dashboard', urls['dashboard'])
+    if actor['assignments']:
+        page, assignment = rng.choice(actor['assignments'])
+        session.get('assignments', page)
+        session.post(
+            'submit_assignment', page, {'assignment_id': assignment},
+            {'file': (f'{actor["username"]}.pdf', PLACEHOLDER_PDF)},
+        )
+    if plan['conversations']:
+        detail, comment_url = rng.choice(plan['conversations'])
+        session.get('conversation_detail', detail)
+        session.post('comment', comment_url, {'body': f'Load test reply {rng.random():.6f}'})
+    if plan['likes']:
+        session.post('like_comment', rng.choice(plan['likes']), {})
+    day = plan['first_booking_day'] + datetime.timedelta(days=rng.randrange(plan['booking_days']))
+    if day.weekday() not in plan['weekend_days']:
+        session.get('placement_test_page', urls['placement_test'])
+        session.post('book_placement_slot', urls['placement_test'], {
+            'full_name': actor['username'], 'phone': '09120000000', 'level': 'Beginner',
+            'date': day.isoformat(), 'time': rng.choice(plan['slots']),
+        })
+
+
+def teacher_journey(session, actor, plan, rng):
+    urls = actor['urls']
+    session.get('teacher_dashboard', urls['dashboard'])
+    if actor['courses']:
+        session.get('course_detail', rng.choice(actor['courses']))
+    if actor['submissions']:
+        session.get('assignment_submissions', rng.choice(actor['submissions']))
+    if plan['conversations']:
+        session.get('conversation_detail', rng.choice(plan['conversations'])[0])
+
+
+JOURNEYS = {'student': student_journey, 'teacher': teacher_journey}
+
+
+def run_actor(base_url, actor, plan, deadline, seed):
+    # Runs in a worker thread or process: log in once, then repeat the
+    # role's journey until the shared deadline passes, at least once.
+    rng = random.Random(seed)
+    samples = []
+    session = Session(base_url, samples)
+    login(session, actor)
+    journey = JOURNEYS[actor['role']]
+    while True:
+        journey(session, actor, plan, rng)
+        if time.time() >= deadline:
+            return samples
+
+
+def summarize(samples, elapsed, server_locked=0):
+    by_step = defaultdict(list)
+    for sample in samples:
+        by_step[sample[0]].append(sample)
+
+    def stats(rows):
+        latencies = [row[2] for row in rows]
+        errors = Counter(row[3] for row in rows if row[3])
+        return {
+            'requests': len(rows),
+            'errors': sum(errors.values()),
+            'error_rate': round(sum(errors.values()) / len(rows), 4) if rows else 0.0,
+            'locked': errors['locked'],
+            'statuses': dict(sorted(Counter(str(row[1]) for row in rows).items())),
+            'p50_ms': round(percentile(latencies, 0.50), 2),
+            'p90_ms': round(percentile(latencies, 0.90), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'max_ms': round(max(latencies, default=0.0), 2),
+        }
+
+    total = stats(samples)
+    total['throughput_rps'] = round(len(samples) / elapsed, 2) if elapsed else 0.0
+    total['elapsed_s'] = round(elapsed, 2)
+    total['server_locked'] = server_locked
+    return {'total': total, 'steps': {step: stats(rows) for step, rows in sorted(by_step.items())}}
+
+
+COMPARED_METRICS = ('requests', 'error_rate', 'locked', 'p50_ms', 'p90_ms', 'p99_ms')
+
+
+def compare(baseline, current):
+    rows = [('total', 'throughput_rps', baseline['total']['throughput_rps'], current['total']['throughput_rps'])]
+    rows += [('total', metric, baseline['total'][metric], current['total'][metric]) for metric in COMPARED_METRICS]
+    for step in sorted(set(baseline['steps']) | set(current['steps'])):
+        before, after = baseline['steps'].get(step, {}), current['steps'].get(step, {})
+        rows += [(step, metric, before.get(metric), after.get(metric)) for metric in COMPARED_METRICS[1:]]
+    return rows
+
+
+class _LockCounter(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def emit(self, record):
+        exc = record.exc_info[1] if record.exc_info else None
+        if exc is not None and LOCKED_MARKER in str(exc):
+            with self._lock:
+                self.count += 1
+
+
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def local_server(application, host='127.0.0.1', port=0):
+    # A threaded wsgiref server around the project's WSGI application, one
+    # thread per connection like runserver. "database is locked" errors the
+    # server raises are counted from the django.request log even when the
+    # 500 page does not show them.
+    counter = _LockCounter()
+    request_logger = logging.getLogger('django.request')
+    request_logger.addHandler(counter)
+    server = make_server(host, port, application, server_class=_ThreadingWSGIServer, handler_class=_QuietHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://{host}:{server.server_port}', counter
+    finally:
+        server.shutdown()
+        server.server_close()
+        request_logger.removeHandler(counter)
+
+
+# In-process handler benchmarks: the same GET requests are pushed straight
+# through Django's WSGI and ASGI handlers, without a network server in front,
+# so the difference measured is the request path itself. Both get the same
+# number of workers: threads for WSGI, in-flight requests (each with its own
+# sync thread) for ASGI.
+
+def _sample(step, status, start):
+    error = f'http_{status}' if status >= 400 else ''
+    return step, status, round((time.perf_counter() - start) * 1000, 3), error
+
+
+def _split(path):
+    path, _, query = path.partition('?')
+    return path, query
+
+
+def drive_wsgi(application, requests, workers, host, cookie=''):
+    # requests: (step, path) pairs. Returns samples and elapsed seconds.
+    def call(request):
+        step, path = request
+        environ = {'PATH_INFO': _split(path)[0], 'QUERY_STRING': _split(path)[1], 'HTTP_HOST': host}
+        if cookie:
+            environ['HTTP_COOKIE'] = cookie
+        setup_testing_defaults(environ)
+        status = []
+        start = time.perf_counter()
+        result = application(environ, lambda line, headers, exc_info=None: status.append(int(line[:3])))
+        try:
+            for _ in result:
+                pass
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return _sample(step, status[0], start)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        samples = list(executor.map(call, requests))
+    return samples, time.perf_counter() - started
+
+
+def drive_asgi(application, requests, workers, host, cookie=''):
+    headers = [(b'host', host.encode())] + ([(b'cookie', cookie.encode())] if cookie else [])
+
+    async def call(request, slots):
+        step, path = request
+        path, query = _split(path)
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+            'headers': headers, 'client': ('127.0.0.1', 0), 'server': (host, 80),
+        }
+        body_sent = asyncio.Event()
+        status = []
+
+        async def receive():
+            if not body_sent.is_set():
+                body_sent.set()
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            # The client never disconnects.
+            await asyncio.Future()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        async with slots:
+            start = time.perf_counter()
+            await application(scope, receive, send)
+            return _sample(step, status[0], start)
+
+    async def run():
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=workers))
+        slots = asyncio.Semaphore(workers)
+        return await asyncio.gather(*(call(request, slots) for request in requests))
+
+    started = time.perf_counter()
+    samples = asyncio.run(run())
+    return samples, time.perf_counter() - started
@@ -0,0 +1,86 @@
+import json
+from importlib import import_module
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.core.asgi import get_asgi_application
+from django.core.management.base import CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.urls import reverse
+from django.utils import timezone
+
+from main.loadtest import drive_asgi, drive_wsgi, summarize
+from main.management.commands.load_test import Command as LoadTestCommand
+from main.management.commands.seed_scale import SEED_PREFIX
+from main.models import Conversation
+
+User = get_user_model()
+
+
+class Command(LoadTestCommand):
+    help = (
+        "Compare the throughput of the async read views through Django's ASGI handler against the WSGI handler, "
+        "in process and with the same number of workers. Requests are made as a student created by seed_scale."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help="Threads for WSGI, concurrent requests for ASGI.")
+        parser.add_argument('--rounds', type=int, default=50, help="Times each page is requested per handler.")
+        parser.add_argument('--host', default='localhost', help="Host header; must be in ALLOWED_HOSTS.")
+        parser.add_argument('--anonymous', action='store_true', help="Send requests without a session.")
+        parser.add_argument('--save', help="Write both reports to this JSON file.")
+
+    def handle(self, *args, **options):
+        if getattr(settings, 'REQUEST_PROFILING', False):
+            self.stdout.write(self.style.WARNING(
+                "REQUEST_PROFILING is on: its synchronous middleware holds a thread for every ASGI request."
+            ))
+        pages = self.pages()
+        requests = [page for _ in range(options['rounds']) for page in pages]
+        cookie = '' if options['anonymous'] else self.session_cookie()
+        connections.close_all()
+
+        reports = {}
+        for interface, application, drive in (
+            ('wsgi', get_wsgi_application(), drive_wsgi),
+            ('asgi', get_asgi_application(), drive_asgi),
+        ):
+            drive(application, pages, options['workers'], options['host'], cookie)
+            samples, elapsed = drive(application, requests, options['workers'], options['host'], cookie)
+            reports[interface] = summarize(samples, elapsed)
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{interface.upper()}, {options['workers']} worker(s)"))
+            self.write_report(reports[interface])
+
+        self.stdout.write(self.style.MIGRATE_HEADING("ASGI compared with WSGI"))
+        self.write_comparison(reports['wsgi'], reports['asgi'])
+        if options['save']:
+            Path(options['save']).write_text(json.dumps(reports, indent=2) + '\n')
+            self.stdout.write(f"Saved reports to {options['save']}.")
+
+    def pages(self):
+        conversation = Conversation.objects.order_by('-id').values_list('id', flat=True).first()
+        if conversation is None:
+            raise CommandError("No conversations found; run seed_scale first.")
+        return [
+            ('home', reverse('home')),
+            ('conversation_list', reverse('conversation_list')),
+            ('conversation_detail', reverse('conversation_detail', kwargs={'pk': conversation})),
+            ('courses_list', reverse('courses_list')),
+            ('teacher_list', reverse('teacher_list')),
+            ('get_reserved_times', f"{reverse('get_reserved_times')}?date={timezone.localdate().isoformat()}"),
+        ]
+
+    def session_cookie(self):
+        student = User.objects.filter(
+            user_type='student', username__startswith=f'{SEED_PREFIX}student_',
+        ).order_by('id').first()
+        if student is None:
+            raise CommandError("No seeded students found; run seed_scale first or pass --anonymous.")
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = str(student.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = student.get_session_auth_hash()
+        session.save()
+        return f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
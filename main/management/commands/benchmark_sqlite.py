@@ -0,0 +1,140 @@
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+
+from main.loadtest import summarize
+from main.management.commands.load_test import Command as LoadTestCommand
+from main.sqlite import apply_pragmas, is_lock_error, retrying
+
+SEED_ROWS = 5000
+STUDENTS = 200
+# Python's sqlite3 default, which Django keeps unless OPTIONS sets 'timeout'.
+DEFAULT_TIMEOUT = 5.0
+
+
+class Command(LoadTestCommand):
+    help = (
+        "Measure SQLite read latency and throughput while writers commit bursts of uploads and grades, with "
+        "SQLite's defaults and then with SQLITE_PRODUCTION_PRAGMAS and lock retries. Runs on a scratch database file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--duration', type=float, default=5.0, help="Seconds per profile.")
+        parser.add_argument('--burst', type=int, default=20, help="Rows written per write transaction.")
+        parser.add_argument('--payload', type=int, default=16 * 1024, help="Bytes stored per written row.")
+        parser.add_argument('--retries', type=int, default=5, help="Lock retries per write in the production run.")
+        parser.add_argument('--save', help="Write both reports to this JSON file.")
+
+    def handle(self, *args, **options):
+        profiles = {
+            'default': ({}, 0),
+            'production': (settings.SQLITE_PRODUCTION_PRAGMAS, options['retries']),
+        }
+        reports = {}
+        for name, (pragmas, retries) in profiles.items():
+            with tempfile.TemporaryDirectory(prefix='sqlite-benchmark-') as directory:
+                path = os.path.join(directory, 'benchmark.sqlite3')
+                self.create_database(path, pragmas)
+                reports[name] = self.run_profile(path, pragmas, retries, options)
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{name}: {options['readers']} reader(s), {options['writers']} writer(s)"
+            ))
+            self.write_report(reports[name])
+
+        self.stdout.write(self.style.MIGRATE_HEADING("production compared with default"))
+        self.write_comparison(reports['default'], reports['production'])
+        if options['save']:
+            Path(options['save']).write_text(json.dumps(reports, indent=2) + '\n')
+            self.stdout.write(f"Saved reports to {options['save']}.")
+
+    def connect(self, path, pragmas):
+        # Autocommit at the driver level; transactions are opened explicitly
+        # the way Django's atomic() does, with a deferred BEGIN.
+        connection = sqlite3.connect(path, timeout=DEFAULT_TIMEOUT, isolation_level=None, check_same_thread=False)
+        apply_pragmas(connection, pragmas)
+        return connection
+
+    def create_database(self, path, pragmas):
+        connection = self.connect(path, pragmas)
+        connection.execute(
+            'CREATE TABLE submission (id INTEGER PRIMARY KEY, student INTEGER, grade INTEGER, payload BLOB)'
+        )
+        connection.execute('CREATE INDEX submission_student ON submission (student)')
+        connection.executemany('INSERT INTO submission (student, grade, payload) VALUES (?, ?, ?)', (
+            (i % STUDENTS, i % 100, b'') for i in range(SEED_ROWS)
+        ))
+        connection.close()
+
+    def run_profile(self, path, pragmas, retries, options):
+        deadline = time.perf_counter() + options['duration']
+        payload = os.urandom(options['payload'])
+
+        def reader(seed):
+            rng, samples = random.Random(seed), []
+            connection = self.connect(path, pragmas)
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    connection.execute(
+                        'SELECT count(*), avg(grade) FROM submission WHERE student = ?', (rng.randrange(STUDENTS),),
+                    ).fetchone()
+                    samples.append(self.sample('read', start))
+                except sqlite3.OperationalError as exc:
+                    samples.append(self.sample('read', start, exc))
+            connection.close()
+            return samples
+
+        def writer(seed):
+            rng, samples = random.Random(seed), []
+            connection = self.connect(path, pragmas)
+
+            def burst():
+                connection.execute('BEGIN')
+                try:
+                    # Read first, like a view that loads rows before saving:
+                    # the write lock is only requested at the first INSERT.
+                    connection.execute('SELECT max(id) FROM submission').fetchone()
+                    connection.executemany('INSERT INTO submission (student, grade, payload) VALUES (?, ?, ?)', (
+                        (rng.randrange(STUDENTS), None, payload) for _ in range(options['burst'])
+                    ))
+                    connection.executemany('UPDATE submission SET grade = ? WHERE id = ?', (
+                        (rng.randrange(100), rng.randrange(1, SEED_ROWS)) for _ in range(options['burst'])
+                    ))
+                    connection.execute('COMMIT')
+                except BaseException:
+                    connection.execute('ROLLBACK')
+                    raise
+
+            write = retrying(burst, retries=retries)
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    write()
+                    samples.append(self.sample('write', start))
+                except sqlite3.OperationalError as exc:
+                    samples.append(self.sample('write', start, exc))
+            connection.close()
+            return samples
+
+        started = time.perf_counter()
+        workers = options['readers'] + options['writers']
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(reader, i) for i in range(options['readers'])]
+            futures += [executor.submit(writer, 1000 + i) for i in range(options['writers'])]
+            samples = [sample for future in futures for sample in future.result()]
+        return summarize(samples, time.perf_counter() - started)
+
+    def sample(self, step, start, exc=None):
+        elapsed = round((time.perf_counter() - start) * 1000, 3)
+        if exc is None:
+            return step, 200, elapsed, ''
+        return step, 500, elapsed, 'locked' if is_lock_error(exc) else type(exc).__name__
@@ -0,0 +1,43 @@
+import datetime
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from main.models import StoredBlob
+from main.storage import BLOB_PREFIX, submission_storage
+
+
+class Command(BaseCommand):
+    help = "Delete submission blobs that no submission has referenced for the grace period."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-minutes', type=int, default=60)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - datetime.timedelta(minutes=options['grace_minutes'])
+        deleted = freed = 0
+        candidates = StoredBlob.objects.filter(ref_count__lte=0, released_at__lt=cutoff).values_list('pk', 'name', 'size')
+        for pk, name, size in candidates.iterator():
+            if not options['dry_run']:
+                with transaction.atomic():
+                    # Re-checked in the delete so a blob re-acquired meanwhile survives.
+                    removed, _ = StoredBlob.objects.filter(pk=pk, ref_count__lte=0, released_at__lt=cutoff).delete()
+                    if not removed:
+                        continue
+                    submission_storage.delete(name)
+            deleted += 1
+            freed += size
+
+        tmp_dir = submission_storage.path(BLOB_PREFIX + 'tmp')
+        if not options['dry_run'] and os.path.isdir(tmp_dir):
+            # Leftovers of uploads interrupted before they were renamed into place.
+            for entry in os.scandir(tmp_dir):
+                if entry.stat().st_mtime < time.time() - options['grace_minutes'] * 60:
+                    os.remove(entry.path)
+
+        verb = "Would delete" if options['dry_run'] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {deleted} blob(s), {freed / 1024 / 1024:.1f} MiB."))
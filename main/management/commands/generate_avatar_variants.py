@@ -0,0 +1,49 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from main.images import generate_avatar_variants
+
+User = get_user_model()
+
+
+def generate(name, force):
+    # Runs in a worker process and only touches files, never the database.
+    try:
+        return name, generate_avatar_variants(name, force=force), None
+    except (OSError, ValidationError) as exc:
+        return name, 0, str(exc)
+
+
+class Command(BaseCommand):
+    help = "Generate the small, medium and large variants of every profile image, in parallel."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--force', action='store_true', help="Regenerate variants that already exist.")
+
+    def handle(self, *args, **options):
+        names = [
+            name for name in User.objects.exclude(profile_image='').values_list('profile_image', flat=True).distinct()
+            if default_storage.exists(name)
+        ]
+
+        generated = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            futures = [executor.submit(generate, name, options['force']) for name in names]
+            for future in as_completed(futures):
+                name, count, error = future.result()
+                if error:
+                    failed += 1
+                    self.stderr.write(f"{name}: {error}")
+                    continue
+                User.objects.filter(profile_image=name).update(avatar_source=name)
+                generated += count
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {generated} variant(s) for {len(names)} image(s); {failed} failed."
+        ))
@@ -0,0 +1,45 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from main.images import generate_post_derivatives
+from main.models import EducationalPost
+
+
+def generate(pk, name):
+    # Runs in a worker process and only touches files; the parent stores the widths.
+    try:
+        return pk, generate_post_derivatives(name), None
+    except (OSError, ValidationError) as exc:
+        return pk, None, str(exc)
+
+
+class Command(BaseCommand):
+    help = "Generate the WebP and fallback width derivatives of educational post images, in parallel."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--force', action='store_true', help="Regenerate posts that already have derivatives.")
+
+    def handle(self, *args, **options):
+        posts = EducationalPost.objects.exclude(image='').exclude(image=None)
+        if not options['force']:
+            posts = posts.filter(image_widths=[])
+        pending = [(pk, name) for pk, name in posts.values_list('pk', 'image') if default_storage.exists(name)]
+
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            futures = [executor.submit(generate, pk, name) for pk, name in pending]
+            for future in as_completed(futures):
+                pk, widths, error = future.result()
+                if error:
+                    failed += 1
+                    self.stderr.write(f"Post {pk}: {error}")
+                    continue
+                EducationalPost.objects.filter(pk=pk).update(image_widths=widths)
+                done += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Generated derivatives for {done} post(s); {failed} failed."))
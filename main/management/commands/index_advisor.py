@@ -0,0 +1,96 @@
+import json
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+EXPLAINED = ('SELECT', 'UPDATE', 'DELETE', 'WITH')
+# "SCAN main_course" from SQLite 3.36, "SCAN TABLE main_course" before it.
+# Scans through an index, of a subquery or of a virtual table do not match.
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+TEMP_SORT = 'USE TEMP B-TREE'
+SQL_PREVIEW = 200
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay the statements captured in QUERY_LOG files with EXPLAIN QUERY PLAN and report full table scans and "
+        "sorts without an index. Capture a log by running with REQUEST_PROFILING and QUERY_LOG set."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('logs', nargs='*', metavar='LOG', help="Query logs to read; defaults to QUERY_LOG.")
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--ignore', action='append', default=[], metavar='TABLE',
+                            help="Table whose full scans are expected, e.g. a small lookup table. Repeatable.")
+        parser.add_argument('--fail', action='store_true', help="Exit with an error when a full scan is found.")
+
+    def handle(self, *args, **options):
+        paths = options['logs'] or ([settings.QUERY_LOG] if getattr(settings, 'QUERY_LOG', None) else [])
+        if not paths:
+            raise CommandError("No query log given and QUERY_LOG is not set.")
+        statements = self.read_logs(paths)
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError("index_advisor reads SQLite query plans only.")
+
+        ignored = set(options['ignore'])
+        scans = sorts = errors = 0
+        for sql, (params, views) in statements.items():
+            try:
+                plan = self.explain(connection, sql, params)
+            except DatabaseError as exc:
+                errors += 1
+                self.report(self.style.WARNING(f"Could not explain: {exc}"), sql, views, [])
+                continue
+            scanned = [detail for detail in plan if (match := FULL_SCAN.match(detail)) and match[1] not in ignored]
+            sorted_ = [detail for detail in plan if detail.startswith(TEMP_SORT)]
+            if scanned:
+                scans += 1
+                self.report(self.style.ERROR("Full scan"), sql, views, scanned + sorted_)
+            elif sorted_:
+                sorts += 1
+                self.report(self.style.WARNING("Sort without an index"), sql, views, sorted_)
+            elif options['verbosity'] > 1:
+                self.report("Plan", sql, views, plan)
+
+        self.stdout.write(
+            f"Explained {len(statements) - errors} of {len(statements)} statement(s): "
+            f"{scans} with full scans, {sorts} more with temporary sorts."
+        )
+        if scans and options['fail']:
+            raise CommandError(f"{scans} statement(s) scan a whole table.")
+
+    def read_logs(self, paths):
+        # Distinct statements with the parameters of their first run and the
+        # views that ran them.
+        statements = {}
+        for path in paths:
+            try:
+                with open(path, encoding='utf-8') as log:
+                    for line in log:
+                        if not line.strip():
+                            continue
+                        entry = json.loads(line)
+                        if not entry['sql'].lstrip().upper().startswith(EXPLAINED):
+                            continue
+                        _, views = statements.setdefault(entry['sql'], (entry['params'], defaultdict(int)))
+                        views[entry['view']] += 1
+            except OSError as exc:
+                raise CommandError(f"Cannot read {path}: {exc}")
+        return statements
+
+    def explain(self, connection, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def report(self, heading, sql, views, details):
+        preview = sql if len(sql) <= SQL_PREVIEW else sql[:SQL_PREVIEW] + '...'
+        ran_by = ', '.join(f'{view} ({count})' for view, count in sorted(views.items(), key=lambda item: -item[1]))
+        self.stdout.write(f"{heading} in {ran_by}")
+        for detail in details:
+            self.stdout.write(f"  {detail}")
+        self.stdout.write(f"  {preview}")
@@ -0,0 +1,195 @@
+import datetime
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import get_internal_wsgi_application
+from django.db import connections
+from django.urls import reverse
+from django.utils import timezone
+
+from main.availability import SLOT_LABELS, WEEKEND_DAYS
+from main.loadtest import compare, local_server, run_actor, summarize
+from main.management.commands.seed_scale import SEED_PREFIX
+from main.models import Assignment, Comment, Conversation, Course
+
+User = get_user_model()
+
+TARGETS_PER_ACTOR = 20
+SHARED_TARGETS = 200
+BOOKING_DAYS = 30
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive concurrent student and teacher journeys against the WSGI application and report throughput, "
+        "latency percentiles, error rates and 'database is locked' occurrences. Logs in as accounts created by "
+        "seed_scale, resetting their password to --password."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help="Base URL of a running server; by default an in-process threaded "
+                                          "server around WSGI_APPLICATION is started.")
+        parser.add_argument('--students', type=int, default=20)
+        parser.add_argument('--teachers', type=int, default=5)
+        parser.add_argument('--duration', type=float, default=30.0, help="Seconds to keep journeys running.")
+        parser.add_argument('--processes', action='store_true', help="Run each simulated user in its own process "
+                                                                     "instead of a thread.")
+        parser.add_argument('--password', default='load-test-password')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--save', help="Write the run's report to this JSON file.")
+        parser.add_argument('--compare', nargs='+', metavar='REPORT',
+                            help="Compare this run with a saved report, or two saved reports without running.")
+
+    def handle(self, *args, **options):
+        compare_with = options['compare'] or []
+        if len(compare_with) > 2:
+            raise CommandError("--compare takes a baseline report, or a baseline and a second report.")
+        if len(compare_with) == 2:
+            baseline, current = (self.load_report(path) for path in compare_with)
+            self.write_comparison(baseline, current)
+            return
+
+        actors = self.prepare_actors(options)
+        plan = self.prepare_plan()
+        report = self.run(actors, plan, options)
+        self.write_report(report)
+
+        if options['save']:
+            Path(options['save']).write_text(json.dumps(report, indent=2) + '\n')
+            self.stdout.write(f"Saved report to {options['save']}.")
+        if compare_with:
+            self.write_comparison(self.load_report(compare_with[0]), report)
+
+    def load_report(self, path):
+        try:
+            return json.loads(Path(path).read_text())
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Cannot read report {path}: {exc}")
+
+    def prepare_actors(self, options):
+        students = list(User.objects.filter(
+            user_type='student', username__startswith=f'{SEED_PREFIX}student_',
+        ).order_by('id')[:options['students']])
+        teachers = list(User.objects.filter(
+            user_type='teacher', username__startswith=f'{SEED_PREFIX}teacher_',
+        ).order_by('id')[:options['teachers']])
+        if not students and not teachers:
+            raise CommandError("No seeded users found; run seed_scale first.")
+
+        # One hash for every account: hashing is deliberately slow and the
+        # accounts are disposable seed data.
+        User.objects.filter(pk__in=[user.pk for user in students + teachers]).update(
+            password=make_password(options['password']),
+        )
+
+        now = timezone.now()
+        actors = []
+        for student in students:
+            assignments = Assignment.objects.filter(
+                course__enrollment__student=student, deadline__gt=now,
+            ).values_list('course_id', 'id')[:TARGETS_PER_ACTOR]
+            actors.append(self.actor(student, 'student', options['password'], assignments=[
+                (reverse('student_assignments_view', kwargs={'course_id': course}), assignment)
+                for course, assignment in assignments
+            ]))
+        for teacher in teachers:
+            courses = Course.objects.filter(teacher=teacher).values_list('id', flat=True)[:TARGETS_PER_ACTOR]
+            assignments = Assignment.objects.filter(
+                course__teacher=teacher,
+            ).values_list('id', flat=True)[:TARGETS_PER_ACTOR]
+            actors.append(self.actor(
+                teacher, 'teacher', options['password'],
+                courses=[reverse('course_detail', kwargs={'course_id': course}) for course in courses],
+                submissions=[
+                    reverse('assignment_submissions_view', kwargs={'assignment_id': assignment})
+                    for assignment in assignments
+                ],
+            ))
+        return actors
+
+    def actor(self, user, role, password, **targets):
+        return {
+            'role': role,
+            'username': user.username,
+            'password': password,
+            'urls': {
+                'login': reverse('login'),
+                'dashboard': reverse(f'{role}_dashboard'),
+                'placement_test': reverse('placement_test'),
+            },
+            **targets,
+        }
+
+    def prepare_plan(self):
+        conversations = Conversation.objects.order_by('-id').values_list('id', flat=True)[:SHARED_TARGETS]
+        comments = Comment.objects.filter(
+            conversation__in=list(conversations),
+        ).values_list('id', flat=True)[:SHARED_TARGETS]
+        return {
+            'conversations': [
+                (reverse('conversation_detail', kwargs={'pk': pk}), reverse('comment_create', kwargs={'pk': pk}))
+                for pk in conversations
+            ],
+            'likes': [reverse('like_comment', kwargs={'comment_id': pk}) for pk in comments],
+            'first_booking_day': timezone.localdate() + datetime.timedelta(days=1),
+            'booking_days': BOOKING_DAYS,
+            'weekend_days': WEEKEND_DAYS,
+            'slots': SLOT_LABELS,
+        }
+
+    def run(self, actors, plan, options):
+        server = nullcontext((options['url'], None)) if options['url'] \
+            else local_server(get_internal_wsgi_application())
+        pool = ProcessPoolExecutor if options['processes'] else ThreadPoolExecutor
+
+        with server as (base_url, lock_counter):
+            self.stdout.write(
+                f"Running {len(actors)} simulated user(s) against {base_url} for {options['duration']:.0f}s..."
+            )
+            # Forked workers must not share the parent's SQLite handle.
+            connections.close_all()
+            started = time.perf_counter()
+            deadline = time.time() + options['duration']
+            with pool(max_workers=len(actors)) as executor:
+                futures = [
+                    executor.submit(run_actor, base_url, actor, plan, deadline, options['seed'] + i)
+                    for i, actor in enumerate(actors)
+                ]
+                samples = [sample for future in futures for sample in future.result()]
+            elapsed = time.perf_counter() - started
+            server_locked = lock_counter.count if lock_counter else 0
+
+        return summarize(samples, elapsed, server_locked)
+
+    def write_report(self, report):
+        total = report['total']
+        self.stdout.write(
+            f"{total['requests']} request(s) in {total['elapsed_s']}s: {total['throughput_rps']} req/s, "
+            f"p50 {total['p50_ms']}ms, p90 {total['p90_ms']}ms, p99 {total['p99_ms']}ms, "
+            f"error rate {total['error_rate']:.2%}, {total['locked']} locked response(s), "
+            f"{total['server_locked']} locked error(s) logged by the server."
+        )
+        self.stdout.write(f"{'step':<24}{'requests':>9}{'errors':>8}{'locked':>8}{'p50':>10}{'p90':>10}{'p99':>10}")
+        for step, stats in report['steps'].items():
+            self.stdout.write(
+                f"{step:<24}{stats['requests']:>9}{stats['errors']:>8}{stats['locked']:>8}"
+                f"{stats['p50_ms']:>10}{stats['p90_ms']:>10}{stats['p99_ms']:>10}"
+            )
+        if total['locked'] or total['server_locked']:
+            self.stdout.write(self.style.WARNING("SQLite lock contention detected."))
+
+    def write_comparison(self, baseline, current):
+        self.stdout.write(f"{'step':<24}{'metric':<16}{'baseline':>12}{'current':>12}{'change':>10}")
+        for step, metric, before, after in compare(baseline, current):
+            if before and after is not None:
+                change = f'{(after - before) / before:+.1%}'
+            else:
+                change = '-'
+            self.stdout.write(f"{step:<24}{metric:<16}{before if before is not None else '-':>12}"
+                              f"{after if after is not None else '-':>12}{change:>10}")
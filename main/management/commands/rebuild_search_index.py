@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the FTS5 indexes over conversations, comments, educational posts and students."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} document(s)."))
@@ -0,0 +1,37 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from main.models import CONVERSATION_TOPICS, Comment, Conversation, TopicCounter
+
+User = get_user_model()
+
+
+def count_of(queryset, field):
+    return Coalesce(
+        Subquery(queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(n=Count('*')).values('n')),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-topic conversation counters, every user's conversation_count and comment like counts."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            topic_counts = dict(Conversation.objects.values_list('topic').annotate(count=Count('id')))
+            for topic, _ in CONVERSATION_TOPICS:
+                TopicCounter.objects.update_or_create(
+                    topic=topic,
+                    defaults={'conversation_count': topic_counts.get(topic, 0)}
+                )
+
+            users = User.objects.update(conversation_count=count_of(Conversation.objects.all(), 'user'))
+            comments = Comment.objects.update(like_count=count_of(Comment.likes.through.objects.all(), 'comment'))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {len(CONVERSATION_TOPICS)} topic counter(s), {users} user count(s) "
+            f"and {comments} comment like count(s)."
+        ))
@@ -0,0 +1,28 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Avg, Count, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from main.models import Rating
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized rating_sum, rating_count and rating columns of every teacher."
+
+    def handle(self, *args, **options):
+        ratings = Rating.objects.filter(teacher=OuterRef('pk')).order_by().values('teacher')
+
+        def aggregate(expression):
+            return Subquery(ratings.annotate(value=expression).values('value'))
+
+        with transaction.atomic():
+            updated = User.objects.filter(user_type='teacher').update(
+                rating_sum=Coalesce(aggregate(Sum('score')), 0),
+                rating_count=Coalesce(aggregate(Count('id')), 0),
+                rating=Coalesce(aggregate(Avg('score')), Value(0.0), output_field=FloatField()),
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Recomputed ratings for {updated} teacher(s)."))
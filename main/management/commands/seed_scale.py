@@ -0,0 +1,378 @@
+import datetime
+import random
+import time
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from main.availability import SLOTS, WEEKEND_DAYS
+from main.search import rebuild_index, search_triggers_suspended
+from main.storage import submission_storage
+from main.models import (
+    CONVERSATION_TOPICS, ENGLISH_LEVELS, Assignment, AssignmentSubmission, Comment, Conversation, Course,
+    EducationalPost, Enrollment, EnrollmentRequest, Exam, ExamSubmission, PlacementTestReservation, Rating,
+    StoredBlob,
+)
+
+User = get_user_model()
+
+SEED_PREFIX = 'seed_'
+PLACEMENT_TEACHER = 'Mahdieh Arabi'
+PLACEHOLDER_PDF = b'%PDF-1.4\n1 0 obj<</Type/Catalog>>endobj\ntrailer<</Root 1 0 R>>\n%%EOF\n'
+WORDS = (
+    'grammar practice reading speaking vocabulary idiom movie music book daily life fun social topic '
+    'lesson homework exam teacher student class question answer example sentence tense present perfect '
+    'past future conditional article preposition listening writing pronunciation accent story'
+).split()
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    help = "Generate a deterministic, production-sized academy dataset with batched bulk inserts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teachers', type=int, default=50)
+        parser.add_argument('--students', type=int, default=5000)
+        parser.add_argument('--courses', type=int, default=200)
+        parser.add_argument('--enrollments-per-student', type=int, default=3)
+        parser.add_argument('--requests-per-student', type=int, default=1)
+        parser.add_argument('--assignments-per-course', type=int, default=10)
+        parser.add_argument('--exams-per-course', type=int, default=2)
+        parser.add_argument('--submission-rate', type=float, default=0.6)
+        parser.add_argument('--conversations', type=int, default=20000)
+        parser.add_argument('--comments-per-conversation', type=int, default=10)
+        parser.add_argument('--likes-per-comment', type=int, default=2)
+        parser.add_argument('--posts', type=int, default=500)
+        parser.add_argument('--reservations', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--flush', action='store_true', help="Delete previously seeded users and their data first.")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.naive_now = datetime.datetime.fromisoformat(connection.ops.adapt_datetimefield_value(self.now))
+        self.rows = 0
+        self.course_students = {}
+        started = time.perf_counter()
+
+        # Search triggers are dropped for the load and the indexes rebuilt in
+        # one pass afterwards, which is several times faster than per-row upkeep.
+        with transaction.atomic(), search_triggers_suspended():
+            if options['flush']:
+                deleted, _ = User.objects.filter(username__startswith=SEED_PREFIX).delete()
+                self.stdout.write(f"Flushed {deleted} seeded row(s).")
+
+            teachers = self.create_users('teacher', options['teachers'])
+            students = self.create_users('student', options['students'])
+            courses = self.create_courses(teachers, options['courses'])
+            self.create_enrollments(students, courses, options)
+            self.create_coursework(courses, options)
+            self.create_forum(teachers + students, options)
+            self.create_posts(teachers, options['posts'])
+            self.create_ratings(courses)
+            self.create_reservations(students, options['reservations'])
+            rebuild_index()
+
+        call_command('recompute_ratings', stdout=self.stdout)
+        call_command('recompute_conversation_counters', stdout=self.stdout)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {self.rows} row(s) in {time.perf_counter() - started:.1f}s."
+        ))
+
+    def insert(self, model, columns, rows, **constants):
+        # Plain executemany batches skip model instantiation and per-row SQL
+        # compilation, which dominate bulk_create at this volume.
+        fields = {field.column: field for field in model._meta.concrete_fields}
+        fixed = [fields[column].get_db_prep_save(value, connection) for column, value in constants.items()]
+        names = list(columns) + list(constants)
+        sql = (
+            f"INSERT INTO {model._meta.db_table} ({', '.join(names)}) "
+            f"VALUES ({', '.join(['%s'] * len(names))})"
+        )
+        with connection.cursor() as cursor:
+            for batch in chunked(rows, self.batch_size):
+                cursor.executemany(sql, [tuple(row) + tuple(fixed) for row in batch])
+                self.rows += len(batch)
+
+    def next_ids(self, model, count):
+        start = (model.objects.aggregate(top=Max('pk'))['top'] or 0) + 1
+        return list(range(start, start + count))
+
+    def timestamp(self, days_ago_max=365):
+        moment = self.naive_now - datetime.timedelta(minutes=self.rng.randint(0, days_ago_max * 24 * 60))
+        return moment.isoformat(' ')
+
+    def text(self, words):
+        return ' '.join(self.rng.choices(WORDS, k=words))
+
+    def placeholder(self, upload_to):
+        # Identical bytes, so every seeded submission shares one stored blob.
+        return submission_storage.save(f'{upload_to}/seed_placeholder.pdf', ContentFile(PLACEHOLDER_PDF))
+
+    def count_placeholder_refs(self, name):
+        refs = (
+            AssignmentSubmission.objects.filter(submitted_file=name).count()
+            + ExamSubmission.objects.filter(file=name).count()
+        )
+        StoredBlob.objects.update_or_create(name=name, defaults={
+            'size': submission_storage.size(name), 'ref_count': refs, 'released_at': None,
+        })
+
+    def create_users(self, user_type, count):
+        ids = self.next_ids(User, count)
+        offset = User.objects.filter(username__startswith=f'{SEED_PREFIX}{user_type}_').count()
+        levels = [level for level, _ in ENGLISH_LEVELS]
+        rows = (
+            (
+                pk,
+                f'{SEED_PREFIX}{user_type}_{offset + i}',
+                f'{SEED_PREFIX}{user_type}_{offset + i}@example.com',
+                self.rng.choice(WORDS).title(),
+                self.rng.choice(WORDS).title(),
+                self.rng.choice(levels) if user_type == 'student' else None,
+            )
+            for i, pk in enumerate(ids)
+        )
+        self.insert(
+            User, ['id', 'username', 'email', 'first_name', 'last_name', 'level'], rows,
+            password=make_password(None), user_type=user_type, is_superuser=False, is_staff=False,
+            is_active=True, date_joined=self.now, profile_image='profile_pics/default.png',
+            rating=0.0, rating_sum=0, rating_count=0, conversation_count=0, avatar_source='',
+        )
+        self.stdout.write(f"Created {count} {user_type}(s).")
+        return ids
+
+    def create_courses(self, teachers, count):
+        if not teachers:
+            return []
+        ids = self.next_ids(Course, count)
+        levels = [level for level, _ in Course.LEVEL_CHOICES]
+        days = [value for value, _ in Course.DAYS_CHOICES]
+        times = [value for value, _ in Course.TIME_CHOICES]
+        today = self.now.date()
+        rows = (
+            (
+                pk,
+                f'{self.text(2).title()} {i}',
+                self.rng.choice(levels),
+                self.text(20),
+                self.rng.choice(days),
+                self.rng.choice(times),
+                self.rng.choice(teachers),
+                (today + datetime.timedelta(days=self.rng.randint(-180, 60))).isoformat(),
+            )
+            for i, pk in enumerate(ids)
+        )
+        self.insert(
+            Course,
+            ['id', 'title', 'required_level', 'description', 'class_days', 'class_time', 'teacher_id', 'start_date'],
+            rows, join_link='#',
+        )
+        self.stdout.write(f"Created {count} course(s).")
+        return ids
+
+    def create_enrollments(self, students, courses, options):
+        if not courses:
+            return
+        self.course_students = {course: [] for course in courses}
+        per_student = min(options['enrollments_per_student'], len(courses))
+        enrollments = []
+        for student in students:
+            for course in self.rng.sample(courses, per_student):
+                self.course_students[course].append(student)
+                grade = self.rng.randint(0, 100) if self.rng.random() < 0.4 else None
+                enrollments.append((student, course, grade))
+        self.insert(Enrollment, ['student_id', 'course_id', 'grade'], enrollments)
+
+        per_student = min(options['requests_per_student'], len(courses))
+        requests = (
+            (
+                student, course, f'Student {student}', self.rng.randint(12, 60),
+                f'student{student}@example.com', self.text(8), self.timestamp(), self.rng.random() < 0.5,
+            )
+            for student in students
+            for course in self.rng.sample(courses, per_student)
+        )
+        self.insert(
+            EnrollmentRequest,
+            ['student_id', 'course_id', 'full_name', 'age', 'email', 'message', 'created_at', 'is_seen'],
+            requests, phone='09120000000', is_approved=None,
+        )
+        self.stdout.write(f"Created {len(enrollments)} enrollment(s) and their requests.")
+
+    def create_coursework(self, courses, options):
+        if not courses:
+            return
+        rate = options['submission_rate']
+        per_course = options['assignments_per_course']
+        assignment_ids = self.next_ids(Assignment, len(courses) * per_course)
+        assignment_courses = [(pk, courses[i // per_course]) for i, pk in enumerate(assignment_ids)]
+        self.insert(
+            Assignment, ['id', 'course_id', 'title', 'description', 'deadline', 'created_at'],
+            (
+                (pk, course, f'Homework {i % per_course + 1}', self.text(15),
+                 connection.ops.adapt_datetimefield_value(
+                     self.now + datetime.timedelta(days=self.rng.randint(-30, 30))),
+                 self.timestamp(60))
+                for i, (pk, course) in enumerate(assignment_courses)
+            ),
+        )
+        self.insert(
+            AssignmentSubmission, ['assignment_id', 'student_id', 'graded', 'grade'],
+            (
+                (assignment, student, graded, self.rng.randint(0, 20) if graded else None)
+                for assignment, course in assignment_courses
+                for student in self.course_students[course]
+                if self.rng.random() < rate
+                for graded in [self.rng.random() < 0.5]
+            ),
+            submitted_file=self.placeholder('assignments'), original_name='assignment.pdf', submitted_at=self.now,
+            feedback=None,
+        )
+
+        per_course = options['exams_per_course']
+        exam_ids = self.next_ids(Exam, len(courses) * per_course)
+        exam_courses = [(pk, courses[i // per_course]) for i, pk in enumerate(exam_ids)]
+        self.insert(
+            Exam, ['id', 'course_id', 'title', 'description', 'deadline', 'created'],
+            (
+                (pk, course, f'Exam {i % per_course + 1}', self.text(10),
+                 connection.ops.adapt_datetimefield_value(
+                     self.now + datetime.timedelta(days=self.rng.randint(-30, 30))),
+                 self.timestamp(60))
+                for i, (pk, course) in enumerate(exam_courses)
+            ),
+            file=None,
+        )
+        self.insert(
+            ExamSubmission, ['exam_id', 'student_id', 'graded', 'grade'],
+            (
+                (exam, student, graded, f'{self.rng.randint(0, 100)}.00' if graded else None)
+                for exam, course in exam_courses
+                for student in self.course_students[course]
+                if self.rng.random() < rate
+                for graded in [self.rng.random() < 0.5]
+            ),
+            file=self.placeholder('exam_submissions'), original_name='exam.pdf', submitted_at=self.now,
+        )
+        self.count_placeholder_refs(self.placeholder('assignments'))
+        self.stdout.write(
+            f"Created {len(assignment_ids)} assignment(s) and {len(exam_ids)} exam(s) with submissions."
+        )
+
+    def create_forum(self, users, options):
+        if not users:
+            return
+        topics = [topic for topic, _ in CONVERSATION_TOPICS]
+        conversation_ids = self.next_ids(Conversation, options['conversations'])
+        self.insert(
+            Conversation, ['id', 'topic', 'user_id', 'title', 'body', 'created', 'updated'],
+            (
+                (pk, self.rng.choice(topics), self.rng.choice(users), self.text(6).capitalize() + '?',
+                 self.text(40), created, created)
+                for pk in conversation_ids
+                for created in [self.timestamp()]
+            ),
+        )
+
+        per_conversation = options['comments_per_conversation']
+        comment_conversations = [
+            conversation
+            for conversation in conversation_ids
+            for _ in range(self.rng.randint(0, per_conversation * 2))
+        ]
+        comment_ids = self.next_ids(Comment, len(comment_conversations))
+        self.insert(
+            Comment, ['id', 'conversation_id', 'user_id', 'body', 'created'],
+            (
+                (pk, conversation, self.rng.choice(users), self.text(25), self.timestamp())
+                for pk, conversation in zip(comment_ids, comment_conversations)
+            ),
+            like_count=0,
+        )
+
+        per_comment = min(options['likes_per_comment'], len(users) // 2)
+        self.insert(
+            Comment.likes.through, ['comment_id', 'customuser_id'],
+            (
+                (comment, user)
+                for comment in comment_ids
+                for user in self.rng.sample(users, self.rng.randint(0, per_comment * 2))
+            ),
+        )
+        self.stdout.write(f"Created {len(conversation_ids)} conversation(s) and {len(comment_ids)} comment(s).")
+
+    def create_posts(self, teachers, count):
+        if not teachers:
+            return
+        self.insert(
+            EducationalPost, ['teacher_id', 'title', 'description', 'created'],
+            (
+                (self.rng.choice(teachers), self.text(5).title(), self.text(60), self.timestamp())
+                for _ in range(count)
+            ),
+            image=None, image_widths=[],
+        )
+        self.stdout.write(f"Created {count} educational post(s).")
+
+    def create_ratings(self, courses):
+        if not courses:
+            return
+        teacher_of = dict(Course.objects.filter(pk__in=courses).values_list('id', 'teacher_id'))
+        ratings = {}
+        for course, enrolled in self.course_students.items():
+            for student in enrolled:
+                if self.rng.random() < 0.3:
+                    ratings[(student, teacher_of[course])] = self.rng.randint(1, 5)
+        self.insert(
+            Rating, ['student_id', 'teacher_id', 'score'],
+            ((student, teacher, score) for (student, teacher), score in ratings.items()),
+            comment=None, created_at=self.now,
+        )
+        self.stdout.write(f"Created {len(ratings)} rating(s).")
+
+    def create_reservations(self, students, count):
+        if not students or not count:
+            return
+        teacher, _ = User.objects.get_or_create(username=PLACEMENT_TEACHER, defaults={'user_type': 'teacher'})
+        taken = set(PlacementTestReservation.objects.values_list('date', 'time'))
+        levels = [level for level, _ in ENGLISH_LEVELS]
+        today = self.now.date()
+
+        def free_slots():
+            day = today - datetime.timedelta(days=count // len(SLOTS))
+            while True:
+                if day.weekday() not in WEEKEND_DAYS:
+                    for slot in SLOTS:
+                        if (day, slot) not in taken:
+                            yield day, slot
+                day += datetime.timedelta(days=1)
+
+        self.insert(
+            PlacementTestReservation, ['user_id', 'full_name', 'level', 'date', 'time', 'is_seen'],
+            (
+                (self.rng.choice(students), f'Student {i}', self.rng.choice(levels),
+                 day.isoformat(), slot.isoformat(), day < today)
+                for i, (day, slot) in zip(range(count), free_slots())
+            ),
+            phone='09120000000', assigned_teacher_id=teacher.pk,
+        )
+        self.stdout.write(f"Created {count} placement test reservation(s).")
@@ -0,0 +1,242 @@
+import json
+import logging
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+
+from . import routers
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_SIZE = 1000
+
+_local = threading.local()
+_stats_lock = threading.Lock()
+_query_log_lock = threading.Lock()
+_stats = defaultdict(lambda: {
+    'requests': 0,
+    'queries': 0,
+    'duplicates': 0,
+    'budget_violations': 0,
+    'db_ms': 0.0,
+    'template_ms': 0.0,
+    'total_ms': 0.0,
+    'max_queries': 0,
+    'latencies': deque(maxlen=SAMPLE_SIZE),
+})
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestProfile:
+    def __init__(self):
+        self.queries = Counter()
+        self.params = {}
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries[sql] += 1
+            self.params.setdefault(sql, params)
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+    @property
+    def duplicate_count(self):
+        return sum(count - 1 for count in self.queries.values() if count > 1)
+
+
+_original_template_render = Template._render
+
+
+def _timed_template_render(self, context):
+    profile = getattr(_local, 'profile', None)
+    if profile is None or profile.template_depth:
+        return _original_template_render(self, context)
+
+    profile.template_depth += 1
+    start = time.perf_counter()
+    try:
+        return _original_template_render(self, context)
+    finally:
+        profile.template_time += time.perf_counter() - start
+        profile.template_depth -= 1
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def profiling_report():
+    with _stats_lock:
+        report = {}
+        for name, entry in _stats.items():
+            requests = entry['requests']
+            report[name] = {
+                'requests': requests,
+                'avg_queries': round(entry['queries'] / requests, 2),
+                'max_queries': entry['max_queries'],
+                'avg_duplicates': round(entry['duplicates'] / requests, 2),
+                'budget_violations': entry['budget_violations'],
+                'avg_db_ms': round(entry['db_ms'] / requests, 2),
+                'avg_template_ms': round(entry['template_ms'] / requests, 2),
+                'avg_total_ms': round(entry['total_ms'] / requests, 2),
+                'p50_ms': round(_percentile(entry['latencies'], 0.50), 2),
+                'p95_ms': round(_percentile(entry['latencies'], 0.95), 2),
+                'p99_ms': round(_percentile(entry['latencies'], 0.99), 2),
+            }
+        return report
+
+
+def reset_profiling_report():
+    with _stats_lock:
+        _stats.clear()
+
+
+class RequestProfilingMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.budgets = getattr(settings, 'QUERY_BUDGETS', {})
+        self.budget_action = getattr(settings, 'QUERY_BUDGET_ACTION', 'log')
+        self.query_log = getattr(settings, 'QUERY_LOG', None)
+        Template._render = _timed_template_render
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        _local.profile = profile
+        start = time.perf_counter()
+        try:
+            with self._wrap_connections(profile):
+                response = self.get_response(request)
+        finally:
+            _local.profile = None
+        total = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        name = match.view_name if match else request.path
+        self._record(name, profile, total)
+        if self.query_log:
+            self._log_queries(name, profile)
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={profile.db_time * 1000:.1f};desc="{profile.query_count} queries, '
+            f'{profile.duplicate_count} duplicates"',
+            f'tpl;dur={profile.template_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+        budget = self.budgets.get(name)
+        if budget is not None and profile.query_count > budget:
+            self._over_budget(name, profile, budget)
+
+        return response
+
+    def _wrap_connections(self, profile):
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(profile))
+        return stack
+
+    def _record(self, name, profile, total):
+        with _stats_lock:
+            entry = _stats[name]
+            entry['requests'] += 1
+            entry['queries'] += profile.query_count
+            entry['duplicates'] += profile.duplicate_count
+            entry['db_ms'] += profile.db_time * 1000
+            entry['template_ms'] += profile.template_time * 1000
+            entry['total_ms'] += total * 1000
+            entry['max_queries'] = max(entry['max_queries'], profile.query_count)
+            entry['latencies'].append(total * 1000)
+            if name in self.budgets and profile.query_count > self.budgets[name]:
+                entry['budget_violations'] += 1
+
+    def _log_queries(self, name, profile):
+        # One JSON line per distinct statement, with the parameters of its
+        # first run, for manage.py index_advisor to replay.
+        lines = ''.join(
+            json.dumps({'view': name, 'sql': sql, 'params': profile.params[sql]}, default=str) + '\n'
+            for sql in profile.queries
+        )
+        with _query_log_lock, open(self.query_log, 'a', encoding='utf-8') as log:
+            log.write(lines)
+
+    def _over_budget(self, name, profile, budget):
+        message = (
+            f"{name} ran {profile.query_count} queries (budget {budget}, "
+            f"{profile.duplicate_count} duplicates)"
+        )
+        repeated = [sql for sql, count in profile.queries.most_common(3) if count > 1]
+        if self.budget_action == 'raise':
+            raise QueryBudgetExceeded(message)
+        logger.warning("%s; most repeated: %s", message, repeated)
+
+
+class ReplicaPinningMiddleware:
+    # Scopes replica routing to the request: unsafe methods and any request
+    # that writes read from the primary from then on, and a response to one
+    # carries a cookie that keeps the client on the primary for
+    # REPLICA_PIN_SECONDS, so a redirect after a POST shows its own writes even
+    # when the replica lags. Works for sync and async views alike, so async
+    # read views do not pay for a thread switch.
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+    COOKIE_NAME = 'primary_pin'
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if routers.REPLICA not in settings.DATABASES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = routers.start_request(self._pinned(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            pin = routers.finish_request(token)
+        return self._finish(pin, response)
+
+    async def __acall__(self, request):
+        token = routers.start_request(self._pinned(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            pin = routers.finish_request(token)
+        return self._finish(pin, response)
+
+    def _pinned(self, request):
+        return request.method not in self.SAFE_METHODS or self.COOKIE_NAME in request.COOKIES
+
+    def _finish(self, pin, response):
+        if pin.wrote and self.pin_seconds:
+            response.set_cookie(self.COOKIE_NAME, '1', max_age=self.pin_seconds, httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.23 on 2026-10-18 13:04
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_ratings(apps, schema_editor):
+    CustomUser = apps.get_model('main', 'CustomUser')
+    Rating = apps.get_model('main', 'Rating')
+    totals = Rating.objects.values('teacher').annotate(total=Sum('score'), count=Count('id'))
+    for row in totals:
+        CustomUser.objects.filter(pk=row['teacher']).update(
+            rating_sum=row['total'],
+            rating_count=row['count'],
+            rating=row['total'] / row['count'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0028_examsubmission_graded'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
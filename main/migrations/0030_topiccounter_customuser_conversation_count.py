@@ -0,0 +1,43 @@
+# Generated by Django 4.2.23 on 2026-10-18 13:05
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_conversation_counters(apps, schema_editor):
+    Conversation = apps.get_model('main', 'Conversation')
+    CustomUser = apps.get_model('main', 'CustomUser')
+    TopicCounter = apps.get_model('main', 'TopicCounter')
+
+    topic_counts = dict(Conversation.objects.values_list('topic').annotate(count=Count('id')))
+    TopicCounter.objects.bulk_create([
+        TopicCounter(topic=topic, conversation_count=topic_counts.get(topic, 0))
+        for topic, _ in Conversation._meta.get_field('topic').choices
+    ])
+
+    for user_id, count in Conversation.objects.values_list('user').annotate(count=Count('id')):
+        CustomUser.objects.filter(pk=user_id).update(conversation_count=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0029_customuser_rating_sum_rating_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TopicCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topic', models.CharField(choices=[('Reading Skills', 'Reading Skills'), ('English Grammar', 'English Grammar'), ('Speaking', 'Speaking'), ('Vocabulary and Idiom', 'Vocabulary and Idiom'), ('Daily Life', 'Daily Life'), ('Fun', 'Fun'), ('Social Topics', 'Social Topics'), ('Movies', 'Movies'), ('Books', 'Books'), ('Music', 'Music')], max_length=100, unique=True)),
+                ('conversation_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='conversation_count',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(backfill_conversation_counters, migrations.RunPython.noop),
+    ]
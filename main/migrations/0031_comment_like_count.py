@@ -0,0 +1,26 @@
+# Generated by Django 4.2.23 on 2026-10-18 13:06
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_like_counts(apps, schema_editor):
+    Comment = apps.get_model('main', 'Comment')
+    for comment_id, count in Comment.likes.through.objects.values_list('comment').annotate(count=Count('id')):
+        Comment.objects.filter(pk=comment_id).update(like_count=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0030_topiccounter_customuser_conversation_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_like_counts, migrations.RunPython.noop),
+    ]
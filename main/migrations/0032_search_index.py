@@ -0,0 +1,64 @@
+from django.db import migrations
+
+# Each document's rowid is object_id * 4 + kind, so triggers and result
+# hydration address rows by primary key instead of scanning the index.
+CONVERSATION, COMMENT, POST = 1, 2, 3
+
+CREATE_SQL = [
+    "CREATE VIRTUAL TABLE main_searchindex USING fts5(title, body, tokenize='porter unicode61')",
+
+    f"""CREATE TRIGGER main_conversation_search_insert AFTER INSERT ON main_conversation BEGIN
+        INSERT INTO main_searchindex(rowid, title, body) VALUES (new.id * 4 + {CONVERSATION}, new.title, new.body);
+    END""",
+    f"""CREATE TRIGGER main_conversation_search_update AFTER UPDATE OF title, body ON main_conversation BEGIN
+        DELETE FROM main_searchindex WHERE rowid = old.id * 4 + {CONVERSATION};
+        INSERT INTO main_searchindex(rowid, title, body) VALUES (new.id * 4 + {CONVERSATION}, new.title, new.body);
+    END""",
+    f"""CREATE TRIGGER main_conversation_search_delete AFTER DELETE ON main_conversation BEGIN
+        DELETE FROM main_searchindex WHERE rowid = old.id * 4 + {CONVERSATION};
+    END""",
+
+    f"""CREATE TRIGGER main_comment_search_insert AFTER INSERT ON main_comment BEGIN
+        INSERT INTO main_searchindex(rowid, title, body) VALUES (new.id * 4 + {COMMENT}, '', new.body);
+    END""",
+    f"""CREATE TRIGGER main_comment_search_update AFTER UPDATE OF body ON main_comment BEGIN
+        DELETE FROM main_searchindex WHERE rowid = old.id * 4 + {COMMENT};
+        INSERT INTO main_searchindex(rowid, title, body) VALUES (new.id * 4 + {COMMENT}, '', new.body);
+    END""",
+    f"""CREATE TRIGGER main_comment_search_delete AFTER DELETE ON main_comment BEGIN
+        DELETE FROM main_searchindex WHERE rowid = old.id * 4 + {COMMENT};
+    END""",
+
+    f"""CREATE TRIGGER main_educationalpost_search_insert AFTER INSERT ON main_educationalpost BEGIN
+        INSERT INTO main_searchindex(rowid, title, body) VALUES (new.id * 4 + {POST}, new.title, new.description);
+    END""",
+    f"""CREATE TRIGGER main_educationalpost_search_update AFTER UPDATE OF title, description ON main_educationalpost BEGIN
+        DELETE FROM main_searchindex WHERE rowid = old.id * 4 + {POST};
+        INSERT INTO main_searchindex(rowid, title, body) VALUES (new.id * 4 + {POST}, new.title, new.description);
+    END""",
+    f"""CREATE TRIGGER main_educationalpost_search_delete AFTER DELETE ON main_educationalpost BEGIN
+        DELETE FROM main_searchindex WHERE rowid = old.id * 4 + {POST};
+    END""",
+
+    f"""INSERT INTO main_searchindex(rowid, title, body)
+        SELECT id * 4 + {CONVERSATION}, title, body FROM main_conversation
+        UNION ALL SELECT id * 4 + {COMMENT}, '', body FROM main_comment
+        UNION ALL SELECT id * 4 + {POST}, title, description FROM main_educationalpost""",
+]
+
+DROP_SQL = [
+    f"DROP TRIGGER IF EXISTS main_{table}_search_{event}"
+    for table in ('conversation', 'comment', 'educationalpost')
+    for event in ('insert', 'update', 'delete')
+] + ["DROP TABLE IF EXISTS main_searchindex"]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0031_comment_like_count'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_SQL, reverse_sql=DROP_SQL),
+    ]
@@ -0,0 +1,52 @@
+from django.db import migrations
+
+STUDENT_FIELDS = "new.username, trim(new.first_name || ' ' || new.last_name), new.email"
+
+CREATE_SQL = [
+    "CREATE INDEX main_customuser_username_nocase ON main_customuser(username COLLATE NOCASE)",
+    "CREATE INDEX main_customuser_first_name_nocase ON main_customuser(first_name COLLATE NOCASE)",
+    "CREATE INDEX main_customuser_last_name_nocase ON main_customuser(last_name COLLATE NOCASE)",
+    "CREATE INDEX main_customuser_email_nocase ON main_customuser(email COLLATE NOCASE)",
+
+    "CREATE VIRTUAL TABLE main_studentsearch USING fts5(username, full_name, email, tokenize='trigram')",
+
+    f"""CREATE TRIGGER main_customuser_student_search_insert AFTER INSERT ON main_customuser
+        WHEN new.user_type = 'student' BEGIN
+        INSERT INTO main_studentsearch(rowid, username, full_name, email) VALUES (new.id, {STUDENT_FIELDS});
+    END""",
+    f"""CREATE TRIGGER main_customuser_student_search_update
+        AFTER UPDATE OF username, first_name, last_name, email, user_type ON main_customuser BEGIN
+        DELETE FROM main_studentsearch WHERE rowid = old.id;
+        INSERT INTO main_studentsearch(rowid, username, full_name, email)
+            SELECT new.id, {STUDENT_FIELDS} WHERE new.user_type = 'student';
+    END""",
+    """CREATE TRIGGER main_customuser_student_search_delete AFTER DELETE ON main_customuser BEGIN
+        DELETE FROM main_studentsearch WHERE rowid = old.id;
+    END""",
+
+    """INSERT INTO main_studentsearch(rowid, username, full_name, email)
+        SELECT id, username, trim(first_name || ' ' || last_name), email
+        FROM main_customuser WHERE user_type = 'student'""",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS main_customuser_student_search_insert",
+    "DROP TRIGGER IF EXISTS main_customuser_student_search_update",
+    "DROP TRIGGER IF EXISTS main_customuser_student_search_delete",
+    "DROP TABLE IF EXISTS main_studentsearch",
+    "DROP INDEX IF EXISTS main_customuser_username_nocase",
+    "DROP INDEX IF EXISTS main_customuser_first_name_nocase",
+    "DROP INDEX IF EXISTS main_customuser_last_name_nocase",
+    "DROP INDEX IF EXISTS main_customuser_email_nocase",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0032_search_index'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_SQL, reverse_sql=DROP_SQL),
+    ]
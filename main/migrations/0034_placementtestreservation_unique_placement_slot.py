@@ -0,0 +1,17 @@
+# Generated by Django 4.2.23 on 2026-10-18 13:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0033_student_search_index'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='placementtestreservation',
+            constraint=models.UniqueConstraint(fields=('date', 'time'), name='unique_placement_slot'),
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 4.2.23 on 2026-10-18 14:08
+
+import os
+from collections import Counter
+
+import main.storage
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import migrations, models
+
+SUBMISSION_FIELDS = (('AssignmentSubmission', 'submitted_file'), ('ExamSubmission', 'file'))
+
+
+def move_submissions_to_blobs(apps, schema_editor):
+    storage = main.storage.ContentAddressedStorage()
+    adopted = {}
+    refs = Counter()
+    for model_name, field in SUBMISSION_FIELDS:
+        model = apps.get_model('main', model_name)
+        for pk, name in model.objects.exclude(**{field: ''}).values_list('pk', field).iterator():
+            if main.storage.is_blob(name):
+                if not os.path.exists(storage.path(name)):
+                    continue
+            else:
+                if name not in adopted:
+                    adopted[name] = storage.adopt(name) if os.path.exists(storage.path(name)) else None
+                if adopted[name] is None:
+                    continue
+                name = adopted[name]
+                model.objects.filter(pk=pk).update(**{field: name})
+            refs[name] += 1
+
+    StoredBlob = apps.get_model('main', 'StoredBlob')
+    StoredBlob.objects.bulk_create(
+        [StoredBlob(name=name, size=storage.size(name), ref_count=count) for name, count in refs.items()],
+        batch_size=500,
+    )
+
+
+def move_blobs_to_submissions(apps, schema_editor):
+    # Each blob goes back under its field's upload_to, named after the digest
+    # since the uploaded name is not known here. Rows of both models sharing
+    # a blob keep sharing the moved file.
+    storage = FileSystemStorage()
+    moved = {}
+    for model_name, field in SUBMISSION_FIELDS:
+        model = apps.get_model('main', model_name)
+        upload_to = model._meta.get_field(field).upload_to
+        blobs = model.objects.filter(**{f'{field}__startswith': main.storage.BLOB_PREFIX})
+        for name in list(blobs.values_list(field, flat=True).distinct()):
+            if name not in moved:
+                if not os.path.exists(storage.path(name)):
+                    continue
+                target = storage.get_available_name(upload_to + os.path.basename(name))
+                os.makedirs(os.path.dirname(storage.path(target)), exist_ok=True)
+                file_move_safe(storage.path(name), storage.path(target))
+                moved[name] = target
+            model.objects.filter(**{field: name}).update(**{field: moved[name]})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0034_placementtestreservation_unique_placement_slot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.PositiveBigIntegerField()),
+                ('ref_count', models.IntegerField(default=0)),
+                ('released_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='assignmentsubmission',
+            name='submitted_file',
+            field=models.FileField(storage=main.storage.ContentAddressedStorage(), upload_to='assignments/'),
+        ),
+        migrations.AlterField(
+            model_name='examsubmission',
+            name='file',
+            field=models.FileField(storage=main.storage.ContentAddressedStorage(), upload_to='exam_submissions/'),
+        ),
+        migrations.RunPython(move_submissions_to_blobs, move_blobs_to_submissions),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-18 14:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0035_content_addressed_submissions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='educationalpost',
+            name='image_widths',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+    ]
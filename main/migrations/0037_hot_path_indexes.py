@@ -0,0 +1,54 @@
+# Generated by Django 4.2.23 on 2026-10-18 14:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('main', '0036_educationalpost_image_widths'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(fields=['course', 'deadline'], name='assignment_course_deadline'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['created'], name='conversation_created'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['topic', 'created'], name='conversation_topic_created'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['user_type', '-rating', '-rating_count', 'username'], name='user_type_rating'),
+        ),
+        migrations.AddIndex(
+            model_name='educationalpost',
+            index=models.Index(fields=['created'], name='educationalpost_created'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['student', 'grade'], name='enrollment_student_grade'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollmentrequest',
+            index=models.Index(fields=['course', 'created_at'], name='enrollreq_course_created'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollmentrequest',
+            index=models.Index(condition=models.Q(('is_seen', False)), fields=['course'], name='enrollreq_unseen'),
+        ),
+        migrations.AddIndex(
+            model_name='placementtestreservation',
+            index=models.Index(fields=['assigned_teacher', 'date'], name='reservation_teacher_date'),
+        ),
+        migrations.AddIndex(
+            model_name='placementtestreservation',
+            index=models.Index(condition=models.Q(('is_seen', False)), fields=['assigned_teacher'], name='reservation_unseen'),
+        ),
+    ]
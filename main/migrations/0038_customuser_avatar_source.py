@@ -0,0 +1,28 @@
+# Generated by Django 4.2.23 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+# Adding or removing the column rebuilds main_customuser, which drops the
+# raw-SQL NOCASE indexes from 0033, so they are created again on both sides
+# of the AddField.
+NOCASE_INDEXES = [
+    f"CREATE INDEX IF NOT EXISTS main_customuser_{field}_nocase ON main_customuser({field} COLLATE NOCASE)"
+    for field in ('username', 'first_name', 'last_name', 'email')
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0037_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(migrations.RunSQL.noop, reverse_sql=NOCASE_INDEXES),
+        migrations.AddField(
+            model_name='customuser',
+            name='avatar_source',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.RunSQL(NOCASE_INDEXES, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,62 @@
+from django.db import migrations
+
+# SQLite has no ALTER COLUMN, so Django adds a column with a default by
+# rebuilding the table, which drops the table's triggers. 0036 did that to
+# main_educationalpost and 0038 to main_customuser, leaving their search rows
+# stale. The triggers from 0032 and 0033 are created again here and the rows
+# re-copied; a later AddField on either table needs the same treatment.
+POST = 3
+STUDENT_FIELDS = "new.username, trim(new.first_name || ' ' || new.last_name), new.email"
+
+DROP_SQL = [
+    f"DROP TRIGGER IF EXISTS main_educationalpost_search_{event}" for event in ('insert', 'update', 'delete')
+] + [
+    f"DROP TRIGGER IF EXISTS main_customuser_student_search_{event}" for event in ('insert', 'update', 'delete')
+]
+
+CREATE_SQL = DROP_SQL + [
+    f"""CREATE TRIGGER main_educationalpost_search_insert AFTER INSERT ON main_educationalpost BEGIN
+        INSERT INTO main_searchindex(rowid, title, body) VALUES (new.id * 4 + {POST}, new.title, new.description);
+    END""",
+    f"""CREATE TRIGGER main_educationalpost_search_update AFTER UPDATE OF title, description ON main_educationalpost BEGIN
+        DELETE FROM main_searchindex WHERE rowid = old.id * 4 + {POST};
+        INSERT INTO main_searchindex(rowid, title, body) VALUES (new.id * 4 + {POST}, new.title, new.description);
+    END""",
+    f"""CREATE TRIGGER main_educationalpost_search_delete AFTER DELETE ON main_educationalpost BEGIN
+        DELETE FROM main_searchindex WHERE rowid = old.id * 4 + {POST};
+    END""",
+
+    f"""CREATE TRIGGER main_customuser_student_search_insert AFTER INSERT ON main_customuser
+        WHEN new.user_type = 'student' BEGIN
+        INSERT INTO main_studentsearch(rowid, username, full_name, email) VALUES (new.id, {STUDENT_FIELDS});
+    END""",
+    f"""CREATE TRIGGER main_customuser_student_search_update
+        AFTER UPDATE OF username, first_name, last_name, email, user_type ON main_customuser BEGIN
+        DELETE FROM main_studentsearch WHERE rowid = old.id;
+        INSERT INTO main_studentsearch(rowid, username, full_name, email)
+            SELECT new.id, {STUDENT_FIELDS} WHERE new.user_type = 'student';
+    END""",
+    """CREATE TRIGGER main_customuser_student_search_delete AFTER DELETE ON main_customuser BEGIN
+        DELETE FROM main_studentsearch WHERE rowid = old.id;
+    END""",
+
+    f"DELETE FROM main_searchindex WHERE rowid % 4 = {POST}",
+    f"""INSERT INTO main_searchindex(rowid, title, body)
+        SELECT id * 4 + {POST}, title, description FROM main_educationalpost""",
+    "DELETE FROM main_studentsearch",
+    """INSERT INTO main_studentsearch(rowid, username, full_name, email)
+        SELECT id, username, trim(first_name || ' ' || last_name), email
+        FROM main_customuser WHERE user_type = 'student'""",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0038_customuser_avatar_source'),
+    ]
+
+    operations = [
+        # Going back leaves the triggers as 0036 and 0038 left them.
+        migrations.RunSQL(CREATE_SQL, reverse_sql=DROP_SQL),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:37
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+# The single-column indexes from 0033 are raw SQL, which every rebuild of
+# main_customuser drops, so 0038 had to restore them by hand. These
+# model-declared ones replace them, and also carry user_type so a student
+# lookup is one range scan per column.
+FIELDS = ('username', 'first_name', 'last_name', 'email')
+DROP_SQL = [f"DROP INDEX IF EXISTS main_customuser_{field}_nocase" for field in FIELDS]
+CREATE_SQL = [
+    f"CREATE INDEX IF NOT EXISTS main_customuser_{field}_nocase ON main_customuser({field} COLLATE NOCASE)"
+    for field in FIELDS
+]
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('main', '0040_submission_original_name'),
+    ]
+
+    operations = [
+        migrations.RunSQL(DROP_SQL, reverse_sql=CREATE_SQL),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(models.F('user_type'), django.db.models.functions.comparison.Collate('username', 'NOCASE'), name='student_username_nocase'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(models.F('user_type'), django.db.models.functions.comparison.Collate('first_name', 'NOCASE'), name='student_first_name_nocase'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(models.F('user_type'), django.db.models.functions.comparison.Collate('last_name', 'NOCASE'), name='student_last_name_nocase'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(models.F('user_type'), django.db.models.functions.comparison.Collate('email', 'NOCASE'), name='student_email_nocase'),
+        ),
+    ]
@@ -1,10 +1,13 @@
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
+from django.db.models.functions import Cast, Collate
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth import get_user_model
 from django.conf import settings, Settings
 
+from .storage import is_blob, submission_storage
+
 ENGLISH_LEVELS = [
     ('Beginner', 'Beginner'),
     ('Elementary', 'Elementary'),
@@ -24,6 +27,25 @@ class CustomUser(AbstractUser):
     level = models.CharField(max_length=30, choices=ENGLISH_LEVELS, blank=True, null=True)
     profile_image = models.ImageField(upload_to='profile_pics/', default='profile_pics/default.png', blank=True)
     rating = models.FloatField(default=0.0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    conversation_count = models.PositiveIntegerField(default=0, db_index=True)
+    # The profile image whose avatar variants exist, so templates can link
+    # them without checking the storage.
+    avatar_source = models.CharField(max_length=100, blank=True, editable=False)
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Teacher lists filter by type and rank by rating in this order.
+            models.Index(fields=['user_type', '-rating', '-rating_count', 'username'], name='user_type_rating'),
+            # Student search matches name prefixes case-insensitively; LIKE
+            # can only range-scan an index with the NOCASE collation. Being
+            # declared here, they survive the table rebuilds of AddField.
+            models.Index(models.F('user_type'), Collate('username', 'NOCASE'), name='student_username_nocase'),
+            models.Index(models.F('user_type'), Collate('first_name', 'NOCASE'), name='student_first_name_nocase'),
+            models.Index(models.F('user_type'), Collate('last_name', 'NOCASE'), name='student_last_name_nocase'),
+            models.Index(models.F('user_type'), Collate('email', 'NOCASE'), name='student_email_nocase'),
+        ]
 
     def is_student(self):
         return self.user_type == 'student'
@@ -35,6 +57,9 @@ class CustomUser(AbstractUser):
 User = get_user_model()
 
 
+SLOT_TAKEN_MESSAGE = 'This time slot is already booked.'
+
+
 class PlacementTestReservation(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reservations_made')
     full_name = models.CharField(max_length=100)
@@ -44,6 +69,16 @@ class PlacementTestReservation(models.Model):
     time = models.TimeField()
     assigned_teacher = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='reservations_assigned')
     is_seen = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'time'], name='unique_placement_slot'),
+        ]
+        indexes = [
+            models.Index(fields=['assigned_teacher', 'date'], name='reservation_teacher_date'),
+            models.Index(fields=['assigned_teacher'], condition=models.Q(is_seen=False), name='reservation_unseen'),
+        ]
+
     def __str__(self):
         return f"{self.full_name} - {self.date} {self.time}"
 
@@ -92,6 +127,9 @@ class Enrollment(models.Model):
 
     class Meta:
         unique_together = ('student', 'course')
+        indexes = [
+            models.Index(fields=['student', 'grade'], name='enrollment_student_grade'),
+        ]
 
 
 class EnrollmentRequest(models.Model):
@@ -106,6 +144,12 @@ class EnrollmentRequest(models.Model):
     is_approved = models.BooleanField(null=True, default=None)
     is_seen = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['course', 'created_at'], name='enrollreq_course_created'),
+            models.Index(fields=['course'], condition=models.Q(is_seen=False), name='enrollreq_unseen'),
+        ]
+
     def __str__(self):
         return f"{self.student.username} - {self.course.title}"
 
@@ -121,6 +165,20 @@ class Rating(models.Model):
         unique_together = ('student', 'teacher')
 
 
+def apply_rating_delta(teacher_id, score_delta, count_delta):
+    new_sum = models.F('rating_sum') + score_delta
+    new_count = models.F('rating_count') + count_delta
+    User.objects.filter(pk=teacher_id).update(
+        rating_sum=new_sum,
+        rating_count=new_count,
+        rating=models.Case(
+            models.When(rating_count=-count_delta, then=models.Value(0.0)),
+            default=Cast(new_sum, models.FloatField()) / new_count,
+            output_field=models.FloatField(),
+        ),
+    )
+
+
 class Assignment(models.Model):
     course = models.ForeignKey('Course', on_delete=models.CASCADE, related_name='assignments')
     title = models.CharField(max_length=200)
@@ -128,6 +186,11 @@ class Assignment(models.Model):
     deadline = models.DateTimeField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['course', 'deadline'], name='assignment_course_deadline'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -135,7 +198,8 @@ class Assignment(models.Model):
 class AssignmentSubmission(models.Model):
     assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE)
     student = models.ForeignKey(User, on_delete=models.CASCADE)
-    submitted_file = models.FileField(upload_to='assignments/')
+    submitted_file = models.FileField(upload_to='assignments/', storage=submission_storage)
+    original_name = models.CharField(max_length=255, blank=True, editable=False)
     submitted_at = models.DateTimeField(auto_now_add=True)
     graded = models.BooleanField(default=False)
     grade = models.IntegerField(null=True, blank=True)
@@ -160,6 +224,28 @@ CONVERSATION_TOPICS = [
 
 
 
+class TopicCounter(models.Model):
+    topic = models.CharField(max_length=100, choices=CONVERSATION_TOPICS, unique=True)
+    conversation_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.topic}: {self.conversation_count}"
+
+
+def apply_topic_delta(topic, delta):
+    updated = TopicCounter.objects.filter(topic=topic).update(
+        conversation_count=models.F('conversation_count') + delta
+    )
+    if not updated and delta > 0:
+        TopicCounter.objects.create(topic=topic, conversation_count=delta)
+
+
+def apply_conversation_delta(conversation, delta):
+    apply_topic_delta(conversation.topic, delta)
+    User.objects.filter(pk=conversation.user_id).update(
+        conversation_count=models.F('conversation_count') + delta
+    )
+
 
 class Conversation(models.Model):
     topic = models.CharField(max_length=100, choices=CONVERSATION_TOPICS)
@@ -171,6 +257,14 @@ class Conversation(models.Model):
 
     participants = models.ManyToManyField(User, related_name='participated_conversations', blank=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pages order by (created, id); id is SQLite's rowid and
+            # comes with every index.
+            models.Index(fields=['created'], name='conversation_created'),
+            models.Index(fields=['topic', 'created'], name='conversation_topic_created'),
+        ]
+
     def __str__(self):
         return f"{self.title} - by {self.user.username}"
 
@@ -181,13 +275,11 @@ class Comment(models.Model):
     body = models.TextField()
     created = models.DateTimeField(auto_now_add=True)
     likes = models.ManyToManyField(User, related_name='liked_comments', blank=True)
+    like_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return f"Comment by {self.user.username} on {self.conversation.title}"
 
-    def like_count(self):
-        return self.likes.count()
-
     def is_liked_by(self, user):
         return self.likes.filter(id=user.id).exists()
 
@@ -201,11 +293,15 @@ class EducationalPost(models.Model):
     )
     title = models.CharField(max_length=200)
     image = models.ImageField(upload_to='educational_posts/', blank=True, null=True)
+    image_widths = models.JSONField(default=list, blank=True, editable=False)
     description = models.TextField()
     created = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(fields=['created'], name='educationalpost_created'),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.teacher.username}"
@@ -226,9 +322,44 @@ class Exam(models.Model):
 class ExamSubmission(models.Model):
     exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name="submissions")
     student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    file = models.FileField(upload_to="exam_submissions/")
+    file = models.FileField(upload_to="exam_submissions/", storage=submission_storage)
+    original_name = models.CharField(max_length=255, blank=True, editable=False)
     submitted_at = models.DateTimeField(auto_now_add=True)
     grade = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True)
     graded = models.BooleanField(default=False)
     def __str__(self):
-        return f"{self.student.username} - {self.exam.title}"
\ No newline at end of file
+        return f"{self.student.username} - {self.exam.title}"
+
+
+class StoredBlob(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.IntegerField(default=0)
+    released_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count})"
+
+
+def acquire_blob(name):
+    if not is_blob(name):
+        return
+    blob, created = StoredBlob.objects.get_or_create(
+        name=name, defaults={'size': submission_storage.size(name), 'ref_count': 1},
+    )
+    if not created:
+        StoredBlob.objects.filter(pk=blob.pk).update(ref_count=models.F('ref_count') + 1, released_at=None)
+
+
+def release_blob(name):
+    # Unreferenced blobs are only deleted by collect_blobs, after a grace
+    # period, so an upload that just matched an existing blob cannot lose it.
+    if not is_blob(name):
+        return
+    StoredBlob.objects.filter(name=name).update(
+        ref_count=models.F('ref_count') - 1,
+        released_at=models.Case(
+            models.When(ref_count=1, then=models.Value(timezone.now())),
+            default=models.F('released_at'),
+        ),
+    )
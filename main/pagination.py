@@ -0,0 +1,123 @@
+import base64
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+PAGE_SIZE = 20
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_url=None, previous_url=None):
+        self.object_list = object_list
+        self.next_url = next_url
+        self.previous_url = previous_url
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_url is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_url is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def encode_cursor(values, direction):
+    payload = json.dumps({'v': values, 'd': direction}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def load_cursor(token, converters):
+    # (values, direction) with each value passed through its converter, or
+    # None for anything encode_cursor did not produce.
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values, direction = payload['v'], payload['d']
+        if direction not in ('next', 'prev') or len(values) != len(converters):
+            return None
+        return [convert(v) for convert, v in zip(converters, values)], direction
+    except (ValueError, TypeError, KeyError, ValidationError):
+        return None
+
+
+def decode_cursor(token, fields, model):
+    return load_cursor(token, [model._meta.get_field(f).to_python for f in fields])
+
+
+def _cursor_values(obj, fields):
+    values = []
+    for field in fields:
+        value = getattr(obj, field)
+        values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+    return values
+
+
+def _after(fields, values, descending):
+    lookup = 'lt' if descending else 'gt'
+    condition = Q()
+    for i in range(len(fields) - 1, -1, -1):
+        step = Q(**{f'{fields[i]}__{lookup}': values[i]})
+        if i < len(fields) - 1:
+            step |= Q(**{fields[i]: values[i]}) & condition
+        condition = step
+    return condition
+
+
+def _page_url(request, token):
+    query = request.GET.copy()
+    query['cursor'] = token
+    return f"?{query.urlencode()}"
+
+
+def keyset_paginate(request, queryset, fields=('created', 'id'), descending=True, per_page=PAGE_SIZE):
+    fields = list(fields)
+    cursor = decode_cursor(request.GET.get('cursor', ''), fields, queryset.model)
+    values, direction = cursor if cursor else (None, 'next')
+
+    backwards = direction == 'prev'
+    scan_descending = descending != backwards
+    ordering = [f'-{f}' if scan_descending else f for f in fields]
+
+    rows = queryset.order_by(*ordering)
+    if values is not None:
+        rows = rows.filter(_after(fields, values, scan_descending))
+    rows = list(rows[:per_page + 1])
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    if not rows:
+        return KeysetPage(rows)
+
+    first = encode_cursor(_cursor_values(rows[0], fields), 'prev')
+    last = encode_cursor(_cursor_values(rows[-1], fields), 'next')
+    if backwards:
+        has_next, has_previous = values is not None, has_more
+    else:
+        has_next, has_previous = has_more, values is not None
+
+    return KeysetPage(
+        rows,
+        next_url=_page_url(request, last) if has_next else None,
+        previous_url=_page_url(request, first) if has_previous else None,
+    )
+
+
+akeyset_paginate = sync_to_async(keyset_paginate)
@@ -0,0 +1,58 @@
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = 'replica'
+
+_request_pin = ContextVar('replica_request_pin', default=None)
+
+
+class RequestPin:
+    # Shared by everything a request runs, including sync_to_async threads,
+    # which see the same object through the copied context.
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+def start_request(pinned=False):
+    return _request_pin.set(RequestPin(pinned))
+
+
+def finish_request(token):
+    pin = _request_pin.get()
+    _request_pin.reset(token)
+    return pin
+
+
+def read_alias():
+    # Reads go to the primary inside a transaction, which may hold writes the
+    # replica cannot see yet, and for the rest of a request once it has written.
+    pin = _request_pin.get()
+    if (pin is not None and pin.pinned) or REPLICA not in settings.DATABASES:
+        return DEFAULT_DB_ALIAS
+    if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return DEFAULT_DB_ALIAS
+    return REPLICA
+
+
+class PrimaryReplicaRouter:
+    # Writes and migrations stay on the primary, reads use the read-only
+    # replica alias unless read_alias() pins them to the primary.
+
+    def db_for_read(self, model, **hints):
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        pin = _request_pin.get()
+        if pin is not None:
+            pin.pinned = pin.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same rows.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
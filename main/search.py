@@ -0,0 +1,229 @@
+import re
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from django.urls import reverse
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Comment, Conversation, EducationalPost
+from .pagination import encode_cursor, load_cursor
+from .routers import read_alias
+
+User = get_user_model()
+
+SEARCH_TABLE = 'main_searchindex'
+STUDENT_SEARCH_TABLE = 'main_studentsearch'
+STUDENT_PREFIX_FIELDS = ('username', 'first_name', 'last_name', 'email')
+
+CONVERSATION, COMMENT, POST = 1, 2, 3
+
+MARK_START, MARK_END = '\x02', '\x03'
+
+RESULTS_PER_PAGE = 20
+STUDENT_RESULTS = 50
+
+
+def build_match_query(text):
+    terms = re.findall(r'\w+', text)
+    if not terms:
+        return ''
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def _highlight(text):
+    return mark_safe(escape(text).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>'))
+
+
+def _rowid(value):
+    # SQLite integers are 64-bit; a larger value from a cursor would make
+    # the driver raise instead of matching nothing.
+    value = int(value)
+    if not -2 ** 63 <= value < 2 ** 63:
+        raise ValueError(value)
+    return value
+
+
+def _ranked_rows(match, bound, backwards, limit):
+    # Rows ordered by (bm25 score, rowid), the rowid breaking ties between
+    # equal scores, starting after bound when there is one.
+    rank = f'bm25({SEARCH_TABLE}, 10.0, 1.0)'
+    order = 'DESC' if backwards else 'ASC'
+    after, params = '', []
+    if bound is not None:
+        after = f"AND ({rank}, rowid) {'<' if backwards else '>'} (%s, %s)"
+        params = bound
+    with connections[read_alias()].cursor() as cursor:
+        cursor.execute(
+            f"""SELECT rowid, {rank},
+                       highlight({SEARCH_TABLE}, 0, %s, %s),
+                       snippet({SEARCH_TABLE}, 1, %s, %s, '…', 24)
+                FROM {SEARCH_TABLE}
+                WHERE {SEARCH_TABLE} MATCH %s {after}
+                ORDER BY {rank} {order}, rowid {order}
+                LIMIT %s""",
+            [MARK_START, MARK_END, MARK_START, MARK_END, match, *params, limit],
+        )
+        return cursor.fetchall()
+
+
+def search(text, cursor='', per_page=RESULTS_PER_PAGE):
+    # Returns the results with the cursors of the next and previous pages,
+    # paged by keyset so later pages cost no more than the first.
+    match = build_match_query(text)
+    if not match:
+        return [], None, None
+
+    position = load_cursor(cursor, (float, _rowid))
+    bound, direction = position if position else (None, 'next')
+    backwards = direction == 'prev'
+
+    rows = _ranked_rows(match, bound, backwards, per_page + 1)
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+    if not rows:
+        return [], None, None
+
+    if backwards:
+        has_next, has_previous = bound is not None, has_more
+    else:
+        has_next, has_previous = has_more, bound is not None
+    next_cursor = encode_cursor([rows[-1][1], rows[-1][0]], 'next') if has_next else None
+    previous_cursor = encode_cursor([rows[0][1], rows[0][0]], 'prev') if has_previous else None
+
+    ids = {CONVERSATION: [], COMMENT: [], POST: []}
+    for rowid, *_ in rows:
+        ids[rowid % 4].append(rowid // 4)
+
+    conversations = Conversation.objects.select_related('user').in_bulk(ids[CONVERSATION])
+    comments = Comment.objects.select_related('user', 'conversation').in_bulk(ids[COMMENT])
+    posts = EducationalPost.objects.select_related('teacher').in_bulk(ids[POST])
+
+    results = []
+    for rowid, _, title, snippet in rows:
+        kind, object_id = rowid % 4, rowid // 4
+        if kind == CONVERSATION and object_id in conversations:
+            conversation = conversations[object_id]
+            results.append({
+                'kind': 'Conversation',
+                'title': _highlight(title),
+                'snippet': _highlight(snippet),
+                'author': conversation.user.username,
+                'created': conversation.created,
+                'url': reverse('conversation_detail', args=[object_id]),
+            })
+        elif kind == COMMENT and object_id in comments:
+            comment = comments[object_id]
+            results.append({
+                'kind': 'Comment',
+                'title': escape(comment.conversation.title),
+                'snippet': _highlight(snippet),
+                'author': comment.user.username,
+                'created': comment.created,
+                'url': reverse('conversation_detail', args=[comment.conversation_id]),
+            })
+        elif kind == POST and object_id in posts:
+            post = posts[object_id]
+            results.append({
+                'kind': 'Educational Post',
+                'title': _highlight(title),
+                'snippet': _highlight(snippet),
+                'author': post.teacher.username,
+                'created': post.created,
+                'url': reverse('post_detail', args=[object_id]),
+            })
+
+    return results, next_cursor, previous_cursor
+
+
+def rebuild_index():
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        cursor.execute(
+            f"""INSERT INTO {SEARCH_TABLE}(rowid, title, body)
+                SELECT id * 4 + %s, title, body FROM main_conversation
+                UNION ALL SELECT id * 4 + %s, '', body FROM main_comment
+                UNION ALL SELECT id * 4 + %s, title, description FROM main_educationalpost""",
+            [CONVERSATION, COMMENT, POST],
+        )
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')")
+
+        cursor.execute(f"DELETE FROM {STUDENT_SEARCH_TABLE}")
+        cursor.execute(
+            f"""INSERT INTO {STUDENT_SEARCH_TABLE}(rowid, username, full_name, email)
+                SELECT id, username, trim(first_name || ' ' || last_name), email
+                FROM main_customuser WHERE user_type = 'student'"""
+        )
+        cursor.execute(f"INSERT INTO {STUDENT_SEARCH_TABLE}({STUDENT_SEARCH_TABLE}) VALUES ('optimize')")
+
+        cursor.execute(f"SELECT count(*) FROM {SEARCH_TABLE}")
+        return cursor.fetchone()[0]
+
+
+@contextmanager
+def search_triggers_suspended():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+            ['main_%search%'],
+        )
+        triggers = cursor.fetchall()
+        for name, _ in triggers:
+            cursor.execute(f"DROP TRIGGER {name}")
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for _, sql in triggers:
+                cursor.execute(sql)
+
+
+def _student_prefix_ids(text, limit):
+    # One arm per column so each range-scans its student_*_nocase index; a
+    # single OR of the four lets SQLite settle for walking every student
+    # through user_type_rating instead.
+    students = User.objects.filter(user_type='student')
+    arms = [
+        students.filter(**{f'{field}__istartswith': text}).values_list('id', 'username')
+        for field in STUDENT_PREFIX_FIELDS
+    ]
+    return [pk for pk, _ in arms[0].union(*arms[1:]).order_by('username')[:limit]]
+
+
+def _student_trigram_ids(text, limit):
+    if len(text) < 3:
+        return []
+    phrase = '"' + text.replace('"', '""') + '"'
+    with connections[read_alias()].cursor() as cursor:
+        cursor.execute(
+            f"""SELECT rowid FROM {STUDENT_SEARCH_TABLE}
+                WHERE {STUDENT_SEARCH_TABLE} MATCH %s
+                ORDER BY bm25({STUDENT_SEARCH_TABLE}, 4.0, 2.0, 1.0)
+                LIMIT %s""",
+            [phrase, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def student_match_ids(text, limit=STUDENT_RESULTS):
+    ids = _student_prefix_ids(text, limit)
+    if len(ids) < limit:
+        seen = set(ids)
+        ids += [i for i in _student_trigram_ids(text, limit) if i not in seen][:limit - len(ids)]
+    return ids
+
+
+def find_students(text, limit=STUDENT_RESULTS):
+    text = text.strip()
+    students = User.objects.filter(user_type='student')
+    if not text:
+        return list(students.order_by('username')[:limit])
+
+    ids = student_match_ids(text, limit)
+    found = students.in_bulk(ids)
+    return [found[i] for i in ids if i in found]
@@ -0,0 +1,118 @@
+import os
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .availability import invalidate_day
+from .homepage import CONVERSATIONS, POSTS, TEACHERS, invalidate_home_blocks
+from .images import delete_post_derivatives
+from .live import publish_comment
+from .models import (
+    AssignmentSubmission, Comment, Conversation, EducationalPost, ExamSubmission, PlacementTestReservation, Rating,
+    acquire_blob, release_blob,
+)
+
+User = get_user_model()
+
+
+@receiver(pre_save, sender=PlacementTestReservation)
+def invalidate_previous_reservation_day(sender, instance, **kwargs):
+    if instance.pk:
+        previous = sender.objects.filter(pk=instance.pk).values_list('date', flat=True).first()
+        if previous and previous != instance.date:
+            invalidate_day(previous)
+
+
+@receiver(post_save, sender=PlacementTestReservation)
+@receiver(post_delete, sender=PlacementTestReservation)
+def invalidate_reservation_day(sender, instance, **kwargs):
+    invalidate_day(instance.date)
+
+
+@receiver(post_save, sender=Conversation)
+@receiver(post_delete, sender=Conversation)
+def invalidate_home_conversations(sender, instance, **kwargs):
+    invalidate_home_blocks(CONVERSATIONS)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_home_comment_counts(sender, instance, created=True, **kwargs):
+    # Only the number of comments is shown, so edits leave the block alone.
+    if created:
+        invalidate_home_blocks(CONVERSATIONS)
+
+
+@receiver(post_save, sender=Comment)
+def push_new_comment(sender, instance, created, **kwargs):
+    if created:
+        publish_comment(instance)
+
+
+@receiver(post_save, sender=EducationalPost)
+@receiver(post_delete, sender=EducationalPost)
+def invalidate_home_posts(sender, instance, **kwargs):
+    invalidate_home_blocks(POSTS)
+
+
+@receiver(post_delete, sender=EducationalPost)
+def delete_post_image_derivatives(sender, instance, **kwargs):
+    name, widths = instance.image.name, instance.image_widths
+    transaction.on_commit(lambda: delete_post_derivatives(name, widths))
+
+
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+def invalidate_home_teachers(sender, instance, **kwargs):
+    invalidate_home_blocks(TEACHERS)
+
+
+@receiver(post_save, sender=User)
+def invalidate_home_authors(sender, instance, update_fields=None, **kwargs):
+    # Usernames and pictures appear in every block; logins only touch last_login.
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        invalidate_home_blocks()
+
+
+SUBMISSION_FILE_FIELDS = {AssignmentSubmission: 'submitted_file', ExamSubmission: 'file'}
+
+
+@receiver(pre_save, sender=AssignmentSubmission)
+@receiver(pre_save, sender=ExamSubmission)
+def remember_previous_submission_file(sender, instance, update_fields=None, **kwargs):
+    field = SUBMISSION_FILE_FIELDS[sender]
+    instance._previous_file = None
+    if instance.pk and (update_fields is None or field in update_fields):
+        instance._previous_file = sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+
+
+@receiver(pre_save, sender=AssignmentSubmission)
+@receiver(pre_save, sender=ExamSubmission)
+def remember_upload_name(sender, instance, **kwargs):
+    # Stored files are named after their content, so the name the student
+    # uploaded is kept for downloads.
+    file = getattr(instance, SUBMISSION_FILE_FIELDS[sender])
+    if file and not file._committed:
+        instance.original_name = os.path.basename(file.name)
+
+
+@receiver(post_save, sender=AssignmentSubmission)
+@receiver(post_save, sender=ExamSubmission)
+def count_submission_file(sender, instance, created, update_fields=None, **kwargs):
+    field = SUBMISSION_FILE_FIELDS[sender]
+    if not created and update_fields is not None and field not in update_fields:
+        return
+    name = getattr(instance, field).name
+    previous = getattr(instance, '_previous_file', None)
+    if created or name != previous:
+        acquire_blob(name)
+        if previous:
+            release_blob(previous)
+
+
+@receiver(post_delete, sender=AssignmentSubmission)
+@receiver(post_delete, sender=ExamSubmission)
+def release_submission_file(sender, instance, **kwargs):
+    release_blob(getattr(instance, SUBMISSION_FILE_FIELDS[sender]).name)
@@ -0,0 +1,102 @@
+import functools
+import logging
+import random
+import sqlite3
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+LOCK_MESSAGES = ('database is locked', 'database table is locked')
+MAX_BACKOFF = 2.0
+# Settings that only concern writing, skipped on read-only connections.
+WRITE_PRAGMAS = ('journal_mode', 'synchronous')
+
+
+def apply_pragmas(connection, pragmas):
+    # connection is a DB-API sqlite3 connection, so the statements bypass
+    # Django's query logging and the per-request profiler.
+    for name, value in pragmas.items():
+        connection.execute(f'PRAGMA {name} = {value}')
+
+
+def is_read_only(connection):
+    # Opened through a file: URI with mode=ro, like the replica alias.
+    name = str(connection.settings_dict['NAME'])
+    return name.startswith('file:') and parse_qs(urlsplit(name).query).get('mode') == ['ro']
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if connection.vendor != 'sqlite' or not pragmas:
+        return
+    if is_read_only(connection):
+        pragmas = {name: value for name, value in pragmas.items() if name not in WRITE_PRAGMAS}
+    apply_pragmas(connection.connection, pragmas)
+
+
+def is_lock_error(exc):
+    return isinstance(exc, (OperationalError, sqlite3.OperationalError)) and any(
+        message in str(exc) for message in LOCK_MESSAGES
+    )
+
+
+def _in_transaction():
+    return any(connection.in_atomic_block for connection in connections.all(initialized_only=True))
+
+
+def retrying(func, retries=None, backoff=None):
+    # Wraps func to run again when SQLite reports a lock, waiting a jittered,
+    # doubling delay between attempts. The busy timeout already covers plain
+    # waits for a writer; what reaches here is a deferred transaction that
+    # could not upgrade to a write lock, which only a fresh attempt fixes.
+    # Never retries inside an outer transaction, which is already broken.
+    retries = getattr(settings, 'SQLITE_LOCK_RETRIES', 0) if retries is None else retries
+    backoff = getattr(settings, 'SQLITE_LOCK_BACKOFF', 0.05) if backoff is None else backoff
+
+    def wrapper(*args, **kwargs):
+        for attempt in range(retries + 1):
+            try:
+                return func(*args, **kwargs)
+            except Exception as exc:
+                if attempt == retries or not is_lock_error(exc) or _in_transaction():
+                    raise
+                delay = min(backoff * 2 ** attempt, MAX_BACKOFF) * random.uniform(0.5, 1.5)
+                logger.info("%s hit a SQLite lock, retrying in %.0fms (attempt %d of %d)",
+                            getattr(func, '__name__', func), delay * 1000, attempt + 1, retries)
+                time.sleep(delay)
+
+    return wrapper
+
+
+def take_write_lock(using=DEFAULT_DB_ALIAS):
+    # What BEGIN IMMEDIATE would do, for a transaction Django has already
+    # begun as DEFERRED. A transaction whose first statement reads (an FTS
+    # trigger is enough) cannot wait for the write lock later: SQLite fails
+    # it at once rather than risk a deadlock. A write matching no rows takes
+    # the lock first, still under the busy timeout.
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM django_migrations WHERE 0')
+
+
+def write_transaction(func):
+    # Runs func in a transaction of its own that holds the write lock from
+    # the start, and runs the whole transaction again on a lock error, with
+    # nothing of the failed attempt kept. func must confine itself to
+    # database writes and on_commit hooks; any other side effect would
+    # happen once per attempt.
+    @functools.wraps(func)
+    @transaction.atomic
+    def locked(*args, **kwargs):
+        take_write_lock()
+        return func(*args, **kwargs)
+
+    return functools.wraps(func)(retrying(locked))
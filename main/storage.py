@@ -0,0 +1,82 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+
+BLOB_PREFIX = 'blobs/'
+
+
+def blob_name(digest, extension):
+    return f'{BLOB_PREFIX}{digest[:2]}/{digest[2:4]}/{digest}{extension.lower()}'
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(BLOB_PREFIX)
+
+
+def file_sha256(path, chunk_size=64 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    # Every upload is stored once, under the SHA-256 of its content. The
+    # upload name only contributes its extension, so the same bytes sent as
+    # an assignment and as an exam share one blob; StoredBlob counts the
+    # references.
+
+    def get_available_name(self, name, max_length=None):
+        # Names are derived from the content in _save, so never suffix them.
+        return name
+
+    def _save(self, name, content):
+        extension = os.path.splitext(name)[1]
+        if hasattr(content, 'temporary_file_path'):
+            # Large uploads are already on disk: hash them in place and only
+            # move them into the blob tree when the content is new.
+            source = content.temporary_file_path()
+            return self._store(blob_name(file_sha256(source), extension), source, move=file_move_safe)
+
+        tmp_dir = self.path(BLOB_PREFIX + 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    tmp.write(chunk)
+            # Identical bytes make concurrent writers of one blob harmless, and
+            # the atomic rename keeps readers from ever seeing a partial file.
+            return self._store(blob_name(digest.hexdigest(), extension), tmp_path, move=os.replace)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def adopt(self, name):
+        # Moves a file saved under a plain name into the blob tree, deleting
+        # it instead when its content is already stored.
+        source = self.path(name)
+        blob = blob_name(file_sha256(source), os.path.splitext(name)[1])
+        self._store(blob, source, move=file_move_safe)
+        if os.path.exists(source):
+            os.remove(source)
+        return blob
+
+    def _store(self, name, source, move):
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            return name
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        move(source, full_path)
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+        return name
+
+
+submission_storage = ContentAddressedStorage()
@@ -1,14 +1,9 @@
 from django import template
+from django.core.files.storage import default_storage
 
-register = template.Library()
-
+from main.images import AVATAR_SIZES, avatar_variant_name, fallback_extension, post_derivative_name
 
-@register.filter
-def average_rating(ratings):
-    if not ratings or not hasattr(ratings, 'exists') or not ratings.exists():
-        return 0
-    total = sum([r.score for r in ratings])
-    return round(total / ratings.count(), 1)
+register = template.Library()
 
 
 @register.filter
@@ -18,3 +13,36 @@ def dict_key(d, key):
 @register.filter
 def dict_get(dictionary, key):
     return dictionary.get(key)
+
+
+@register.simple_tag
+def avatar_url(image, css_size):
+    # Smallest pre-generated variant that stays sharp on 2x screens, or the
+    # original when the variants have not been generated yet.
+    if not image:
+        return ''
+    if image.name == getattr(image.instance, 'avatar_source', None):
+        for size, pixels in sorted(AVATAR_SIZES.items(), key=lambda item: item[1]):
+            if pixels >= css_size * 2:
+                return default_storage.url(avatar_variant_name(image.name, size))
+    return image.url
+
+
+@register.inclusion_tag('post_picture.html')
+def post_picture(post, sizes, css_class=''):
+    # WebP and JPEG/PNG srcsets over the widths generated at upload; posts
+    # without derivatives fall back to the original file.
+    context = {'post': post, 'sizes': sizes, 'css_class': css_class, 'src': post.image.url if post.image else ''}
+    if post.image and post.image_widths:
+        name = post.image.name
+
+        def srcset(extension):
+            return ', '.join(
+                f'{default_storage.url(post_derivative_name(name, width, extension))} {width}w'
+                for width in post.image_widths
+            )
+
+        fallback = fallback_extension(name)
+        context.update(webp_srcset=srcset('.webp'), fallback_srcset=srcset(fallback),
+                       src=default_storage.url(post_derivative_name(name, post.image_widths[-1], fallback)))
+    return context
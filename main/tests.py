@@ -1,3 +1,1720 @@
-from django.test import TestCase
+import csv
+import datetime
+import json
+import os
+import re
+import shutil
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+import zipfile
+from decimal import Decimal
+from io import BytesIO, StringIO
+from contextlib import ExitStack
+from pathlib import Path
+from unittest import mock, skipUnless
+from xml.etree import ElementTree
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.utils import ConnectionHandler
+from django.template import Context, Template
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlencode
+from PIL import Image
+
+from . import archives, live, routers, signals, urls as main_urls
+from .availability import SLOT_LABELS, booked_bitmaps, booked_slots
+from .homepage import home_cache_stats, reset_home_cache_stats
+from .middleware import QueryBudgetExceeded, RequestProfile, profiling_report, reset_profiling_report
+from .images import (
+    AVATAR_SIZES, DEFAULT_PROFILE_IMAGE, MAX_AVATAR_SIZE, avatar_variant_name, post_derivative_name,
+    post_derivative_names,
+)
+from .models import (
+    SLOT_TAKEN_MESSAGE, Assignment, AssignmentSubmission, Comment, Conversation, Course, EducationalPost, Enrollment,
+    Exam, ExamSubmission, PlacementTestReservation, Rating, StoredBlob, TopicCounter, apply_conversation_delta,
+    apply_rating_delta,
+)
+from .pagination import encode_cursor, keyset_paginate
+from .search import build_match_query, find_students, search, search_triggers_suspended, student_match_ids
+from .sqlite import retrying, write_transaction
+from .storage import submission_storage
+
+User = get_user_model()
+
+
+def next_weekday():
+    day = datetime.date.today() + datetime.timedelta(days=1)
+    while day.weekday() in (5, 6):
+        day += datetime.timedelta(days=1)
+    return day
+
+
+class PlacementTestBookingTests(TransactionTestCase):
+    databases = {'default', routers.REPLICA}
+
+    def setUp(self):
+        User.objects.create_user(username='Mahdieh Arabi', password='x', user_type='teacher')
+        self.students = [
+            User.objects.create_user(username=f'student{i}', password='x', user_type='student')
+            for i in range(8)
+        ]
+        self.date = next_weekday()
+
+    def booking_data(self, name):
+        return {
+            'full_name': name,
+            'phone': '09120000000',
+            'level': 'Beginner',
+            'date': self.date.isoformat(),
+            'time': '19:30',
+        }
+
+    def test_taken_slot_is_a_form_error(self):
+        client = Client()
+        client.force_login(self.students[0])
+        response = client.post(reverse('placement_test'), self.booking_data('first'))
+        self.assertRedirects(response, reverse('reservation_success'))
+
+        client.force_login(self.students[1])
+        response = client.post(reverse('placement_test'), self.booking_data('second'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(SLOT_TAKEN_MESSAGE, response.context['form'].non_field_errors())
+        self.assertEqual(PlacementTestReservation.objects.count(), 1)
+
+    def test_parallel_bookings_for_one_slot(self):
+        clients = []
+        for student in self.students:
+            client = Client()
+            client.force_login(student)
+            clients.append((client, student.username))
+
+        barrier = threading.Barrier(len(clients))
+        statuses = []
+        errors = []
+
+        def book(client, name):
+            try:
+                barrier.wait(timeout=10)
+                response = client.post(reverse('placement_test'), self.booking_data(name))
+                statuses.append(response.status_code)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=book, args=args) for args in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(statuses.count(302), 1)
+        self.assertEqual(statuses.count(200), len(clients) - 1)
+        self.assertEqual(PlacementTestReservation.objects.filter(date=self.date).count(), 1)
+
+
+class PlacementAvailabilityTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user(username='student', password='x', user_type='student')
+        self.day = next_weekday()
+
+    def book(self, time, day=None):
+        return PlacementTestReservation.objects.create(
+            user=self.student, full_name='Student', phone='09120000000', level='Beginner',
+            date=day or self.day, time=time,
+        )
+
+    def test_bookings_pack_into_one_bitmap_per_weekday(self):
+        self.book(datetime.time(19, 0))
+        self.book(datetime.time(19, 30))
+        saturday = self.day + datetime.timedelta(days=(5 - self.day.weekday()) % 7)
+
+        bitmaps = booked_bitmaps(self.day, saturday + datetime.timedelta(days=1))
+        self.assertEqual(bitmaps[self.day], 0b101)
+        self.assertNotIn(saturday, bitmaps)
+        self.assertEqual(booked_slots(bitmaps[self.day]), ['19:00', '19:30'])
+
+        response = self.client.get(reverse('get_reserved_times'), {'date': self.day.isoformat()})
+        self.assertEqual(response.json(), {'reserved_times': ['19:00', '19:30']})
+
+    def test_unchanged_availability_is_not_modified(self):
+        url = reverse('get_availability')
+        params = {'start': self.day.isoformat(), 'end': self.day.isoformat()}
+        response = self.client.get(url, params)
+        self.assertEqual(response.json()['days'], {self.day.isoformat(): 0})
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book(datetime.time(20, 0))
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['days'], {self.day.isoformat(): 1 << SLOT_LABELS.index('20:00')})
+
+    def test_days_are_invalidated_when_the_write_commits(self):
+        other_day = next_weekday() + datetime.timedelta(days=7)
+        booked_bitmaps(self.day, other_day)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            reservation = self.book(datetime.time(19, 0))
+        # Until the commit a concurrent reader still gets the old bookings.
+        self.assertEqual(booked_bitmaps(self.day, self.day)[self.day], 0)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(booked_bitmaps(self.day, self.day)[self.day], 1)
+
+        reservation.date = other_day
+        with self.captureOnCommitCallbacks(execute=True):
+            reservation.save()
+        bitmaps = booked_bitmaps(self.day, other_day)
+        self.assertEqual((bitmaps[self.day], bitmaps[other_day]), (0, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reservation.delete()
+        self.assertEqual(booked_bitmaps(other_day, other_day)[other_day], 0)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def grow_dataset(teacher, students, copies):
+    course = Course.objects.create(
+        title=f'Course {copies}', description='', required_level='Beginner', teacher=teacher,
+        start_date=datetime.date.today() + datetime.timedelta(days=30), class_days='Monday-Wednesday',
+        class_time='8-10 am',
+    )
+    for student in students:
+        Enrollment.objects.create(student=student, course=course)
+    for i in range(copies):
+        Assignment.objects.create(
+            course=course, title=f'Assignment {i}', description='',
+            deadline=timezone.now() + datetime.timedelta(days=7),
+        )
+        Exam.objects.create(course=course, title=f'Exam {i}', description='')
+        author = students[i % len(students)]
+        conversation = Conversation.objects.create(user=author, title=f'Thread {copies}-{i}', body='body', topic='Fun')
+        apply_conversation_delta(conversation, 1)
+    for conversation in Conversation.objects.all():
+        for student in students:
+            comment = Comment.objects.create(conversation=conversation, user=student, body='reply')
+            comment.likes.add(teacher)
+    _, rated = Rating.objects.get_or_create(student=students[-1], teacher=teacher, defaults={'score': 4})
+    if rated:
+        apply_rating_delta(teacher.pk, 4, 1)
+    EducationalPost.objects.create(teacher=teacher, title=f'Post {copies}', description='text')
+    return course
+
+
+class KeyPageQueryCountTests(TestCase):
+    # Query counts for the busiest pages must not depend on how much data
+    # there is; each page is measured, the data grown, and measured again.
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(username='teacher', password='x', user_type='teacher')
+        cls.students = [
+            User.objects.create_user(username=f'student{i}', password='x', user_type='student', level='Beginner')
+            for i in range(3)
+        ]
+        grow_dataset(cls.teacher, cls.students, 2)
+
+    def setUp(self):
+        cache.clear()
+
+    def assertQueriesStable(self, expected, url_name, user, **kwargs):
+        client = Client()
+        client.force_login(user)
+        url = reverse(url_name, kwargs=kwargs)
+        with self.assertNumQueries(expected):
+            self.assertEqual(client.get(url).status_code, 200)
+
+        more_students = [
+            User.objects.create_user(username=f'{url_name}{i}', password='x', user_type='student')
+            for i in range(4)
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            grow_dataset(self.teacher, self.students + more_students, 6)
+        with self.assertNumQueries(expected):
+            self.assertEqual(client.get(url).status_code, 200)
+
+    def test_home(self):
+        self.assertQueriesStable(5, 'home', self.students[0])
+
+    def test_conversation_list(self):
+        self.assertQueriesStable(5, 'conversation_list', self.students[0])
+
+    def test_conversation_detail(self):
+        conversation = Conversation.objects.first()
+        self.assertQueriesStable(5, 'conversation_detail', self.students[0], pk=conversation.pk)
+
+    def test_teacher_list(self):
+        self.assertQueriesStable(4, 'teacher_list', self.students[0])
+
+    def test_student_dashboard(self):
+        self.assertQueriesStable(5, 'student_dashboard', self.students[0])
+
+    def test_courses_list(self):
+        self.assertQueriesStable(3, 'courses_list', self.students[0])
+
+
+
+class DenormalizedCounterTests(TestCase):
+    # Every step is checked against the recompute commands, which rebuild
+    # the counters from the rows they summarize.
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(username='teacher', password='x', user_type='teacher')
+        cls.students = [
+            User.objects.create_user(username=f'student{i}', password='x', user_type='student') for i in range(2)
+        ]
+        course = Course.objects.create(
+            title='Grammar', description='', required_level='Beginner', teacher=cls.teacher,
+            start_date=datetime.date.today(), class_days='Monday-Wednesday', class_time='8-10 am',
+        )
+        for student in cls.students:
+            Enrollment.objects.create(student=student, course=course)
+
+    def assertMatchesRecompute(self, command, queryset, fields):
+        before = list(queryset.order_by('pk').values_list(*fields))
+        call_command(command, stdout=StringIO())
+        self.assertEqual(list(queryset.order_by('pk').values_list(*fields)), before)
+        return before
+
+    def assertRating(self, rating_sum, rating_count, rating):
+        teachers = User.objects.filter(pk=self.teacher.pk)
+        fields = ('rating_sum', 'rating_count', 'rating')
+        self.assertEqual(self.assertMatchesRecompute('recompute_ratings', teachers, fields), [
+            (rating_sum, rating_count, rating),
+        ])
+
+    def rate(self, student, score):
+        self.client.force_login(student)
+        self.client.post(reverse('rate_teacher', kwargs={'teacher_id': self.teacher.pk}), {'score': score})
+
+    def test_rating_counters_follow_rates_rerates_and_deletes(self):
+        self.assertRating(0, 0, 0.0)
+        self.rate(self.students[0], 4)
+        self.assertRating(4, 1, 4.0)
+        self.rate(self.students[1], 2)
+        self.assertRating(6, 2, 3.0)
+        self.rate(self.students[0], 5)
+        self.assertRating(7, 2, 3.5)
+
+        for student, score, expected in ((self.students[0], 5, (2, 1, 2.0)), (self.students[1], 2, (0, 0, 0.0))):
+            Rating.objects.filter(student=student, teacher=self.teacher).delete()
+            apply_rating_delta(self.teacher.pk, -score, -1)
+            self.assertRating(*expected)
+
+    def test_conversation_counters_follow_create_edit_and_delete(self):
+        author = self.students[0]
+        self.client.force_login(author)
+
+        def counts():
+            topics = self.assertMatchesRecompute(
+                'recompute_conversation_counters', TopicCounter.objects.filter(conversation_count__gt=0),
+                ('topic', 'conversation_count'),
+            )
+            users = self.assertMatchesRecompute(
+                'recompute_conversation_counters', User.objects.filter(pk=author.pk), ('conversation_count',),
+            )
+            return dict(topics), users[0][0]
+
+        for title in ('Idioms', 'Phrasal verbs'):
+            self.client.post(reverse('conversation_create'), {'topic': 'Fun', 'title': title, 'body': 'body'})
+        self.assertEqual(counts(), ({'Fun': 2}, 2))
+
+        conversation = Conversation.objects.get(title='Idioms')
+        self.client.post(
+            reverse('conversation_edit', kwargs={'pk': conversation.pk}),
+            {'topic': 'Movies', 'title': 'Idioms', 'body': 'body'},
+        )
+        self.assertEqual(counts(), ({'Fun': 1, 'Movies': 1}, 2))
+
+        self.client.get(reverse('conversation_delete', kwargs={'pk': conversation.pk}))
+        self.assertEqual(counts(), ({'Fun': 1}, 1))
+
+    def test_like_counts_follow_likes_and_unlikes(self):
+        conversation = Conversation.objects.create(user=self.students[0], title='Idioms', body='body', topic='Fun')
+        comment = Comment.objects.create(conversation=conversation, user=self.students[0], body='Break a leg')
+        url = reverse('like_comment', kwargs={'comment_id': comment.pk})
+
+        def like(user):
+            self.client.force_login(user)
+            return self.client.post(url, headers={'x-requested-with': 'XMLHttpRequest'}).json()
+
+        def like_count():
+            comments = Comment.objects.filter(pk=comment.pk)
+            return self.assertMatchesRecompute('recompute_conversation_counters', comments, ('like_count',))[0][0]
+
+        self.assertEqual(like(self.students[0]), {'liked': True, 'like_count': 1})
+        self.assertEqual(like(self.students[1]), {'liked': True, 'like_count': 2})
+        self.assertEqual(like_count(), 2)
+        self.assertEqual(like(self.students[0]), {'liked': False, 'like_count': 1})
+        self.assertEqual(like_count(), 1)
+        self.assertEqual(like(self.students[0]), {'liked': True, 'like_count': 2})
+        self.assertEqual(like_count(), 2)
+
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertEqual(like_count(), 2)
+
+    def test_a_racing_like_is_counted_once(self):
+        conversation = Conversation.objects.create(user=self.students[0], title='Idioms', body='body', topic='Fun')
+        comment = Comment.objects.create(conversation=conversation, user=self.students[0], body='Break a leg')
+        comment.likes.add(self.students[1])
+        Comment.objects.filter(pk=comment.pk).update(like_count=1)
+
+        # The other request's like lands after this one found nothing to
+        # remove, so this one finds the row already there.
+        self.client.force_login(self.students[1])
+        with mock.patch('django.db.models.query.QuerySet.delete', return_value=(0, {})):
+            response = self.client.post(
+                reverse('like_comment', kwargs={'comment_id': comment.pk}),
+                headers={'x-requested-with': 'XMLHttpRequest'},
+            )
+        self.assertEqual(response.json(), {'liked': True, 'like_count': 1})
+        self.assertEqual(comment.likes.count(), 1)
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        student = User.objects.create_user(username='student', password='x', user_type='student')
+        conversations = [
+            Conversation.objects.create(user=student, title=f'Thread {i}', body='body', topic='Fun') for i in range(7)
+        ]
+        # Groups of rows share a timestamp, so page boundaries fall inside ties
+        # that only the id can order.
+        start = timezone.now()
+        for i, conversation in enumerate(conversations):
+            Conversation.objects.filter(pk=conversation.pk).update(created=start + datetime.timedelta(minutes=i // 4))
+        cls.newest_first = list(Conversation.objects.order_by('-created', '-id').values_list('pk', flat=True))
+        cls.factory = RequestFactory()
+
+    def paginate(self, url='', descending=True):
+        request = self.factory.get('/conversations/' + url)
+        page = keyset_paginate(request, Conversation.objects.all(), descending=descending, per_page=3)
+        return [conversation.pk for conversation in page], page
+
+    def test_forward_then_back_in_both_orders(self):
+        for descending in (True, False):
+            with self.subTest(descending=descending):
+                expected = self.newest_first if descending else self.newest_first[::-1]
+                pages = [expected[:3], expected[3:6], expected[6:]]
+
+                first, page = self.paginate(descending=descending)
+                self.assertEqual(first, pages[0])
+                self.assertFalse(page.has_previous)
+                middle, page = self.paginate(page.next_url, descending)
+                self.assertEqual(middle, pages[1])
+                self.assertTrue(page.has_previous and page.has_next)
+                last, page = self.paginate(page.next_url, descending)
+                self.assertEqual(last, pages[2])
+                self.assertFalse(page.has_next)
+
+                # Going back scans the other way but keeps each page in order.
+                middle, page = self.paginate(page.previous_url, descending)
+                self.assertEqual(middle, pages[1])
+                self.assertTrue(page.has_previous and page.has_next)
+                first, page = self.paginate(page.previous_url, descending)
+                self.assertEqual(first, pages[0])
+                self.assertFalse(page.has_previous)
+                self.assertTrue(page.has_next)
+
+    def test_invalid_or_tampered_cursors_give_the_first_page(self):
+        first, _ = self.paginate()
+        created = timezone.now().isoformat()
+        cursors = [
+            'not-a-cursor', '%%%', encode_cursor([created, 1], 'sideways'), encode_cursor([created], 'next'),
+            encode_cursor(['yesterday', 1], 'next'), encode_cursor([created, 'one'], 'prev'),
+            encode_cursor(None, 'next'), encode_cursor([{}, []], 'next'),
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.paginate('?' + urlencode({'cursor': cursor}))[0], first)
+
+        self.client.force_login(User.objects.get(username='student'))
+        overflowing = {
+            'conversation_list': [created, 2 ** 70],
+            'courses_list': [timezone.localdate().isoformat(), -2 ** 70],
+        }
+        for name, values in overflowing.items():
+            response = self.client.get(reverse(name), {'cursor': encode_cursor(values, 'next')})
+            self.assertEqual(response.status_code, 200)
+
+
+class SiteSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(username='teacher', password='x', user_type='teacher')
+        cls.student = User.objects.create_user(
+            username='sara', password='x', user_type='student', first_name='Sara', last_name='Karimi',
+        )
+        cls.conversation = Conversation.objects.create(
+            user=cls.student, title='Irregular verbs', body='Which verbs are irregular?', topic='Fun',
+        )
+        cls.comment = Comment.objects.create(conversation=cls.conversation, user=cls.teacher, body='Try flashcards')
+        cls.post = EducationalPost.objects.create(teacher=cls.teacher, title='Phrasal verbs', description='Look up')
+
+    def kinds(self, text):
+        results, _, _ = search(text)
+        return sorted(result['kind'] for result in results)
+
+    def test_new_rows_are_indexed(self):
+        self.assertEqual(self.kinds('verbs'), ['Conversation', 'Educational Post'])
+        self.assertEqual(self.kinds('flashcard'), ['Comment'])
+        results, _, _ = search('irregular')
+        self.assertEqual(str(results[0]['title']), '<mark>Irregular</mark> verbs')
+        # Infix matches come from the trigram index rather than the prefix scan.
+        self.assertEqual(find_students('arimi'), [self.student])
+
+    def test_triggers_follow_updates_and_deletes(self):
+        Conversation.objects.filter(pk=self.conversation.pk).update(title='Modal verbs', body='Can or could?')
+        self.assertEqual(self.kinds('irregular'), [])
+        self.assertEqual(self.kinds('modal'), ['Conversation'])
+        self.comment.delete()
+        self.assertEqual(self.kinds('flashcards'), [])
+        self.post.delete()
+        self.assertEqual(self.kinds('phrasal'), [])
+
+        User.objects.filter(pk=self.student.pk).update(last_name='Ahmadi')
+        self.assertEqual(find_students('arimi'), [])
+        self.assertEqual(find_students('hmadi'), [self.student])
+        User.objects.filter(pk=self.student.pk).update(user_type='teacher')
+        self.assertEqual(student_match_ids('hmadi'), [])
+
+    def test_query_syntax_is_matched_literally(self):
+        self.assertEqual(build_match_query('verb* "irr OR NEAR(a b) -x title:y ^z'), (
+            '"verb" "irr" "OR" "NEAR" "a" "b" "x" "title" "y" "z"*'
+        ))
+        self.assertEqual(build_match_query('"*^-:()'), '')
+        for text in ('"irregular', 'irregular*', 'verbs AND', 'NOT verbs', 'title:verbs', 'NEAR(verbs', '-verbs', '"'):
+            with self.subTest(text=text):
+                search(text)
+                find_students(text)
+                self.assertEqual(self.client.get(reverse('search'), {'q': text}).status_code, 200)
+        self.assertEqual(self.kinds('"irregular'), ['Conversation'])
+        self.assertEqual(find_students('Sara Karimi"'), [])
+
+    def test_rebuild_command_restores_the_index(self):
+        with search_triggers_suspended():
+            post = EducationalPost.objects.create(teacher=self.teacher, title='Idioms', description='Break a leg')
+            Comment.objects.filter(pk=self.comment.pk).update(body='Use a dictionary')
+        self.assertEqual(self.kinds('idioms'), [])
+        self.assertEqual(self.kinds('dictionary'), [])
+
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Indexed 4 document(s).', out.getvalue())
+        self.assertEqual(search('idioms')[0][0]['url'], reverse('post_detail', args=[post.pk]))
+        self.assertEqual(self.kinds('dictionary'), ['Comment'])
+        self.assertEqual(self.kinds('flashcards'), [])
+
+    def test_student_prefixes_range_scan_the_nocase_indexes(self):
+        self.assertEqual(student_match_ids('SAR'), [self.student.pk])
+        with CaptureQueriesContext(connection) as captured:
+            student_match_ids('sa')
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + captured[0]['sql'])
+            plan = '\n'.join(row[-1] for row in cursor.fetchall())
+        for field in ('username', 'first_name', 'last_name', 'email'):
+            self.assertIn(f'INDEX student_{field}_nocase (user_type=? AND {field}>? AND {field}<?)', plan)
+        self.assertNotIn('user_type_rating', plan)
+
+    def test_results_are_paged_by_keyset(self):
+        for i in range(6):
+            Conversation.objects.create(user=self.student, title=f'Tense {i}', body='tense', topic='Fun')
+        everything, _, _ = search('tense', per_page=10)
+        self.assertEqual(len(everything), 6)
+
+        first, next_cursor, previous_cursor = search('tense', per_page=4)
+        self.assertIsNone(previous_cursor)
+        second, last_cursor, previous_cursor = search('tense', next_cursor, per_page=4)
+        self.assertIsNone(last_cursor)
+        self.assertEqual([r['url'] for r in first + second], [r['url'] for r in everything])
+        back, next_again, previous_again = search('tense', previous_cursor, per_page=4)
+        self.assertEqual(back, first)
+        self.assertIsNone(previous_again)
+        self.assertEqual(next_again, next_cursor)
+
+        for cursor in ('garbage', encode_cursor([0.5, 2 ** 70], 'next'), encode_cursor(['low', 1], 'prev')):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(search('tense', cursor, per_page=4)[0], first)
+                response = self.client.get(reverse('search'), {'q': 'tense', 'cursor': cursor})
+                self.assertEqual(response.status_code, 200)
+
+
+class StudentIndexMigrationTests(TransactionTestCase):
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.migrate([('main', target or executor.loader.graph.leaf_nodes('main')[0][1])])
+
+    def nocase_indexes(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'main_customuser_%_nocase'"
+            )
+            return len(cursor.fetchall())
+
+    def test_rebuilding_the_user_table_keeps_the_nocase_indexes(self):
+        self.addCleanup(self.migrate, None)
+        # 0038 rebuilds main_customuser when applied, and when reversed on
+        # SQLite builds without DROP COLUMN.
+        self.migrate('0037_hot_path_indexes')
+        self.assertEqual(self.nocase_indexes(), 4)
+        self.migrate('0038_customuser_avatar_source')
+        self.assertEqual(self.nocase_indexes(), 4)
+
+
+class HomePageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(username='teacher', password='x', user_type='teacher')
+        cls.student = User.objects.create_user(username='student', password='x', user_type='student')
+        cls.conversation = Conversation.objects.create(user=cls.student, title='Idioms', body='body', topic='Fun')
+
+    def setUp(self):
+        cache.clear()
+        reset_home_cache_stats()
+
+    def test_repeat_visits_are_served_from_cache(self):
+        self.client.get(reverse('home'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Idioms')
+        self.assertEqual(home_cache_stats()['conversations'], {'hits': 1, 'misses': 1})
+
+    def test_writes_invalidate_only_their_block(self):
+        self.client.get(reverse('home'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(conversation=self.conversation, user=self.teacher, body='reply')
+
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, '1 comments')
+        stats = home_cache_stats()
+        self.assertEqual(stats['conversations'], {'hits': 0, 'misses': 2})
+        self.assertEqual(stats['posts'], {'hits': 1, 'misses': 1})
+        self.assertEqual(stats['teachers'], {'hits': 1, 'misses': 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            EducationalPost.objects.create(teacher=self.teacher, title='Phrasal verbs', description='text')
+        self.assertContains(self.client.get(reverse('home')), 'Phrasal verbs')
+
+
+class LiveCommentStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user(username='student', password='x', user_type='student')
+        cls.conversation = Conversation.objects.create(user=cls.student, title='Idioms', body='body', topic='Fun')
+        cls.url = reverse('conversation_events', kwargs={'pk': cls.conversation.pk})
+
+    def setUp(self):
+        live._hub = live.LocalHub()
+        self.addCleanup(setattr, live, '_hub', None)
+        self.client.force_login(self.student)
+
+    def comment_and_like(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            comment = Comment.objects.create(conversation=self.conversation, user=self.student, body='Break a leg')
+            response = self.client.post(
+                reverse('like_comment', kwargs={'comment_id': comment.pk}), headers={'x-requested-with': 'XMLHttpRequest'},
+            )
+        self.assertEqual(response.json(), {'liked': True, 'like_count': 1})
+        return comment
+
+    @async_to_sync
+    async def read_events(self, count, **headers):
+        response = await self.async_client.get(self.url, headers=headers)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = []
+        async for chunk in response.streaming_content:
+            if chunk.startswith(b'id:'):
+                fields = dict(line.split(': ', 1) for line in chunk.decode().strip().split('\n'))
+                events.append((fields['id'], fields['event'], json.loads(fields['data'])))
+            if len(events) == count:
+                return events
+
+    def test_reconnect_receives_only_missed_events(self):
+        epoch, seq = live.get_hub().cursor()
+        self.comment_and_like()
+        comment = self.comment_and_like()
+
+        events = self.read_events(2, last_event_id=live.event_id(epoch, seq + 2, 0))
+        self.assertEqual([event for _, event, _ in events], ['comment', 'likes'])
+        self.assertIn('Break a leg', events[0][2]['html'])
+        self.assertEqual(events[1][2], {'counts': {str(comment.pk): 1}})
+        self.assertEqual(live.parse_event_id(events[1][0]), (epoch, seq + 4, comment.pk))
+
+    def test_unknown_event_id_resyncs_from_the_database(self):
+        comment = self.comment_and_like()
+        events = self.read_events(2, last_event_id='stale-7-0')
+        self.assertEqual(events[0][2]['id'], comment.pk)
+        self.assertEqual(events[1][1:], ('likes', {'counts': {str(comment.pk): 1}}))
+
+    @async_to_sync
+    async def test_open_stream_receives_published_events(self):
+        response = await self.async_client.get(self.url)
+        stream = aiter(response.streaming_content)
+        self.assertTrue((await anext(stream)).startswith(b'retry:'))
+        channel = live.channel_name(self.conversation.pk)
+        await sync_to_async(live.get_hub().publish)(channel, 'likes', {'counts': {'5': 2}})
+        self.assertIn(b'"counts":{"5":2}', await anext(stream))
+        await stream.aclose()
+
+    @async_to_sync
+    async def test_first_event_is_read_through_the_asgi_client(self):
+        detail = await self.async_client.get(reverse('conversation_detail', kwargs={'pk': self.conversation.pk}))
+        self.assertContains(detail, 'new EventSource(')
+        self.assertContains(detail, 'submitInBackground(commentForm)')
+        response = await self.async_client.get(self.url)
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), f'retry: {live.RETRY_MS}\n\n'.encode())
+        await stream.aclose()
+
+    def test_wsgi_requests_get_no_stream(self):
+        # A WSGI worker cannot hold the stream open, so the page leaves the
+        # EventSource out, comments are posted as a normal form, and the
+        # endpoint answers at once.
+        detail = self.client.get(reverse('conversation_detail', kwargs={'pk': self.conversation.pk}))
+        self.assertNotContains(detail, 'new EventSource(')
+        self.assertNotContains(detail, 'submitInBackground(commentForm)')
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(response.streaming)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(prefix='blob-media-'))
+class SubmissionBlobStorageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = teacher = User.objects.create_user(username='teacher', password='x', user_type='teacher')
+        cls.students = [
+            User.objects.create_user(username=f'student{i}', password='x', user_type='student') for i in range(2)
+        ]
+        cls.course = Course.objects.create(
+            title='Course', description='', required_level='Beginner', teacher=teacher,
+            start_date=datetime.date.today(), class_days='Monday-Wednesday', class_time='8-10 am',
+        )
+        cls.assignment = Assignment.objects.create(
+            course=cls.course, title='Lab 6', description='', deadline=timezone.now() + datetime.timedelta(days=1),
+        )
+        cls.exam = Exam.objects.create(course=cls.course, title='Final', description='')
+
+    def setUp(self):
+        self.addCleanup(shutil.rmtree, settings.MEDIA_ROOT, ignore_errors=True)
+
+    def upload(self, student, url_name, field, target):
+        self.client.force_login(student)
+        report = SimpleUploadedFile('lab6-report.pdf', b'%PDF-1.4 the same report')
+        self.client.post(reverse(url_name, kwargs={'course_id': self.course.pk}), {field: target.pk, 'file': report})
+
+    def test_identical_uploads_share_one_counted_blob(self):
+        self.upload(self.students[0], 'student_assignments_view', 'assignment_id', self.assignment)
+        self.upload(self.students[1], 'student_assignments_view', 'assignment_id', self.assignment)
+        self.upload(self.students[0], 'student_course_exams', 'exam_id', self.exam)
+
+        names = set(AssignmentSubmission.objects.values_list('submitted_file', flat=True))
+        names |= set(ExamSubmission.objects.values_list('file', flat=True))
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertTrue(name.startswith('blobs/'))
+        self.assertEqual(StoredBlob.objects.get(name=name).ref_count, 3)
+        blob_files = [path for path in Path(settings.MEDIA_ROOT).rglob('*') if path.is_file()]
+        self.assertEqual(blob_files, [Path(settings.MEDIA_ROOT) / name])
+
+        AssignmentSubmission.objects.all().delete()
+        self.assertEqual(StoredBlob.objects.get(name=name).ref_count, 1)
+        call_command('collect_blobs', grace_minutes=0, stdout=StringIO())
+        self.assertTrue(submission_storage.exists(name))
+
+        ExamSubmission.objects.all().delete()
+        blob = StoredBlob.objects.get(name=name)
+        self.assertEqual(blob.ref_count, 0)
+        self.assertIsNotNone(blob.released_at)
+        call_command('collect_blobs', grace_minutes=0, stdout=StringIO())
+        self.assertFalse(StoredBlob.objects.filter(name=name).exists())
+        self.assertFalse(submission_storage.exists(name))
+
+    def test_downloads_keep_the_uploaded_name(self):
+        self.upload(self.students[0], 'student_assignments_view', 'assignment_id', self.assignment)
+        submission = AssignmentSubmission.objects.get()
+        self.assertEqual(submission.original_name, 'lab6-report.pdf')
+
+        submission.graded = True
+        submission.save()
+        submission.refresh_from_db()
+        self.assertEqual(submission.original_name, 'lab6-report.pdf')
+
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('assignment_submissions_view', kwargs={'assignment_id': self.assignment.pk}))
+        self.assertContains(response, f'href="{submission.submitted_file.url}" download="lab6-report.pdf"')
+
+
+def image_upload(name, size, mode='RGB'):
+    buffer = BytesIO()
+    Image.new(mode, size, 'orange').save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(prefix='avatar-media-'))
+class ProfileImageVariantTests(TestCase):
+    def setUp(self):
+        self.addCleanup(shutil.rmtree, settings.MEDIA_ROOT, ignore_errors=True)
+        self.user = User.objects.create_user(username='student', email='s@example.com', password='x')
+        self.client.force_login(self.user)
+
+    def upload(self, image):
+        return self.client.post(reverse('edit_profile'), {
+            'username': 'student', 'email': 's@example.com', 'profile_picture': image,
+        })
+
+    def test_upload_is_downscaled_with_variants(self):
+        self.upload(image_upload('portrait.png', (2500, 1800)))
+        self.user.refresh_from_db()
+        name = self.user.profile_image.name
+        self.assertEqual(name, 'profile_pics/portrait.jpg')
+        with Image.open(self.user.profile_image.path) as stored:
+            self.assertEqual(stored.size, (MAX_AVATAR_SIZE, 461))
+        for size, pixels in AVATAR_SIZES.items():
+            with default_storage.open(avatar_variant_name(name, size)) as file, Image.open(file) as variant:
+                self.assertEqual(variant.size, (pixels, pixels))
+
+        template = Template('{% load filters %}{% avatar_url image 28 %}|{% avatar_url image 400 %}')
+        with mock.patch.object(default_storage, 'exists', side_effect=AssertionError("storage checked")):
+            rendered = template.render(Context({'image': self.user.profile_image}))
+        self.assertEqual(
+            rendered, '/media/avatar_variants/profile_pics/portrait.jpg/small.jpg|/media/profile_pics/portrait.jpg',
+        )
+
+        self.upload(image_upload('logo.png', (300, 300), mode='RGBA'))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.profile_image.name, 'profile_pics/logo.png')
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(default_storage.exists(avatar_variant_name(name, 'small')))
+
+    def test_uploads_never_touch_other_users_pictures(self):
+        other = User.objects.create_user(username='other', email='o@example.com', password='x')
+        other.profile_image.save('y_small.jpg', image_upload('y_small.png', (100, 100)))
+        other_name = other.profile_image.name
+
+        self.upload(image_upload('y.png', (400, 400)))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.profile_image.name, 'profile_pics/y.jpg')
+        with default_storage.open(other_name) as file, Image.open(file) as picture:
+            self.assertEqual(picture.size, (100, 100))
+
+        self.upload(image_upload('z.png', (400, 400)))
+        self.assertTrue(default_storage.exists(other_name))
+        self.assertFalse(default_storage.exists(avatar_variant_name('profile_pics/y.jpg', 'small')))
+
+    def test_variants_are_only_linked_for_the_image_they_were_made_from(self):
+        self.upload(image_upload('portrait.png', (400, 400)))
+        self.user.refresh_from_db()
+        self.user.profile_image = 'profile_pics/replaced.jpg'
+        rendered = Template('{% load filters %}{% avatar_url image 28 %}').render(
+            Context({'image': self.user.profile_image})
+        )
+        self.assertEqual(rendered, '/media/profile_pics/replaced.jpg')
+
+    def test_invalid_image_is_rejected(self):
+        self.upload(SimpleUploadedFile('notes.png', b'not an image'))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.profile_image.name, DEFAULT_PROFILE_IMAGE)
+
+    def test_backfill_command(self):
+        buffer = BytesIO()
+        Image.new('RGB', (800, 800), 'teal').save(buffer, 'JPEG')
+        self.user.profile_image.save('old.jpg', ContentFile(buffer.getvalue()))
+        call_command('generate_avatar_variants', workers=2, stdout=StringIO())
+        for size in AVATAR_SIZES:
+            self.assertTrue(default_storage.exists(avatar_variant_name('profile_pics/old.jpg', size)))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.avatar_source, 'profile_pics/old.jpg')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(prefix='post-media-'))
+class PostImageDerivativeTests(TestCase):
+    def setUp(self):
+        self.addCleanup(shutil.rmtree, settings.MEDIA_ROOT, ignore_errors=True)
+        self.teacher = User.objects.create_user(username='teacher', password='x', user_type='teacher')
+        self.client.force_login(self.teacher)
+
+    def photo(self, name, size):
+        buffer = BytesIO()
+        Image.effect_noise(size, 60).convert('RGB').save(buffer, 'JPEG', quality=95)
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def derivatives(self, post):
+        return post_derivative_names(post.image.name, post.image_widths)
+
+    def test_uploads_get_webp_and_fallback_widths(self):
+        self.client.post(reverse('educational_post_create'), {
+            'title': 'Present perfect', 'description': 'text', 'image': self.photo('tense.jpg', (1200, 800)),
+        })
+        post = EducationalPost.objects.get()
+        self.assertEqual(post.image_widths, [160, 320, 640, 1024, 1200])
+        for name in self.derivatives(post):
+            self.assertTrue(default_storage.exists(name), name)
+        thumbnail = post_derivative_name(post.image.name, 320, '.webp')
+        self.assertLess(default_storage.size(thumbnail) * 10, post.image.size)
+
+        response = self.client.get(reverse('educational_post_list'))
+        self.assertContains(response, f'{default_storage.url(thumbnail)} 320w')
+        self.assertContains(response, 'type="image/webp"')
+
+        old = self.derivatives(post)
+        self.client.post(reverse('educational_post_update', kwargs={'pk': post.pk}), {
+            'title': 'Present perfect', 'description': 'text', 'image': self.photo('tense2.jpg', (500, 300)),
+        })
+        post.refresh_from_db()
+        self.assertEqual(post.image_widths, [160, 320, 500])
+        self.assertFalse(any(default_storage.exists(name) for name in old))
+
+        current = self.derivatives(post)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('educational_post_delete', kwargs={'pk': post.pk}))
+        self.assertFalse(any(default_storage.exists(name) for name in current))
+
+    def test_derivatives_never_touch_other_uploads(self):
+        other = EducationalPost.objects.create(
+            teacher=self.teacher, title='Other', description='text', image=self.photo('photo_w640.jpg', (300, 200)),
+        )
+        self.client.post(reverse('educational_post_create'), {
+            'title': 'New', 'description': 'text', 'image': self.photo('photo.jpg', (900, 600)),
+        })
+        post = EducationalPost.objects.exclude(pk=other.pk).get()
+        self.assertIn(640, post.image_widths)
+        with default_storage.open(other.image.name) as file, Image.open(file) as picture:
+            self.assertEqual(picture.size, (300, 200))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('educational_post_delete', kwargs={'pk': post.pk}))
+        self.assertTrue(default_storage.exists(other.image.name))
+
+    def test_backfill_command(self):
+        post = EducationalPost.objects.create(
+            teacher=self.teacher, title='Old', description='text', image=self.photo('old.jpg', (700, 400)),
+        )
+        call_command('generate_post_derivatives', workers=2, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.image_widths, [160, 320, 640, 700])
+        self.assertTrue(all(default_storage.exists(name) for name in self.derivatives(post)))
+
+
+class ExamGradingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(username='teacher', password='x', user_type='teacher')
+        course = Course.objects.create(
+            title='Course', description='', required_level='Beginner', teacher=cls.teacher,
+            start_date=datetime.date.today(), class_days='Monday-Wednesday', class_time='8-10 am',
+        )
+        cls.exam = Exam.objects.create(course=course, title='Final', description='')
+        cls.submissions = [
+            ExamSubmission.objects.create(
+                exam=cls.exam, file='exam_submissions/paper.pdf',
+                student=User.objects.create_user(username=f'student{i}', password='x', user_type='student'),
+            )
+            for i in range(3)
+        ]
+        cls.url = reverse('exam_submissions_view', kwargs={'exam_id': cls.exam.pk})
+
+    def setUp(self):
+        self.client.force_login(self.teacher)
+
+    def grades(self):
+        return dict(self.exam.submissions.values_list('student__username', 'grade'))
+
+    def test_grid_is_saved_in_one_bulk_update(self):
+        data = {f'grade_{submission.pk}': 50 + i for i, submission in enumerate(self.submissions)}
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.post(self.url, data)
+        updates = [query for query in captured if query['sql'].startswith('UPDATE "main_examsubmission"')]
+        self.assertEqual(len(updates), 1)
+        self.assertRedirects(response, self.url)
+        self.assertEqual(self.grades(), {'student0': 50, 'student1': 51, 'student2': 52})
+        self.assertFalse(self.exam.submissions.filter(graded=False).exists())
+
+    def test_csv_upload(self):
+        upload = SimpleUploadedFile('grades.csv', b'username,grade\nstudent0,88.5\nstudent2,70\n')
+        self.client.post(self.url, {'grades_csv': upload})
+        self.assertEqual(self.grades(), {'student0': Decimal('88.50'), 'student1': None, 'student2': 70})
+
+    def test_one_bad_row_rejects_the_whole_batch(self):
+        upload = SimpleUploadedFile('grades.csv', b'student0,90\nstudent1,120\nghost,10\n')
+        response = self.client.post(self.url, {'grades_csv': upload})
+        self.assertEqual(response.status_code, 200)
+        errors = response.context['form'].non_field_errors()
+        self.assertEqual(len(errors), 2)
+        self.assertIn('ghost has no submission', errors[1])
+        self.assertEqual(set(self.grades().values()), {None})
+
+    def test_only_the_course_teacher_can_grade(self):
+        other = User.objects.create_user(username='other', password='x', user_type='teacher')
+        self.client.force_login(other)
+        self.assertEqual(self.client.post(self.url, {f'grade_{self.submissions[0].pk}': 10}).status_code, 404)
+
+class GradebookExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(username='teacher', password='x', user_type='teacher')
+        cls.courses = [cls.add_course(f'Course {n}') for n in (1, 2)]
+
+    @classmethod
+    def add_course(cls, title, students=2):
+        course = Course.objects.create(
+            title=title, description='', required_level='Beginner', teacher=cls.teacher,
+            start_date=datetime.date.today(), class_days='Monday-Wednesday', class_time='8-10 am',
+        )
+        assignment = Assignment.objects.create(course=course, title='Essay', description='', deadline=timezone.now())
+        exam = Exam.objects.create(course=course, title='Final', description='')
+        offset = User.objects.count()
+        for i in range(students):
+            student = User.objects.create_user(username=f'student{offset + i}', password='x', user_type='student')
+            Enrollment.objects.create(course=course, student=student, grade=80 + i)
+            AssignmentSubmission.objects.create(
+                assignment=assignment, student=student, submitted_file='assignments/essay.pdf', graded=True, grade=i,
+            )
+            if i:
+                ExamSubmission.objects.create(
+                    exam=exam, student=student, file='exam_submissions/paper.pdf', graded=True, grade=Decimal('9.5'),
+                )
+        return course
+
+    def setUp(self):
+        self.client.force_login(self.teacher)
+
+    def export(self, url, export_format):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, {'format': export_format})
+            content = b''.join(response.streaming_content)
+        return response, content, len(captured)
+
+    def test_csv_pivots_one_row_per_student(self):
+        course = self.courses[0]
+        response, content, _ = self.export(reverse('course_gradebook', args=[course.pk]), 'csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        usernames = list(course.enrollment_set.order_by('student_id').values_list('student__username', flat=True))
+        self.assertEqual(list(csv.reader(StringIO(content.decode()))), [
+            ['Course 1'],
+            ['Username', 'First name', 'Last name', 'Course grade', 'Essay', 'Exam: Final'],
+            [usernames[0], '', '', '80', '0', ''],
+            [usernames[1], '', '', '81', '1', '9.50'],
+        ])
+
+    def test_query_count_does_not_grow_with_courses_or_students(self):
+        url = reverse('teacher_gradebook')
+        _, _, before = self.export(url, 'csv')
+        self.add_course('Course 3', students=5)
+        _, content, after = self.export(url, 'csv')
+        self.assertEqual(after, before)
+        self.assertEqual(content.decode().count('Exam: Final'), 3)
+
+    def test_xlsx_has_a_sheet_per_course(self):
+        response, content, _ = self.export(reverse('teacher_gradebook'), 'xlsx')
+        self.assertTrue(response['Content-Disposition'].endswith('.xlsx"'))
+        namespace = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        with zipfile.ZipFile(BytesIO(content)) as workbook:
+            sheets = ElementTree.fromstring(workbook.read('xl/workbook.xml')).findall('.//s:sheet', namespace)
+            self.assertEqual([sheet.get('name') for sheet in sheets], ['Course 1', 'Course 2'])
+            rows = ElementTree.fromstring(workbook.read('xl/worksheets/sheet2.xml')).findall('.//s:row', namespace)
+        self.assertEqual(len(rows), 4)
+        last = rows[-1].findall('s:c', namespace)
+        self.assertEqual([cell.findtext('s:v', namespaces=namespace) for cell in last[3:]], ['81', '1', '9.50'])
+
+    def test_other_teachers_cannot_export(self):
+        other = User.objects.create_user(username='other', password='x', user_type='teacher')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(reverse('course_gradebook', args=[self.courses[0].pk])).status_code, 404)
+
+    def test_teacher_dashboard_links_the_gradebook(self):
+        # The dashboard counts placement requests for this teacher.
+        User.objects.create_user(username='Mahdieh Arabi', password='x', user_type='teacher')
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('teacher_dashboard'))
+        self.assertContains(response, f"href=\"{reverse('teacher_gradebook')}?format=csv\"")
+        self.assertContains(response, f"href=\"{reverse('teacher_gradebook')}?format=xlsx\"")
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(prefix='zip-media-'))
+class SubmissionZipTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(username='teacher', password='x', user_type='teacher')
+        course = Course.objects.create(
+            title='Course', description='', required_level='Beginner', teacher=cls.teacher,
+            start_date=datetime.date.today(), class_days='Monday-Wednesday', class_time='8-10 am',
+        )
+        cls.assignment = Assignment.objects.create(
+            course=course, title='Essay', description='', deadline=timezone.now(),
+        )
+        cls.url = reverse('assignment_submissions_zip', kwargs={'assignment_id': cls.assignment.pk})
+
+    def setUp(self):
+        self.addCleanup(shutil.rmtree, settings.MEDIA_ROOT, ignore_errors=True)
+        self.addCleanup(cache.clear)
+        files = {'ana': ('essay.pdf', b'%PDF-1.4 ' + os.urandom(2000)), 'bob': ('essay.txt', b'plain text ' * 500)}
+        for username, (name, content) in files.items():
+            AssignmentSubmission.objects.create(
+                assignment=self.assignment, submitted_file=submission_storage.save(name, ContentFile(content)),
+                student=User.objects.create_user(username=username, password='x', user_type='student'),
+            )
+        self.files = files
+        self.client.force_login(self.teacher)
+
+    def download(self, **headers):
+        response = self.client.get(self.url, headers=headers)
+        return response, b''.join(response.streaming_content)
+
+    def test_archive_names_entries_by_student_and_stores_pdfs(self):
+        response, content = self.download()
+        self.assertEqual(int(response['Content-Length']), len(content))
+        with zipfile.ZipFile(BytesIO(content)) as archive:
+            self.assertIsNone(archive.testzip())
+            infos = {info.filename: info for info in archive.infolist()}
+            self.assertEqual(set(infos), {'ana.pdf', 'bob.txt'})
+            self.assertEqual(infos['ana.pdf'].compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(infos['bob.txt'].compress_type, zipfile.ZIP_DEFLATED)
+            self.assertEqual(archive.read('bob.txt'), self.files['bob'][1])
+
+    def test_range_resumes_the_same_bytes(self):
+        full_response, full = self.download()
+        for start in (10, len(full) // 2, len(full) - 30):
+            response, part = self.download(range=f'bytes={start}-', if_range=full_response['ETag'])
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(response['Content-Range'], f'bytes {start}-{len(full) - 1}/{len(full)}')
+            self.assertEqual(part, full[start:])
+        response, part = self.download(range='bytes=100-199')
+        self.assertEqual(part, full[100:200])
+
+    def test_stale_if_range_and_bad_ranges(self):
+        response, content = self.download(range='bytes=0-9', if_range='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(int(response['Content-Length']), len(content))
+        response = self.client.get(self.url, headers={'range': f'bytes={len(content)}-'})
+        self.assertEqual(response.status_code, 416)
+
+    def test_only_the_course_teacher_can_download(self):
+        self.client.force_login(User.objects.get(username='ana'))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_entries_over_4_gib_carry_zip64_sizes(self):
+        huge = 5 * 1024 ** 3
+        big, small = AssignmentSubmission.objects.order_by('student__username').values_list('submitted_file', flat=True)
+        measure = archives.measure
+
+        def pretend_big(storage, name, method):
+            return (0, huge, huge) if name == big else measure(storage, name, method)
+
+        with mock.patch.object(archives, 'measure', pretend_big):
+            manifest = archives.ZipManifest(submission_storage, [
+                ('ana.pdf', big, timezone.now()), ('bob.txt', small, timezone.now()),
+            ])
+        header = manifest.parts[0][0]
+        self.assertEqual(struct.unpack('<II', header[18:26]), (0xFFFFFFFF, 0xFFFFFFFF))
+        self.assertEqual(struct.unpack('<HHQQ', header[-20:]), (1, 16, huge, huge))
+
+        # Only the directory and bob's entry are read; ana's data is never reached.
+        with zipfile.ZipFile(ManifestFile(manifest)) as archive:
+            infos = {info.filename: info for info in archive.infolist()}
+            self.assertEqual((infos['ana.pdf'].file_size, infos['ana.pdf'].compress_size), (huge, huge))
+            self.assertGreater(infos['bob.txt'].header_offset, 0xFFFFFFFF)
+            self.assertEqual(archive.read('bob.txt'), self.files['bob'][1])
+
+    def test_plain_files_are_measured_once_until_they_change(self):
+        name = default_storage.save('notes/essay.txt', ContentFile(b'first draft ' * 100))
+        files = [('ana.txt', name, timezone.now())]
+        with mock.patch.object(archives, '_read_chunks', wraps=archives._read_chunks) as reads:
+            first = archives.ZipManifest(default_storage, files)
+            self.assertEqual(archives.ZipManifest(default_storage, files).etag, first.etag)
+            self.assertEqual(reads.call_count, 1)
+
+            with default_storage.open(name, 'wb') as file:
+                file.write(b'final version ' * 100)
+            self.assertNotEqual(archives.ZipManifest(default_storage, files).etag, first.etag)
+            self.assertEqual(reads.call_count, 2)
+
+
+class ManifestFile:
+    # A read-only, seekable view of a ZipManifest, so zipfile can open an
+    # archive that is never built in full.
+
+    def __init__(self, manifest):
+        self.manifest = manifest
+        self.position = 0
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self.position = (0, self.position, self.manifest.size)[whence] + offset
+        return self.position
+
+    def read(self, n=-1):
+        end = self.manifest.size if n is None or n < 0 else min(self.position + n, self.manifest.size)
+        data = b''.join(self.manifest.stream(self.position, end - 1)) if end > self.position else b''
+        self.position = end
+        return data
+
+
+BENCHMARK_BASELINE = Path(
+    os.environ.get('BENCHMARK_BASELINE') or Path(__file__).resolve().parent / 'benchmark_baseline.json'
+)
+# A path to write this run's results to instead of comparing them; copy the
+# file over the baseline once the numbers look right.
+BENCHMARK_RECORD = os.environ.get('BENCHMARK_RECORD')
+BENCHMARK_ROUNDS = int(os.environ.get('BENCHMARK_ROUNDS', 5))
+# A view regresses when its median exceeds the baseline by this factor (and by
+# at least the floor, so sub-millisecond views do not fail on noise) or when it
+# runs more queries than recorded, in total or against the primary.
+BENCHMARK_TIME_FACTOR = float(os.environ.get('BENCHMARK_TIME_FACTOR', 2.0))
+BENCHMARK_TIME_FLOOR_MS = float(os.environ.get('BENCHMARK_TIME_FLOOR_MS', 20.0))
+BENCHMARK_QUERY_SLACK = int(os.environ.get('BENCHMARK_QUERY_SLACK', 0))
+
+# These change data on GET, so repeating them would measure different work.
+STATE_CHANGING_URLS = {
+    'logout', 'delete_course', 'remove_student_from_course', 'conversation_delete', 'exam_delete',
+}
+# Open-ended event streams, which have no response time to compare.
+STREAMING_URLS = {'conversation_events'}
+TEACHER_URLS = {
+    'teacher_dashboard', 'search_students', 'student_autocomplete', 'add_student_to_course', 'course_detail',
+    'set_student_grade', 'set_student_level', 'teacher_requests', 'student_profile_detail', 'set_course_link',
+    'assignment_list_create', 'assignment_submissions', 'assignment_submissions_view', 'educational_post_create',
+    'educational_post_update', 'educational_post_delete', 'level_requests', 'exam_list', 'add_exam', 'grade_exams',
+    'exam_update', 'exam_submissions_view', 'course_gradebook', 'teacher_gradebook', 'assignment_submissions_zip',
+    'exam_submissions_zip',
+}
+STAFF_URLS = {'profiling_report'}
+ANONYMOUS_URLS = {'login', 'signup'}
+QUERY_STRINGS = {
+    'search_students': {'query': 'seed_student_1'},
+    'student_autocomplete': {'q': 'seed_stu'},
+    'search': {'q': 'grammar practice'},
+}
+
+
+@override_settings(REQUEST_PROFILING=True, QUERY_BUDGETS={'teacher_list': 100}, QUERY_BUDGET_ACTION='log')
+class RequestProfilingMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user(username='student', password='x', user_type='student')
+        cls.staff = User.objects.create_user(username='staff', password='x', is_staff=True)
+
+    def setUp(self):
+        reset_profiling_report()
+        self.addCleanup(reset_profiling_report)
+        self.client.force_login(self.student)
+
+    def test_server_timing_reports_the_request_queries(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('teacher_list'))
+        # Read now: the next request's request_started signal clears the log.
+        queries = len(captured)
+        timing = response['Server-Timing']
+        self.assertEqual(re.findall(r'(\w+);dur=[\d.]+', timing), ['db', 'tpl', 'total'])
+        self.assertIn(f'desc="{queries} queries, 0 duplicates"', timing)
+
+        self.client.get(reverse('teacher_list'))
+        report = profiling_report()['teacher_list']
+        self.assertEqual(report['requests'], 2)
+        self.assertEqual(report['max_queries'], queries)
+        self.assertEqual(report['budget_violations'], 0)
+
+    def test_duplicates_are_counted_per_statement(self):
+        profile = RequestProfile()
+        for sql in ('SELECT 1', 'SELECT 2', 'SELECT 1', 'SELECT 1'):
+            profile(lambda *args: None, sql, (), False, {})
+        self.assertEqual((profile.query_count, profile.duplicate_count), (4, 2))
+
+    def test_query_budgets_log_or_raise(self):
+        with override_settings(QUERY_BUDGETS={'teacher_list': 0}):
+            with self.assertLogs('main.middleware', 'WARNING') as logs:
+                self.assertEqual(Client().get(reverse('teacher_list')).status_code, 200)
+            self.assertIn('teacher_list ran', logs.output[0])
+            self.assertEqual(profiling_report()['teacher_list']['budget_violations'], 1)
+
+            with override_settings(QUERY_BUDGET_ACTION='raise'), self.assertRaises(QueryBudgetExceeded):
+                Client().get(reverse('teacher_list'))
+
+    def test_report_is_staff_only_and_off_without_the_setting(self):
+        self.assertEqual(self.client.get(reverse('profiling_report')).status_code, 403)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(reverse('profiling_report')).status_code, 200)
+
+        with override_settings(REQUEST_PROFILING=False):
+            self.assertFalse(Client().get(reverse('teacher_list')).has_header('Server-Timing'))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(prefix='seed-media-'))
+class SeedScaleTests(TestCase):
+    def setUp(self):
+        self.addCleanup(shutil.rmtree, settings.MEDIA_ROOT, ignore_errors=True)
+
+    def seed(self, **options):
+        call_command(
+            'seed_scale', teachers=2, students=6, courses=3, enrollments_per_student=2, assignments_per_course=2,
+            exams_per_course=1, conversations=5, comments_per_conversation=2, likes_per_comment=1, posts=3,
+            reservations=4, stdout=StringIO(), **options,
+        )
+        return {
+            model: model.objects.count()
+            for model in (
+                User, Course, Enrollment, Assignment, AssignmentSubmission, Exam, ExamSubmission, Conversation,
+                Comment, EducationalPost, Rating, PlacementTestReservation,
+            )
+        }
+
+    def test_tiny_dataset_is_consistent(self):
+        counts = self.seed()
+        # The placement teacher is created alongside the seeded users.
+        self.assertEqual(counts[User], 2 + 6 + 1)
+        self.assertEqual(User.objects.filter(username__startswith='seed_', user_type='student').count(), 6)
+        self.assertEqual(
+            [counts[model] for model in (Course, Assignment, Exam, Conversation, EducationalPost)], [3, 6, 3, 5, 3],
+        )
+        self.assertEqual(counts[PlacementTestReservation], 4)
+        self.assertTrue(0 < counts[Enrollment] <= 6 * 2)
+
+        # Raw inserts bypass the ORM, so every foreign key is checked here
+        # instead of at a commit the test never makes.
+        connection.check_constraints()
+        # The counters and the search index are rebuilt after the load.
+        for command in ('recompute_ratings', 'recompute_conversation_counters'):
+            before = list(User.objects.order_by('pk').values_list('rating_sum', 'rating_count', 'conversation_count'))
+            call_command(command, stdout=StringIO())
+            self.assertEqual(list(User.objects.order_by('pk').values_list(
+                'rating_sum', 'rating_count', 'conversation_count',
+            )), before)
+        self.assertTrue(search(Conversation.objects.first().title.split()[0])[0])
+
+        self.assertEqual(self.seed(flush=True), counts)
+        connection.check_constraints()
+
+
+class BenchmarkCoverageTests(TestCase):
+    def test_every_url_is_covered(self):
+        names = {pattern.name for pattern in main_urls.urlpatterns}
+        roles = TEACHER_URLS | STAFF_URLS | ANONYMOUS_URLS | STATE_CHANGING_URLS | STREAMING_URLS
+        self.assertEqual(roles - names, set())
+
+
+@tag('benchmark')
+@skipUnless(os.environ.get('BENCHMARKS'), "Set BENCHMARKS=1 and run with --tag benchmark.")
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(prefix='benchmark-media-'))
+class ViewBenchmarkTests(TransactionTestCase):
+    # Drives every URL in main/urls.py against a seeded dataset and compares
+    # median wall time and query counts with BENCHMARK_BASELINE. Wall times
+    # depend on the machine, so it only runs when asked for:
+    #   BENCHMARKS=1 python manage.py test main --tag benchmark
+    # Outside a test transaction reads go through the router to the replica,
+    # as they do in production.
+    databases = {'default', routers.REPLICA}
+
+    def setUp(self):
+        self.addCleanup(shutil.rmtree, settings.MEDIA_ROOT, ignore_errors=True)
+        call_command(
+            'seed_scale', teachers=5, students=200, courses=20, assignments_per_course=5, exams_per_course=2,
+            conversations=300, comments_per_conversation=10, posts=40, reservations=50, stdout=StringIO(),
+        )
+        enrollment = Enrollment.objects.select_related('course__teacher', 'student').order_by('id').first()
+        self.course, self.student = enrollment.course, enrollment.student
+        self.teacher = self.course.teacher
+        self.staff = User.objects.create_user(username='benchmark_staff', password='x', is_staff=True)
+        self.assignment = self.course.assignments.order_by('id').first()
+        self.exam = self.course.exams.order_by('id').first()
+        self.conversation = Conversation.objects.order_by('-id').first()
+        self.comment = self.conversation.comments.order_by('id').first()
+        self.post = EducationalPost.objects.filter(teacher=self.teacher).order_by('id').first() \
+            or EducationalPost.objects.create(teacher=self.teacher, title='Benchmark', description='text')
+
+    def url_kwargs(self, pattern):
+        values = {
+            'course_id': self.course.pk,
+            'student_id': self.student.pk,
+            'teacher_id': self.teacher.pk,
+            'assignment_id': self.assignment.pk,
+            'exam_id': self.exam.pk,
+            'comment_id': self.comment.pk,
+            'pk': self.post.pk if 'post' in pattern.name else self.conversation.pk,
+        }
+        return {name: values[name] for name in pattern.pattern.converters}
+
+    def client_for(self, name):
+        client = Client()
+        if name in STAFF_URLS:
+            client.force_login(self.staff)
+        elif name in TEACHER_URLS:
+            client.force_login(self.teacher)
+        elif name not in ANONYMOUS_URLS:
+            client.force_login(self.student)
+        return client
+
+    def measure(self, pattern):
+        client = self.client_for(pattern.name)
+        url = reverse(pattern.name, kwargs=self.url_kwargs(pattern))
+        params = QUERY_STRINGS.get(pattern.name, {})
+        client.get(url, params)
+
+        timings, queries, primary_queries = [], [], []
+        for _ in range(BENCHMARK_ROUNDS):
+            with ExitStack() as stack:
+                captured = {
+                    alias: stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in self.databases
+                }
+                start = time.perf_counter()
+                response = client.get(url, params)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(sum(len(alias_queries) for alias_queries in captured.values()))
+            primary_queries.append(len(captured[DEFAULT_DB_ALIAS]))
+        self.assertLess(response.status_code, 500, url)
+
+        return {
+            'status': response.status_code,
+            'queries': max(queries),
+            'primary_queries': max(primary_queries),
+            'p50_ms': round(percentile(timings, 0.50), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'max_ms': round(max(timings), 2),
+        }
+
+    def test_views_against_baseline(self):
+        results = {}
+        for pattern in main_urls.urlpatterns:
+            if pattern.name in STATE_CHANGING_URLS | STREAMING_URLS or pattern.name in results:
+                continue
+            results[pattern.name] = self.measure(pattern)
+
+        if BENCHMARK_RECORD:
+            Path(BENCHMARK_RECORD).write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
+            return
+
+        baseline = json.loads(BENCHMARK_BASELINE.read_text())
+        regressions = []
+        for name, result in sorted(results.items()):
+            expected = baseline.get(name)
+            if expected is None:
+                regressions.append(f"{name}: no baseline recorded (record one with BENCHMARK_RECORD=<path>)")
+                continue
+            for key in ('queries', 'primary_queries'):
+                if result[key] > expected[key] + BENCHMARK_QUERY_SLACK:
+                    regressions.append(f"{name}: {result[key]} {key}, baseline {expected[key]}")
+            limit = max(expected['p50_ms'] * BENCHMARK_TIME_FACTOR, expected['p50_ms'] + BENCHMARK_TIME_FLOOR_MS)
+            if result['p50_ms'] > limit:
+                regressions.append(f"{name}: p50 {result['p50_ms']}ms, baseline {expected['p50_ms']}ms")
+        if regressions:
+            self.fail("View benchmarks regressed:\n" + '\n'.join(regressions))
+
+
+@override_settings(
+    ALLOWED_HOSTS=['127.0.0.1'], MEDIA_ROOT=tempfile.mkdtemp(prefix='load-test-media-'),
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class LoadTestCommandTests(TransactionTestCase):
+    databases = {'default', routers.REPLICA}
+
+    def setUp(self):
+        self.addCleanup(shutil.rmtree, settings.MEDIA_ROOT, ignore_errors=True)
+        call_command(
+            'seed_scale', teachers=2, students=10, courses=4, conversations=20, posts=2, reservations=5,
+            stdout=StringIO(),
+        )
+
+    def test_journeys_run_against_local_server(self):
+        report_path = Path(settings.MEDIA_ROOT) / 'report.json'
+        out = StringIO()
+        call_command('load_test', students=3, teachers=1, duration=1, save=str(report_path), stdout=out)
+
+        report = json.loads(report_path.read_text())
+        steps = report['steps']
+        for step in ('login', 'student_dashboard', 'teacher_dashboard', 'conversation_detail', 'comment'):
+            self.assertIn(step, steps)
+        self.assertEqual(steps['login']['statuses'], {'302': 4})
+        self.assertEqual(report['total']['errors'], 0, steps)
+        self.assertGreater(report['total']['throughput_rps'], 0)
+        self.assertIn('req/s', out.getvalue())
+
+        out = StringIO()
+        call_command('load_test', compare=[str(report_path), str(report_path)], stdout=out)
+        self.assertIn('throughput_rps', out.getvalue())
+        self.assertIn('+0.0%', out.getvalue())
+
+    def test_handler_benchmark_serves_read_views_through_wsgi_and_asgi(self):
+        report_path = Path(settings.MEDIA_ROOT) / 'handlers.json'
+        call_command(
+            'benchmark_handlers', workers=2, rounds=2, host='127.0.0.1', save=str(report_path), stdout=StringIO(),
+        )
+
+        reports = json.loads(report_path.read_text())
+        for interface in ('wsgi', 'asgi'):
+            steps = reports[interface]['steps']
+            self.assertEqual(len(steps), 6)
+            self.assertEqual(reports[interface]['total']['errors'], 0, steps)
+            self.assertEqual(steps['courses_list']['statuses'], {'200': 2})
+
+
+@override_settings(SQLITE_LOCK_RETRIES=5, SQLITE_LOCK_BACKOFF=0)
+class SQLiteProfileTests(TransactionTestCase):
+    databases = {'default', routers.REPLICA}
+
+    @override_settings(SQLITE_PRAGMAS=settings.SQLITE_PRODUCTION_PRAGMAS)
+    def test_connections_use_the_production_pragmas(self):
+        connection.close()
+        with connection.cursor() as cursor:
+            for pragma, expected in (('journal_mode', 'wal'), ('synchronous', 1), ('busy_timeout', 5000)):
+                cursor.execute(f'PRAGMA {pragma}')
+                self.assertEqual(cursor.fetchone()[0], expected, pragma)
+
+    def test_retrying_repeats_only_lock_errors(self):
+        attempts = []
+
+        def flaky(error):
+            attempts.append(error)
+            if len(attempts) < 3:
+                raise OperationalError(error)
+            return 'done'
+
+        self.assertEqual(retrying(flaky)('database is locked'), 'done')
+        self.assertEqual(len(attempts), 3)
+        attempts.clear()
+        with self.assertRaises(OperationalError):
+            retrying(flaky)('no such table: main_comment')
+        self.assertEqual(len(attempts), 1)
+
+    def test_write_transactions_are_retried_from_scratch(self):
+        attempts = []
+
+        @write_transaction
+        def create():
+            attempts.append(User.objects.create_user(username=f'attempt{len(attempts)}').username)
+            if len(attempts) == 1:
+                raise OperationalError('database is locked')
+            return 'ok'
+
+        self.assertEqual(create(), 'ok')
+        self.assertEqual(list(User.objects.values_list('username', flat=True)), ['attempt1'])
+
+        attempts.clear()
+        with self.assertRaises(OperationalError), transaction.atomic():
+            # Inside an outer transaction the failed attempt cannot be undone
+            # on its own, so it is not retried.
+            create()
+        self.assertEqual(len(attempts), 1)
+
+    @override_settings(SQLITE_LOCK_RETRIES=0)
+    def test_write_transactions_wait_for_the_write_lock(self):
+        conversation = Conversation.objects.create(
+            user=User.objects.create_user(username='author'), title='Idioms', body='body', topic='Fun',
+        )
+        # A fresh connection has not cached the search index's structure yet.
+        connection.close()
+        other = sqlite3.connect(connection.settings_dict['NAME'], isolation_level=None, check_same_thread=False)
+        self.addCleanup(other.close)
+        other.execute('BEGIN IMMEDIATE')
+        release = threading.Timer(0.3, other.execute, ['COMMIT'])
+        release.start()
+        self.addCleanup(release.join)
+
+        # The comment's first statement fires the search trigger, which reads
+        # before it writes; without the lock up front SQLite would fail the
+        # transaction at once instead of waiting for the other writer.
+        @write_transaction
+        def comment():
+            return Comment.objects.create(conversation=conversation, user=conversation.user, body='Break a leg')
+
+        started = time.monotonic()
+        self.assertEqual(comment().body, 'Break a leg')
+        self.assertGreaterEqual(time.monotonic() - started, 0.25)
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp(prefix='retry-media-'))
+    def test_a_retried_upload_counts_its_blob_once(self):
+        self.addCleanup(shutil.rmtree, settings.MEDIA_ROOT, ignore_errors=True)
+        teacher = User.objects.create_user(username='teacher', password='x', user_type='teacher')
+        student = User.objects.create_user(username='student', password='x', user_type='student')
+        course = Course.objects.create(
+            title='Course', description='', required_level='Beginner', teacher=teacher,
+            start_date=datetime.date.today(), class_days='Monday-Wednesday', class_time='8-10 am',
+        )
+        assignment = Assignment.objects.create(
+            course=course, title='Essay', description='', deadline=timezone.now() + datetime.timedelta(days=1),
+        )
+
+        # The blob reference is the last write of the upload, so the lock
+        # lands after the submission row was inserted.
+        acquire = signals.acquire_blob
+        calls = []
+
+        def acquire_once_locked(name):
+            calls.append(name)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            acquire(name)
+
+        self.client.force_login(student)
+        with mock.patch.object(signals, 'acquire_blob', acquire_once_locked):
+            response = self.client.post(
+                reverse('student_assignments_view', kwargs={'course_id': course.pk}),
+                {'assignment_id': assignment.pk, 'file': SimpleUploadedFile('essay.pdf', b'%PDF-1.4 essay')},
+            )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(calls), 2)
+        submission = AssignmentSubmission.objects.get()
+        self.assertEqual(submission.original_name, 'essay.pdf')
+        self.assertEqual(StoredBlob.objects.get(name=submission.submitted_file.name).ref_count, 1)
+
+    def test_contention_benchmark_compares_profiles(self):
+        report_path = Path(tempfile.mkdtemp(prefix='sqlite-benchmark-')) / 'report.json'
+        self.addCleanup(shutil.rmtree, report_path.parent)
+        call_command('benchmark_sqlite', readers=2, writers=2, duration=0.3, save=str(report_path), stdout=StringIO())
+
+        reports = json.loads(report_path.read_text())
+        self.assertEqual(set(reports), {'default', 'production'})
+        self.assertEqual(set(reports['production']['steps']), {'read', 'write'})
+        self.assertEqual(reports['production']['steps']['read']['errors'], 0)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {'default', routers.REPLICA}
+
+    def test_reads_use_the_replica_outside_transactions(self):
+        self.assertEqual(User.objects.all().db, routers.REPLICA)
+        with transaction.atomic():
+            self.assertEqual(User.objects.all().db, 'default')
+        user = User.objects.create_user(username='Mahdieh Arabi', password='x', user_type='teacher')
+        self.assertEqual(User.objects.get(pk=user.pk).username, 'Mahdieh Arabi')
+
+        token = routers.start_request()
+        try:
+            self.assertEqual(User.objects.all().db, routers.REPLICA)
+            user.save()
+            self.assertEqual(User.objects.all().db, 'default')
+        finally:
+            self.assertTrue(routers.finish_request(token).wrote)
+        self.assertFalse(routers.PrimaryReplicaRouter().allow_migrate(routers.REPLICA, 'main'))
+
+    @override_settings(SQLITE_PRAGMAS=settings.SQLITE_PRODUCTION_PRAGMAS)
+    def test_replica_connection_reads_committed_writes_and_refuses_its_own(self):
+        # The replica as configured outside tests, where it is not mirrored:
+        # a mode=ro connection to the primary's file.
+        directory = Path(tempfile.mkdtemp(prefix='replica-'))
+        self.addCleanup(shutil.rmtree, directory)
+        path = directory / 'db.sqlite3'
+        handler = ConnectionHandler({
+            'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path},
+            routers.REPLICA: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': f'{path.as_uri()}?mode=ro'},
+        })
+        self.addCleanup(handler.close_all)
+        with handler['default'].cursor() as cursor:
+            cursor.execute('CREATE TABLE grade (score INTEGER)')
+            cursor.execute('INSERT INTO grade VALUES (90)')
+
+        with handler[routers.REPLICA].cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            # Write-side settings are left at SQLite's default (FULL).
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 2)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('SELECT score FROM grade')
+            self.assertEqual(cursor.fetchall(), [(90,)])
+            with self.assertRaisesMessage(OperationalError, 'readonly'):
+                cursor.execute('INSERT INTO grade VALUES (50)')
+
+        with handler['default'].cursor() as cursor:
+            cursor.execute('INSERT INTO grade VALUES (70)')
+        with handler[routers.REPLICA].cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM grade')
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+    def test_clients_read_their_own_writes_after_a_post(self):
+        User.objects.create_user(username='Mahdieh Arabi', password='x', user_type='teacher')
+
+        def queries(path):
+            with CaptureQueriesContext(connections['default']) as primary, \
+                    CaptureQueriesContext(connections[routers.REPLICA]) as replica:
+                self.assertEqual(self.client.get(path).status_code, 200)
+            return len(primary), len(replica)
+
+        primary, replica = queries(reverse('teacher_list'))
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+        response = self.client.post(reverse('login'), {'username': 'Mahdieh Arabi', 'password': 'x'})
+        self.assertEqual(response.cookies['primary_pin']['max-age'], settings.REPLICA_PIN_SECONDS)
+        primary, replica = queries(reverse('teacher_list'))
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+        self.client.cookies.pop('primary_pin')
+        primary, replica = queries(reverse('teacher_list'))
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(prefix='index-advisor-media-'))
+class IndexAdvisorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.addClassCleanup(shutil.rmtree, settings.MEDIA_ROOT, ignore_errors=True)
+        call_command(
+            'seed_scale', teachers=2, students=10, courses=4, conversations=20, posts=2, reservations=5,
+            stdout=StringIO(),
+        )
+        enrollment = Enrollment.objects.select_related('course__teacher', 'student').order_by('id').first()
+        cls.course, cls.student = enrollment.course, enrollment.student
+        cls.teacher = User.objects.get(username='Mahdieh Arabi')
+
+    def capture(self, log_path):
+        with override_settings(REQUEST_PROFILING=True, QUERY_LOG=str(log_path)):
+            client = Client()
+            client.force_login(self.student)
+            for path in (
+                reverse('home'), reverse('student_dashboard'), reverse('teacher_list'),
+                f"{reverse('conversation_list')}?topic=Movies", reverse('conversation_list'),
+            ):
+                self.assertEqual(client.get(path).status_code, 200, path)
+            client.force_login(self.teacher)
+            for path in (
+                reverse('teacher_dashboard'), reverse('teacher_requests'), reverse('level_requests'),
+                reverse('student_profile_detail', args=[self.student.id]),
+            ):
+                self.assertEqual(client.get(path).status_code, 200, path)
+
+    def test_hot_paths_do_not_scan_whole_tables(self):
+        log_path = Path(settings.MEDIA_ROOT) / 'queries.jsonl'
+        self.capture(log_path)
+        self.assertIn('"view": "teacher_list"', log_path.read_text())
+
+        out = StringIO()
+        call_command('index_advisor', str(log_path), ignore=['main_topiccounter'], fail=True, stdout=out)
+        self.assertIn('0 with full scans', out.getvalue())
+
+        with self.assertRaisesMessage(CommandError, '1 statement(s) scan a whole table'):
+            call_command('index_advisor', str(log_path), fail=True, stdout=StringIO())
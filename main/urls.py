@@ -11,7 +11,9 @@ urlpatterns = [
     path('placement_test/', views.placement_test, name='placement_test'),
     path('reservation-success/', views.reservation_success, name='reservation_success'),
     path('get-reserved-times/', views.get_reserved_times, name='get_reserved_times'),
+    path('get-availability/', views.get_availability, name='get_availability'),
     path('search-students/', views.search_students, name='search_students'),
+    path('search-students/autocomplete/', views.student_autocomplete, name='student_autocomplete'),
     path('add-student/', views.add_student_to_course, name='add_student_to_course'),
     path('courses/', views.courses_list, name='courses_list'),
     path('course/<int:course_id>/', views.course_detail, name='course_detail'),
@@ -23,6 +25,8 @@ urlpatterns = [
     path('teacher/requests/', views.view_requests, name='teacher_requests'),
     path('course/<int:course_id>/delete/', views.delete_course, name='delete_course'),
     path('student/profile/<int:student_id>/', views.student_profile_detail, name='student_profile_detail'),
+    path('course/<int:course_id>/gradebook/', views.course_gradebook, name='course_gradebook'),
+    path('teacher/gradebook/', views.teacher_gradebook, name='teacher_gradebook'),
     path('course/<int:course_id>/set_link/', views.set_course_link, name='set_course_link'),
     path('edit_profile/', views.edit_profile, name='edit_profile'),
     path('teachers/', views.teacher_list, name='teacher_list'),
@@ -32,9 +36,11 @@ urlpatterns = [
     path('assignments/<int:assignment_id>/submissions/', views.assignment_submissions_view, name='assignment_submissions'),
     path('course/<int:course_id>/assignments/', views.student_assignments_view, name='student_assignments_view'),
     path('teacher/assignment/<int:assignment_id>/submissions/', views.assignment_submissions_view, name='assignment_submissions_view'),
+    path('teacher/assignment/<int:assignment_id>/submissions/download/', views.assignment_submissions_zip, name='assignment_submissions_zip'),
     path('conversations/', views.conversation_list, name='conversation_list'),
     path('conversations/create/', views.conversation_create, name='conversation_create'),
     path('conversations/<int:pk>/', views.conversation_detail, name='conversation_detail'),
+    path('conversations/<int:pk>/events/', views.conversation_events, name='conversation_events'),
     path('conversations/<int:pk>/comment/', views.comment_create, name='comment_create'),
     path('comments/<int:comment_id>/like/', views.like_comment, name='like_comment'),
     path('educational-posts/', views.educational_post_list, name='educational_post_list'),
@@ -45,6 +51,8 @@ urlpatterns = [
     path('level-requests/', views.level_requests, name='level_requests'),
     path('conversation/<int:pk>/edit/', views.conversation_edit, name='conversation_edit'),
     path('conversation/<int:pk>/delete/', views.conversation_delete, name='conversation_delete'),
+    path('search/', views.site_search, name='search'),
+    path('profiling-report/', views.profiling_report_view, name='profiling_report'),
     path("contact/", views.contact, name="contact"),
     path("about/", views.about, name="about"),
     path("courses/<int:course_id>/exams/", views.exam_list, name="exam_list"),
@@ -54,6 +62,7 @@ urlpatterns = [
     path("exam/<int:exam_id>/update/", views.exam_update, name="exam_update"),
     path("exam/<int:exam_id>/delete/", views.exam_delete, name="exam_delete"),
     path('teacher/exam/<int:exam_id>/submissions/', views.exam_submissions_view, name='exam_submissions_view'),
+    path('teacher/exam/<int:exam_id>/submissions/download/', views.exam_submissions_zip, name='exam_submissions_zip'),
     path('course/<int:course_id>/exams/', views.student_exams_view, name='student_course_exams'),
 ]
 
@@ -1,45 +1,87 @@
+import datetime
+import hashlib
+import json
 from datetime import timedelta
 
 from django.contrib.auth import authenticate, login, update_session_auth_hash
 from django.contrib.auth import logout
+from django.contrib.auth.views import redirect_to_login
+from django.core.handlers.asgi import ASGIRequest
 from django.contrib import messages
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
 import re
 
-from django.db.models import Count
+from django.db import IntegrityError
+from django.db.models import Count, Exists, F, OuterRef, Q
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from django.views.decorators.http import require_POST
 from django.urls import reverse
 from .forms import PlacementTestReservationForm, EnrollmentRequestForm, AssignmentForm, CommentForm, ConversationForm, \
     EducationalPostForm
-from django.http import JsonResponse, HttpResponseForbidden, HttpResponse
+from asgiref.sync import sync_to_async
+from django.http import Http404, JsonResponse, HttpResponseForbidden, HttpResponse, StreamingHttpResponse
 from .models import PlacementTestReservation, ENGLISH_LEVELS, EnrollmentRequest, CustomUser, Rating, Assignment, \
-    AssignmentSubmission, Comment, Conversation, EducationalPost, Exam, ExamSubmission
+    AssignmentSubmission, Comment, Conversation, EducationalPost, Exam, ExamSubmission, TopicCounter, \
+    SLOT_TAKEN_MESSAGE, apply_conversation_delta, apply_rating_delta, apply_topic_delta
 from .models import Course, Enrollment
 from .forms import CourseForm
 from django.shortcuts import get_object_or_404
-from .forms import StudentSearchForm, AddStudentToCourseForm
+from .forms import StudentSearchForm, AddStudentToCourseForm, ExamGradingForm
+from .archives import ZipManifest, entry_name, parse_range
+from .exports import csv_stream, iter_gradebook, xlsx_stream
+from .availability import MAX_RANGE_DAYS, SLOT_LABELS, abooked_bitmaps, booked_bitmaps, booked_slots
+from .live import conversation_stream, event_id, get_hub, parse_event_id, publish_like_counts
+from .images import delete_profile_image, refresh_post_image, save_profile_image
+from .homepage import ahome_blocks, home_cache_stats, reset_home_cache_stats
+from .middleware import profiling_report, reset_profiling_report
+from .pagination import KeysetPage, akeyset_paginate, keyset_paginate
+from .search import find_students, search, student_match_ids
+from .sqlite import write_transaction
 
 
 User = get_user_model()
 
 
-def home(request):
-    top_teachers = User.objects.filter(user_type='teacher')[:4]
-    top_conversations = Conversation.objects.annotate(
-        comment_count=Count("comments")
-    ).order_by("-comment_count")[:4]
-    latest_posts = EducationalPost.objects.all()[:4]
+# Helpers for the async read views. The ORM calls they await run one after
+# another on the request's sync thread, so a page's queries are no faster;
+# what the event loop gains is serving other requests and open event streams
+# while this one waits on SQLite.
+
+async def alist(queryset):
+    return [obj async for obj in queryset]
+
+
+async def aget_object_or_404(queryset, **kwargs):
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+
+
+async def resolve_user(request):
+    # Loads the lazy request.user on the sync thread so async code can read
+    # its attributes (request.auser() only exists from Django 5.0).
+    await sync_to_async(lambda: request.user.is_authenticated)()
+    return request.user
+
+
+async def arender(request, template_name, context):
+    # Templates reach the session, messages and context processors, which
+    # are synchronous; rendering runs where the ORM calls do.
+    return await sync_to_async(render)(request, template_name, context)
+
+
+async def home(request):
     context = {
-        "top_conversations": top_conversations,
-        "latest_posts": latest_posts,
-        "top_teachers": top_teachers,
+        "home_blocks": await ahome_blocks(),
     }
-    return render(request, 'home.html', context)
+    return await arender(request, 'home.html', context)
 
 
 def login_view(request):
@@ -122,22 +164,34 @@ def student_dashboard(request):
 
     enrollments = Enrollment.objects.filter(student=student).select_related('course')
 
-    passed = enrollments.filter(grade__gte=60)
-    failed = enrollments.filter(grade__lt=60)
-    in_progress = enrollments.filter(grade__isnull=True)
+    passed, failed, in_progress = [], [], []
+    for enroll in enrollments:
+        if enroll.grade is None:
+            in_progress.append(enroll)
+        elif enroll.grade >= 60:
+            passed.append(enroll)
+        else:
+            failed.append(enroll)
 
-    assignments_notifications = {}
-    for enroll in in_progress:
-        course = enroll.course
-        active_assignments = Assignment.objects.filter(course=course, deadline__gt=timezone.now())
+    in_progress_course_ids = [enroll.course_id for enroll in in_progress]
+    now = timezone.now()
 
-        unseen_count = 0
-        for assignment in active_assignments:
-            submitted = AssignmentSubmission.objects.filter(student=student, assignment=assignment).exists()
-            if not submitted:
-                unseen_count += 1
+    assignments_notifications = dict(
+        Assignment.objects.filter(course_id__in=in_progress_course_ids, deadline__gt=now)
+        .filter(~Exists(AssignmentSubmission.objects.filter(assignment=OuterRef('pk'), student=student)))
+        .values('course')
+        .annotate(pending=Count('id'))
+        .values_list('course', 'pending')
+    )
 
-        assignments_notifications[course.id] = unseen_count
+    exams_notifications = dict(
+        Exam.objects.filter(course_id__in=in_progress_course_ids)
+        .filter(Q(deadline__isnull=True) | Q(deadline__gt=now))
+        .filter(~Exists(ExamSubmission.objects.filter(exam=OuterRef('pk'), student=student)))
+        .values('course')
+        .annotate(pending=Count('id'))
+        .values_list('course', 'pending')
+    )
 
     context = {
         'level': level,
@@ -145,6 +199,7 @@ def student_dashboard(request):
         'failed': failed,
         'in_progress': in_progress,
         'assignments_notifications': assignments_notifications,
+        'exams_notifications': exams_notifications,
     }
     return render(request, 'student_dashboard.html', context)
 
@@ -167,8 +222,12 @@ def placement_test(request):
             reservation = form.save(commit=False)
             reservation.user = request.user
             reservation.assigned_teacher = teacher
-            reservation.save()
-            return redirect('reservation_success')
+            try:
+                write_transaction(reservation.save)()
+            except IntegrityError:
+                form.add_error(None, SLOT_TAKEN_MESSAGE)
+            else:
+                return redirect('reservation_success')
     else:
         form = PlacementTestReservationForm()
     return render(request, 'placement_test.html', {'form': form})
@@ -179,15 +238,50 @@ def reservation_success(request):
     return render(request, 'reservation_success.html')
 
 
-def get_reserved_times(request):
-    date = request.GET.get('date')
+async def get_reserved_times(request):
+    date = parse_date_param(request.GET.get('date'))
     if date:
-        reserved = PlacementTestReservation.objects.filter(date=date).values_list('time', flat=True)
-        times = [t.strftime('%H:%M') for t in reserved]
-        return JsonResponse({'reserved_times': times})
+        bitmap = (await abooked_bitmaps(date, date)).get(date, 0)
+        return JsonResponse({'reserved_times': booked_slots(bitmap)})
     return JsonResponse({'reserved_times': []})
 
 
+def parse_date_param(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def availability_range(request):
+    start = parse_date_param(request.GET.get('start')) or timezone.localdate()
+    end = parse_date_param(request.GET.get('end')) or start + timedelta(days=30)
+    end = min(end, start + timedelta(days=MAX_RANGE_DAYS - 1))
+    return start, end
+
+
+def availability_payload(request):
+    start, end = availability_range(request)
+    bitmaps = booked_bitmaps(start, end)
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'slots': SLOT_LABELS,
+        'days': {day.isoformat(): bitmap for day, bitmap in bitmaps.items()},
+    }
+
+
+def get_availability(request):
+    # The ETag hashes the payload, so it is built once and reused as the body.
+    payload = json.dumps(availability_payload(request), sort_keys=True)
+    tag = quote_etag(hashlib.md5(payload.encode()).hexdigest())
+    response = get_conditional_response(request, etag=tag)
+    if response is None:
+        response = HttpResponse(payload, content_type='application/json')
+    response['ETag'] = tag
+    return response
+
+
 @login_required
 def teacher_dashboard(request):
     if request.user.user_type != 'teacher':
@@ -218,26 +312,47 @@ def teacher_dashboard(request):
 def search_students(request):
     form = StudentSearchForm(request.GET or None)
     results = []
-    add_forms = {}
+    teacher_courses = []
 
     if form.is_valid():
-        query = form.cleaned_data['query']
-        results = User.objects.filter(user_type='student', username__icontains=query)
-
-        for student in results:
-            add_forms[student.id] = AddStudentToCourseForm(
-                initial={'student_id': student.id},
-                teacher=request.user
-            )
+        results = find_students(form.cleaned_data['query'])
+        if results and request.user.is_authenticated:
+            teacher_courses = list(Course.objects.filter(teacher=request.user).only('id', 'title'))
 
     return render(request, 'search_students.html', {
         'form': form,
         'results': results,
         'ENGLISH_LEVELS': ENGLISH_LEVELS,
-        'add_forms': add_forms,
+        'teacher_courses': teacher_courses,
     })
 
 
+def student_autocomplete(request):
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 50)
+    except ValueError:
+        limit = 10
+
+    if not query:
+        return JsonResponse({'results': []})
+
+    ids = student_match_ids(query, limit)
+    rows = User.objects.filter(pk__in=ids).values('id', 'username', 'first_name', 'last_name', 'email', 'level')
+    found = {row['id']: row for row in rows}
+    results = [
+        {
+            'id': found[i]['id'],
+            'username': found[i]['username'],
+            'full_name': f"{found[i]['first_name']} {found[i]['last_name']}".strip(),
+            'email': found[i]['email'],
+            'level': found[i]['level'],
+        }
+        for i in ids if i in found
+    ]
+    return JsonResponse({'results': results})
+
+
 def add_student_to_course(request):
     if request.method == 'POST':
         form = AddStudentToCourseForm(request.POST, teacher=request.user)
@@ -266,22 +381,25 @@ def set_student_level(request, student_id):
     return redirect('search_students')
 
 
-@login_required
-def courses_list(request):
-    user = request.user
+async def courses_list(request):
+    user = await resolve_user(request)
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
     today = timezone.now().date()
 
     # if user.user_type == 'student' and hasattr(user, 'level'):
     #     courses = Course.objects.filter(required_level=user.level)
     # else:
-    courses = Course.objects.all()
+    courses = await akeyset_paginate(
+        request, Course.objects.select_related('teacher'), fields=('start_date', 'id')
+    )
 
     for course in courses:
         registration_deadline = course.start_date - timedelta(days=2)
         course.registration_open = today <= registration_deadline
         course.remaining_days = (registration_deadline - today).days if course.registration_open else 0
 
-    return render(request, 'courses_list.html', {'courses': courses})
+    return await arender(request, 'courses_list.html', {'courses': courses, 'page': courses})
 
 
 def course_detail(request, course_id):
@@ -294,6 +412,38 @@ def course_detail(request, course_id):
     return render(request, 'course_detail.html', context)
 
 
+GRADEBOOK_FORMATS = {
+    'csv': (csv_stream, 'text/csv'),
+    'xlsx': (xlsx_stream, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+
+def gradebook_response(courses, filename, export_format):
+    stream, content_type = GRADEBOOK_FORMATS.get(export_format, GRADEBOOK_FORMATS['csv'])
+    extension = export_format if export_format in GRADEBOOK_FORMATS else 'csv'
+    response = StreamingHttpResponse(stream(iter_gradebook(courses)), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{extension}"'
+    return response
+
+
+@login_required
+def course_gradebook(request, course_id):
+    course = get_object_or_404(Course, pk=course_id, teacher=request.user)
+    return gradebook_response(
+        Course.objects.filter(pk=course.pk), f'gradebook-course-{course.pk}', request.GET.get('format', 'csv')
+    )
+
+
+@login_required
+def teacher_gradebook(request):
+    if request.user.user_type != 'teacher':
+        return HttpResponseForbidden("Only teachers can export gradebooks.")
+    return gradebook_response(
+        Course.objects.filter(teacher=request.user), f'gradebook-{request.user.username}',
+        request.GET.get('format', 'csv'),
+    )
+
+
 def remove_student_from_course(request, course_id, student_id):
     course = get_object_or_404(Course, pk=course_id, teacher=request.user)
     student = get_object_or_404(User, pk=student_id, user_type='student')
@@ -362,11 +512,14 @@ def view_requests(request):
         return redirect('home')
 
     courses = Course.objects.filter(teacher=request.user)
-    requests_list = EnrollmentRequest.objects.filter(course__in=courses).order_by('-created_at')
+    requests_list = EnrollmentRequest.objects.filter(course__in=courses)
 
     requests_list.filter(is_seen=False).update(is_seen=True)
 
-    return render(request, 'teacher_requests.html', {'requests': requests_list})
+    page = keyset_paginate(
+        request, requests_list.select_related('student', 'course'), fields=('created_at', 'id')
+    )
+    return render(request, 'teacher_requests.html', {'requests': page, 'page': page})
 
 
 @login_required
@@ -441,9 +594,6 @@ def edit_profile(request):
             else:
                 user.email = email
 
-        if profile_picture:
-            user.profile_image = profile_picture
-
         if new_password:
             if not current_password:
                 messages.error(request, 'Enter your current Password.')
@@ -465,7 +615,16 @@ def edit_profile(request):
             user.set_password(new_password)
             update_session_auth_hash(request, user)
 
+        replaced_image = None
+        if profile_picture:
+            try:
+                replaced_image = save_profile_image(user, profile_picture)
+            except ValidationError:
+                messages.error(request, 'Invalid image file!')
+                return redirect('edit_profile')
+
         user.save()
+        delete_profile_image(replaced_image)
         if user.user_type == 'teacher':
             return redirect('teacher_dashboard')
         else:
@@ -474,28 +633,22 @@ def edit_profile(request):
     return render(request, 'edit_profile.html')
 
 
-def teacher_list(request):
-    teachers = User.objects.filter(user_type='teacher')
-    rated_teachers = []
+async def teacher_list(request):
+    user = await resolve_user(request)
+    teachers = await alist(User.objects.filter(user_type='teacher').order_by('-rating', '-rating_count', 'username'))
     related_teachers = []
 
-    if request.user.is_authenticated and request.user.user_type == 'student':
-        related_teachers = User.objects.filter(
-            user_type='teacher',
-            course__enrollment__student=request.user
-        ).distinct()
-
-        rated_teachers = User.objects.filter(
+    if user.is_authenticated and user.user_type == 'student':
+        related_teachers = await alist(User.objects.filter(
             user_type='teacher',
-            received_ratings__student=request.user
-        ).distinct()
+            course__enrollment__student=user
+        ).distinct())
 
     context = {
         'teachers': teachers,
-        'rated_teachers': rated_teachers,
         'related_teachers': related_teachers,
     }
-    return render(request, 'teacher_list.html', context)
+    return await arender(request, 'teacher_list.html', context)
 
 
 @login_required
@@ -521,11 +674,21 @@ def rate_teacher(request, teacher_id):
             messages.error(request, "Rating must be between 1 and 5.")
             return redirect('teacher_list')
 
-        rating, created = Rating.objects.update_or_create(
-            student=request.user,
-            teacher=teacher,
-            defaults={'score': score}
-        )
+        @write_transaction
+        def rate():
+            previous_score = Rating.objects.select_for_update().filter(
+                student=request.user,
+                teacher=teacher
+            ).values_list('score', flat=True).first()
+
+            rating, created = Rating.objects.update_or_create(
+                student=request.user,
+                teacher=teacher,
+                defaults={'score': score}
+            )
+            apply_rating_delta(teacher.id, score - (previous_score or 0), 1 if created else 0)
+
+        rate()
 
         messages.success(request, "Your rating has been submitted.")
         return redirect('teacher_list')
@@ -583,11 +746,14 @@ def student_assignments_view(request, course_id):
                     'message': 'You have already submitted this assignment.'
                 })
 
-            AssignmentSubmission.objects.create(
+            submission = AssignmentSubmission(
                 assignment=assignment,
                 student=request.user,
                 submitted_file=uploaded_file
             )
+            # The first attempt stores the file; a retry finds it committed
+            # and only writes the submission and its blob reference again.
+            write_transaction(submission.save)()
             return redirect('student_assignments_view', course_id=course.id)
 
     return render(request, 'student_assignments.html', {
@@ -613,7 +779,7 @@ def assignment_submissions_view(request, assignment_id):
         submission.grade = grade
         submission.feedback = feedback
         submission.graded = True
-        submission.save()
+        write_transaction(submission.save)()
 
         return redirect('assignment_submissions_view', assignment_id=assignment.id)
 
@@ -623,6 +789,58 @@ def assignment_submissions_view(request, assignment_id):
     })
 
 
+def submissions_zip_response(request, submissions, field, filename):
+    # Streams every submission file as one ZIP. The manifest fixes the
+    # archive layout before the first byte is sent, so the response has a
+    # Content-Length and an ETag and a broken download can resume with Range.
+    taken = set()
+    files = [
+        (entry_name(username, name, taken), name, submitted_at)
+        for username, name, submitted_at in submissions.order_by('student__username', 'id').values_list(
+            'student__username', field, 'submitted_at',
+        )
+        if name
+    ]
+    storage = submissions.model._meta.get_field(field).storage
+    manifest = ZipManifest(storage, files)
+    size, etag = manifest.size, manifest.etag
+
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if not if_range or if_range == etag:
+        byte_range = parse_range(request.headers.get('Range'), size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    start, end = byte_range or (0, size - 1)
+    response = StreamingHttpResponse(manifest.stream(start, end), content_type='application/zip')
+    if byte_range:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = end - start + 1
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Content-Disposition'] = f'attachment; filename="{filename}.zip"'
+    return response
+
+
+@login_required
+def assignment_submissions_zip(request, assignment_id):
+    assignment = get_object_or_404(Assignment, id=assignment_id, course__teacher=request.user)
+    return submissions_zip_response(
+        request, AssignmentSubmission.objects.filter(assignment=assignment), 'submitted_file',
+        f'assignment-{assignment.pk}-submissions',
+    )
+
+
+@login_required
+def exam_submissions_zip(request, exam_id):
+    exam = get_object_or_404(Exam, id=exam_id, course__teacher=request.user)
+    return submissions_zip_response(request, exam.submissions.all(), 'file', f'exam-{exam.pk}-submissions')
+
+
 CONVERSATION_TOPICS = [
     ('Reading Skills', 'Reading Skills'),
     ('English Grammar', 'English Grammar'),
@@ -637,7 +855,8 @@ CONVERSATION_TOPICS = [
 ]
 
 
-def conversation_list(request):
+async def conversation_list(request):
+    user = await resolve_user(request)
     selected_topic = request.GET.get('topic')
 
     if selected_topic:
@@ -645,47 +864,80 @@ def conversation_list(request):
     else:
         conversations = Conversation.objects.all().select_related('user')
 
-    if request.user.is_authenticated and request.GET.get('my_topics') == '1':
-        conversations = conversations.filter(user=request.user)
+    if user.is_authenticated and request.GET.get('my_topics') == '1':
+        conversations = conversations.filter(user=user)
 
-    topic_counts = {
-        topic[0]: Conversation.objects.filter(topic=topic[0]).count()
-        for topic in CONVERSATION_TOPICS
-    }
-
-    top_users = User.objects.annotate(conversation_count=Count('conversations')).order_by('-conversation_count')[:5]
+    topic_counts = await alist(TopicCounter.objects.values_list('topic', 'conversation_count'))
+    top_users = await alist(User.objects.filter(conversation_count__gt=0).order_by('-conversation_count')[:5])
+    page = await akeyset_paginate(request, conversations)
 
-    return render(request, 'conversation_list.html', {
-        'conversations': conversations,
+    return await arender(request, 'conversation_list.html', {
+        'conversations': page,
+        'page': page,
         'selected_topic': selected_topic,
-        'topic_counts': topic_counts,
+        'topic_counts': dict(topic_counts),
         'topics': CONVERSATION_TOPICS,
         'top_users': top_users,
     })
 
 
-def conversation_detail(request, pk):
-    conversation = get_object_or_404(Conversation, pk=pk)
-    comments = conversation.comments.all().order_by('created')
+async def conversation_detail(request, pk):
+    user = await resolve_user(request)
+    # Taken before the queries run, so anything published while the page
+    # renders is replayed by the event stream; the page skips duplicates.
+    epoch, seq = get_hub().cursor()
+    conversation = await aget_object_or_404(Conversation.objects.select_related('user'), pk=pk)
+    comments = await alist(Comment.objects.filter(conversation_id=pk).select_related('user').order_by('created'))
     form = CommentForm()
 
-    return render(request, 'conversation_detail.html', {
+    liked_comment_ids = set()
+    if user.is_authenticated:
+        liked_comment_ids = set(await alist(
+            user.liked_comments.filter(conversation_id=pk).values_list('id', flat=True)
+        ))
+
+    return await arender(request, 'conversation_detail.html', {
         'conversation': conversation,
         'comments': comments,
+        'liked_comment_ids': liked_comment_ids,
+        'live_cursor': event_id(epoch, seq, comments[-1].id if comments else 0),
+        'live_updates': isinstance(request, ASGIRequest),
         'form': form
     })
 
 
+async def conversation_events(request, pk):
+    # The stream never ends, so it needs an ASGI server. Under WSGI the
+    # response would be collected in full on a worker thread that never
+    # returns; 204 instead tells EventSource to stop reconnecting.
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    if not await Conversation.objects.filter(pk=pk).aexists():
+        raise Http404("No Conversation matches the given query.")
+    last_event = parse_event_id(request.headers.get('Last-Event-ID') or request.GET.get('last_event_id'))
+    response = StreamingHttpResponse(conversation_stream(pk, last_event), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Keeps proxies such as nginx from buffering the stream.
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
 def conversation_create(request):
     if request.method == 'POST':
         form = ConversationForm(request.POST)
         if form.is_valid():
-            conversation = form.save(commit=False)
-            conversation.user = request.user
-            conversation.save()
-            form.save_m2m()
-            conversation.participants.add(request.user)
+            @write_transaction
+            def create():
+                conversation = form.save(commit=False)
+                conversation.user = request.user
+                conversation.save()
+                form.save_m2m()
+                conversation.participants.add(request.user)
+                apply_conversation_delta(conversation, 1)
+                return conversation
+
+            conversation = create()
             return redirect('conversation_detail', pk=conversation.pk)
     else:
         form = ConversationForm()
@@ -693,6 +945,12 @@ def conversation_create(request):
     return render(request, 'conversation_form.html', {'form': form})
 
 
+def is_background_request(request):
+    # Set by the conversation page's fetch() calls, which take JSON instead
+    # of a redirect and rely on the event stream to update the page.
+    return request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
+
 @login_required
 def comment_create(request, pk):
     conversation = get_object_or_404(Conversation, pk=pk)
@@ -700,35 +958,63 @@ def comment_create(request, pk):
     if request.method == 'POST':
         form = CommentForm(request.POST)
         if form.is_valid():
-            comment = form.save(commit=False)
-            comment.conversation = conversation
-            comment.user = request.user
-            comment.save()
-            conversation.participants.add(request.user)
+            @write_transaction
+            def create():
+                comment = form.save(commit=False)
+                comment.conversation = conversation
+                comment.user = request.user
+                comment.save()
+                conversation.participants.add(request.user)
+                return comment
+
+            comment = create()
+            if is_background_request(request):
+                return JsonResponse({'id': comment.pk}, status=201)
             return redirect('conversation_detail', pk=conversation.pk)
+        if is_background_request(request):
+            return JsonResponse({'errors': form.errors}, status=400)
     return redirect('conversation_detail', pk=conversation.pk)
 
 
 @login_required
+@require_POST
 def like_comment(request, comment_id):
     comment = get_object_or_404(Comment, id=comment_id)
     user = request.user
 
-    if comment.is_liked_by(user):
-        comment.likes.remove(user)
-    else:
-        comment.likes.add(user)
+    @write_transaction
+    def toggle():
+        # The counter moves only by rows actually deleted or inserted, so two
+        # racing likes from one user cannot both count: the unique
+        # (comment, user) pair lets only one insert through.
+        likes = Comment.likes.through.objects
+        removed, _ = likes.filter(comment=comment, customuser=user).delete()
+        if removed:
+            delta = -removed
+        else:
+            _, created = likes.get_or_create(comment=comment, customuser=user)
+            delta = 1 if created else 0
+        if delta:
+            Comment.objects.filter(pk=comment.pk).update(like_count=F('like_count') + delta)
+        like_count = Comment.objects.values_list('like_count', flat=True).get(pk=comment.pk)
+        publish_like_counts(comment.conversation_id, {comment.pk: like_count})
+        return delta, like_count
 
-    return redirect('conversation_detail', pk=comment.conversation.pk)
+    delta, like_count = toggle()
+
+    if is_background_request(request):
+        return JsonResponse({'liked': delta >= 0, 'like_count': like_count})
+    return redirect('conversation_detail', pk=comment.conversation_id)
 
 
 def educational_post_list(request):
-        posts = EducationalPost.objects.all()
+        posts = EducationalPost.objects.select_related('teacher')
 
         if request.user.is_authenticated and request.user.user_type == "teacher" and request.GET.get('my_posts') == '1':
             posts = posts.filter(teacher=request.user)
 
-        return render(request, 'educational_post_list.html', {'posts': posts})
+        page = keyset_paginate(request, posts)
+        return render(request, 'educational_post_list.html', {'posts': page, 'page': page})
 
 @login_required
 def educational_post_create(request):
@@ -741,6 +1027,7 @@ def educational_post_create(request):
             post = form.save(commit=False)
             post.teacher = request.user
             post.save()
+            refresh_post_image(post)
             return redirect('educational_post_list')
     else:
         form = EducationalPostForm()
@@ -751,11 +1038,13 @@ def educational_post_create(request):
 @login_required
 def educational_post_update(request, pk):
     post = get_object_or_404(EducationalPost, pk=pk, teacher=request.user)
+    previous_image, previous_widths = post.image.name, post.image_widths
 
     if request.method == 'POST':
         form = EducationalPostForm(request.POST, request.FILES, instance=post)
         if form.is_valid():
             form.save()
+            refresh_post_image(post, previous_image, previous_widths)
             return redirect('educational_post_list')
     else:
         form = EducationalPostForm(instance=post)
@@ -780,9 +1069,10 @@ def post_detail(request, pk):
 
 def level_requests(request):
     teacher = User.objects.get(username='Mahdieh Arabi')
-    reservations = PlacementTestReservation.objects.filter(assigned_teacher=teacher).order_by('-date')
+    reservations = PlacementTestReservation.objects.filter(assigned_teacher=teacher)
     reservations.filter(is_seen=False).update(is_seen=True)
-    return render(request, 'level_requests.html', {'reservations': reservations})
+    page = keyset_paginate(request, reservations, fields=('date', 'id'))
+    return render(request, 'level_requests.html', {'reservations': page, 'page': page})
 
 
 @login_required
@@ -793,9 +1083,17 @@ def conversation_edit(request, pk):
         return redirect('conversation_detail', pk=pk)
 
     if request.method == 'POST':
+        old_topic = conversation.topic
         form = ConversationForm(request.POST, instance=conversation)
         if form.is_valid():
-            form.save()
+            @write_transaction
+            def update():
+                form.save()
+                if conversation.topic != old_topic:
+                    apply_topic_delta(old_topic, -1)
+                    apply_topic_delta(conversation.topic, 1)
+
+            update()
             return redirect('conversation_detail', pk=conversation.pk)
     else:
         form = ConversationForm(instance=conversation)
@@ -808,11 +1106,45 @@ def conversation_delete(request, pk):
     conversation = get_object_or_404(Conversation, pk=pk)
 
     if request.user == conversation.user:
-        conversation.delete()
+        @write_transaction
+        def delete():
+            # Deleted through a queryset: delete() clears the instance's pk,
+            # which a retried attempt would still need.
+            Conversation.objects.filter(pk=conversation.pk).delete()
+            apply_conversation_delta(conversation, -1)
+
+        delete()
 
     return redirect('conversation_list')
 
 
+def site_search(request):
+    query = request.GET.get('q', '').strip()
+    results, next_cursor, previous_cursor = search(query, request.GET.get('cursor', ''))
+
+    def page_url(cursor):
+        params = request.GET.copy()
+        params['cursor'] = cursor
+        return f"?{params.urlencode()}"
+
+    page = KeysetPage(
+        results,
+        next_url=page_url(next_cursor) if next_cursor else None,
+        previous_url=page_url(previous_cursor) if previous_cursor else None,
+    )
+    return render(request, 'search.html', {'query': query, 'results': page, 'page': page})
+
+
+@login_required
+def profiling_report_view(request):
+    if not request.user.is_staff:
+        return HttpResponseForbidden("Staff only.")
+    if request.method == 'POST':
+        reset_profiling_report()
+        reset_home_cache_stats()
+    return JsonResponse({'views': profiling_report(), 'home_cache': home_cache_stats()})
+
+
 def contact(request):
     return render(request, "contact_us.html")
 
@@ -868,17 +1200,27 @@ def add_exam(request, course_id):
 
 @login_required
 def grade_exams(request, exam_id):
-    exam = get_object_or_404(Exam, id=exam_id)
-    submissions = exam.submissions.all()
-    if request.method == "POST":
-        for sub in submissions:
-            grade = request.POST.get(f"grade_{sub.id}")
-            if grade:
-                sub.grade = grade
-                sub.save()
-        return redirect("grade_submissions", exam_id=exam.id)
-    return render(request, "grade_exams.html", {"exam": exam, "submissions": submissions})
+    exam = get_object_or_404(Exam, id=exam_id, course__teacher=request.user)
+    submissions = exam.submissions.select_related('student').order_by('student__username')
 
+    if request.method == 'POST':
+        form = ExamGradingForm(request.POST, request.FILES, submissions=submissions)
+        if form.is_valid():
+            grades = form.cleaned_data['grades']
+            changed = []
+            for submission in form.submissions:
+                grade = grades.get(submission.id)
+                if grade is not None and (grade != submission.grade or not submission.graded):
+                    submission.grade = grade
+                    submission.graded = True
+                    changed.append(submission)
+            write_transaction(ExamSubmission.objects.bulk_update)(changed, ['grade', 'graded'], batch_size=500)
+            messages.success(request, f"Saved {len(changed)} grade(s).")
+            return redirect('exam_submissions_view', exam_id=exam.id)
+    else:
+        form = ExamGradingForm(submissions=submissions)
+
+    return render(request, 'grade_exams.html', {'exam': exam, 'form': form})
 
 
 @login_required
@@ -913,24 +1255,7 @@ def exam_delete(request, exam_id):
 
 @login_required
 def exam_submissions_view(request, exam_id):
-    exam = get_object_or_404(Exam, id=exam_id)
-    submissions = ExamSubmission.objects.filter(exam=exam)
-
-    if request.method == 'POST':
-        submission_id = request.POST.get('submission_id')
-        grade = request.POST.get('grade')
-
-        submission = get_object_or_404(ExamSubmission, id=submission_id)
-        submission.grade = grade
-        submission.graded = True
-        submission.save()
-
-        return redirect('exam_submissions_view', exam_id=exam.id)
-
-    return render(request, 'grade_exams.html', {
-        'exam': exam,
-        'submissions': submissions
-    })
+    return grade_exams(request, exam_id)
 
 
 @login_required
@@ -953,11 +1278,12 @@ def student_exams_view(request, course_id):
             if ExamSubmission.objects.filter(student=request.user, exam=exam).exists():
                 return render(request, 'assignment_error.html')
 
-            ExamSubmission.objects.create(
+            submission = ExamSubmission(
                 exam=exam,
                 student=request.user,
                 file=uploaded_file
             )
+            write_transaction(submission.save)()
             return redirect('student_course_exams', course_id=course.id)
 
     return render(request, 'student_exams.html', {